@@ -1,6 +1,12 @@
 # analytics/admin.py
 from django.contrib import admin
-from .models import PageView, DailyPageViewCount, UniqueVisitor
+from .models import (
+    PageView,
+    DailyPageViewCount,
+    PageViewRollup,
+    PageViewTotal,
+    UniqueVisitor,
+)
 
 
 @admin.register(PageView)
@@ -55,6 +61,42 @@ class DailyPageViewCountAdmin(admin.ModelAdmin):
     list_per_page = 30
 
 
+@admin.register(PageViewRollup)
+class PageViewRollupAdmin(admin.ModelAdmin):
+    list_display = (
+        "period_start",
+        "granularity",
+        "url",
+        "referrer_bucket",
+        "is_bot",
+        "count",
+    )
+    date_hierarchy = "period_start"
+    ordering = ("-period_start", "url")
+    list_filter = ("granularity", "referrer_bucket", "is_bot")
+    search_fields = ("url",)
+    # Written by the analytics_rollup command
+    readonly_fields = (
+        "period_start",
+        "granularity",
+        "url",
+        "referrer_bucket",
+        "is_bot",
+        "count",
+    )
+    list_per_page = 30
+
+
+@admin.register(PageViewTotal)
+class PageViewTotalAdmin(admin.ModelAdmin):
+    list_display = ("url", "count")
+    ordering = ("-count",)
+    search_fields = ("url",)
+    # Maintained by the analytics write buffer
+    readonly_fields = ("url", "count")
+    list_per_page = 30
+
+
 @admin.register(UniqueVisitor)
 class UniqueVisitorAdmin(admin.ModelAdmin):
     list_display = (
@@ -0,0 +1,337 @@
+"""
+Query plan benchmark for the analytics indexes.
+
+Seeds a throwaway SQLite database with a multi-million-row PageView log and
+a year of DailyPageViewCount rows, then runs the analytics read queries
+(admin list views, UniqueVisitor.most_common_url, popular pages) before
+and after the index migration, printing each query plan and its timing.
+
+Run from the project root:
+
+    python analytics/benchmarks/index_plans.py --rows 2000000
+
+The database is created in a temporary directory unless --db is given and
+never touches the project's own database.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import (
+    date,
+    datetime,
+    timedelta,
+    timezone as dt_timezone,
+)
+
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+)
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    "core.settings",
+)
+
+BEFORE_MIGRATION = "0006_pageviewtotal"
+INDEX_MIGRATION = "0007_pageview_indexes"
+CHUNK_SIZE = 50000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=2_000_000,
+        help="Number of PageView rows to seed (default: 2,000,000)",
+    )
+    parser.add_argument(
+        "--urls",
+        type=int,
+        default=500,
+        help="Number of distinct URLs (default: 500)",
+    )
+    parser.add_argument(
+        "--visitors",
+        type=int,
+        default=50_000,
+        help="Number of distinct IP addresses (default: 50,000)",
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=365,
+        help="Days of history to spread the rows over (default: 365)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Timed runs per query; the median is reported (default: 5)",
+    )
+    parser.add_argument(
+        "--analyze",
+        action="store_true",
+        help="Run ANALYZE before each pass. Off by default because Django "
+        "never does, so production plans are made without statistics",
+    )
+    parser.add_argument(
+        "--db",
+        help="SQLite file to use instead of a temporary one",
+    )
+    return parser.parse_args()
+
+
+def seed(
+    args,
+):
+    """Bulk insert the synthetic page views and daily counts."""
+    from django.db import (
+        connection,
+        transaction,
+    )
+
+    rng = random.Random(1234)
+    urls = [f"/docs/page-{n}/" for n in range(args.urls)]
+    ips = [
+        f"10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+        for n in range(args.visitors)
+    ]
+    now = datetime.now(dt_timezone.utc)
+    span = args.days * 86400
+
+    started = time.monotonic()
+    with connection.cursor() as cursor:
+        for offset in range(
+            0,
+            args.rows,
+            CHUNK_SIZE,
+        ):
+            rows = [
+                (
+                    rng.choice(urls),
+                    rng.choice(ips),
+                    "Mozilla/5.0 (benchmark)",
+                    (now - timedelta(seconds=rng.randrange(span))).isoformat(),
+                )
+                for _ in range(min(CHUNK_SIZE, args.rows - offset))
+            ]
+            with transaction.atomic():
+                cursor.executemany(
+                    "INSERT INTO analytics_pageview "
+                    "(url, ip_address, user_agent, timestamp) "
+                    "VALUES (%s, %s, %s, %s)",
+                    rows,
+                )
+        today = date.today()
+        with transaction.atomic():
+            cursor.executemany(
+                "INSERT INTO analytics_dailypageviewcount (url, date, count) "
+                "VALUES (%s, %s, %s)",
+                [
+                    (
+                        url,
+                        (today - timedelta(days=day)).isoformat(),
+                        rng.randrange(1, 500),
+                    )
+                    for url in urls
+                    for day in range(args.days)
+                ],
+            )
+    print(
+        f"Seeded {args.rows:,} page views and "
+        f"{args.urls * args.days:,} daily counts "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return urls, ips
+
+
+def benchmark_queries(
+    urls,
+    ips,
+):
+    """Build the querysets the site and admin actually run."""
+    from django.db.models import (
+        Sum,
+    )
+    from django.utils import (
+        timezone,
+    )
+
+    from analytics.models import (
+        DailyPageViewCount,
+        PageView,
+    )
+
+    month_ago = timezone.now() - timedelta(days=30)
+    return {
+        "most_common_url (ip, newest first)": lambda: list(
+            PageView.objects.filter(ip_address=ips[7])
+            .order_by("-timestamp")
+            .values_list(
+                "url",
+                flat=True,
+            )[:1]
+        ),
+        "page history (url, last 30 days)": lambda: PageView.objects.filter(
+            url=urls[3],
+            timestamp__gte=month_ago,
+        ).count(),
+        "admin changelist (date range, newest first)": lambda: list(
+            PageView.objects.filter(timestamp__gte=month_ago)
+            .order_by("-timestamp")
+            .values_list(
+                "id",
+                flat=True,
+            )[:25]
+        ),
+        "admin url filter (distinct urls)": lambda: list(
+            PageView.objects.order_by("url")
+            .values_list(
+                "url",
+                flat=True,
+            )
+            .distinct()
+        ),
+        "popular pages (last 7 days)": lambda: list(
+            DailyPageViewCount.objects.filter(
+                date__range=(
+                    date.today() - timedelta(days=7),
+                    date.today(),
+                )
+            )
+            .values("url")
+            .annotate(total_views=Sum("count"))
+            .order_by("-total_views")[:5]
+        ),
+    }
+
+
+def explain(
+    name,
+):
+    """Return the query plan of the last query a benchmark ran."""
+    from django.db import (
+        connection,
+    )
+
+    sql = connection.queries[-1]["sql"]
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return "\n".join(f"    {row[-1]}" for row in cursor.fetchall())
+
+
+def run(
+    label,
+    queries,
+    repeat,
+):
+    from django.db import (
+        connection,
+        reset_queries,
+    )
+
+    print(f"\n=== {label} ===")
+    timings = {}
+    connection.force_debug_cursor = True
+    for name, query in queries.items():
+        reset_queries()
+        query()
+        plan = explain(name)
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query()
+            runs.append(time.perf_counter() - started)
+        timings[name] = statistics.median(runs) * 1000
+        print(f"\n{name}: {timings[name]:.2f} ms\n{plan}")
+    connection.force_debug_cursor = False
+    return timings
+
+
+def main():
+    args = parse_args()
+    workdir = None
+    if args.db:
+        db_path = args.db
+    else:
+        workdir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(
+            workdir.name,
+            "analytics_bench.sqlite3",
+        )
+
+    from django.conf import (
+        settings,
+    )
+
+    settings.DATABASES["default"]["NAME"] = db_path
+
+    import django
+
+    django.setup()
+
+    from django.core.management import (
+        call_command,
+    )
+    from django.db import (
+        connection,
+    )
+
+    call_command(
+        "migrate",
+        "analytics",
+        BEFORE_MIGRATION,
+        verbosity=0,
+    )
+    urls, ips = seed(args)
+    queries = benchmark_queries(
+        urls,
+        ips,
+    )
+    if args.analyze:
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+    before = run(
+        f"Before {INDEX_MIGRATION}",
+        queries,
+        args.repeat,
+    )
+
+    started = time.monotonic()
+    call_command(
+        "migrate",
+        "analytics",
+        INDEX_MIGRATION,
+        verbosity=0,
+    )
+    if args.analyze:
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+    print(f"\nBuilt indexes in {time.monotonic() - started:.1f}s")
+    after = run(
+        f"After {INDEX_MIGRATION}",
+        queries,
+        args.repeat,
+    )
+
+    print("\n=== Summary (median ms) ===")
+    width = max(len(name) for name in queries)
+    for name in queries:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(
+            f"{name:<{width}}  {before[name]:>10.2f}  "
+            f"{after[name]:>10.2f}  {speedup:>7.1f}x"
+        )
+
+    connection.close()
+    if workdir is not None:
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,602 @@
+# analytics/buffer.py
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import (
+    Counter,
+    deque,
+)
+from datetime import (
+    date,
+    datetime,
+)
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from django.conf import (
+    settings,
+)
+from django.db import (
+    close_old_connections,
+)
+
+from .hll import (
+    hash_position,
+)
+from .utils import (
+    is_bot_user_agent,
+    visitor_fingerprint,
+)
+
+logger = logging.getLogger(__name__)
+
+# What to do with a new event when the buffer is already full.
+DROP_NEWEST = "drop_newest"  # Discard the incoming event
+DROP_OLDEST = "drop_oldest"  # Evict the oldest queued event to make room
+FLUSH = "flush"  # Flush on the caller's thread (backpressure), dropping nothing
+DROP_POLICIES = (
+    DROP_NEWEST,
+    DROP_OLDEST,
+    FLUSH,
+)
+
+# Sparse HyperLogLog register updates keyed by (url, date); see analytics.hll
+SketchPositions = Dict[
+    Tuple[str, Optional[date]],
+    Dict[int, int],
+]
+
+
+class PageViewEvent:
+    """
+    A single tracked hit waiting to be written to the database.
+
+    Attributes:
+        url (str): The request path.
+        ip_address (str): The sanitized client IP.
+        user_agent (str): The raw user agent string.
+        timestamp (datetime): When the request was seen.
+        day (date): The day the hit counts towards in DailyPageViewCount.
+        fingerprint (str): The visitor fingerprint, computed from
+            ``ip_address`` and ``user_agent`` when not given.
+        referrer_host (str): Host of the Referer header, "" if none.
+    """
+
+    __slots__ = (
+        "url",
+        "ip_address",
+        "user_agent",
+        "timestamp",
+        "day",
+        "fingerprint",
+        "referrer_host",
+    )
+
+    def __init__(
+        self,
+        url: str,
+        ip_address: str,
+        user_agent: str,
+        timestamp: datetime,
+        day: date,
+        fingerprint: Optional[str] = None,
+        referrer_host: str = "",
+    ) -> None:
+        self.url = url
+        self.ip_address = ip_address
+        self.user_agent = user_agent
+        self.timestamp = timestamp
+        self.day = day
+        self.fingerprint = fingerprint or visitor_fingerprint(
+            ip_address,
+            user_agent,
+        )
+        self.referrer_host = referrer_host
+
+
+class PageViewBuffer:
+    """
+    Bounded in-process queue of page view events, written in batches by a
+    background writer thread.
+
+    The writer thread (one per process, so one per gunicorn worker) wakes up
+    once ``batch_size`` events are queued or ``flush_interval`` seconds have
+    passed, whichever comes first, so the request thread only ever appends
+    to the queue. When the queue holds ``max_size`` events the configured
+    drop policy decides what happens to new ones. Any queued events are
+    flushed when the process exits.
+
+    Daily view counts are kept apart from the event queue in a counter map
+    keyed by ``(url, date)``. Every hit is tallied there, even one the drop
+    policy discards, and each flush applies the map with one upsert per key.
+    Unique visitor sketches are collected the same way, as sparse register
+    updates for the page and site-wide sketches of the day and of all time.
+
+    Attributes:
+        enabled (bool): If False every event is written immediately on the
+            caller's thread and no writer thread is started.
+        max_size (int): Maximum number of queued events.
+        batch_size (int): Queue length that wakes the writer.
+        flush_interval (float): Seconds between time-based flushes.
+        drop_policy (str): One of ``DROP_POLICIES``.
+        dropped (int): Number of events discarded because the queue was full.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+        drop_policy: str = DROP_NEWEST,
+    ) -> None:
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(
+                f"Unknown analytics drop policy '{drop_policy}', "
+                f"expected one of {', '.join(DROP_POLICIES)}"
+            )
+        self.enabled = enabled
+        self.max_size = max(1, max_size)
+        self.batch_size = max(1, min(batch_size, self.max_size))
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+
+        self._events: Deque[PageViewEvent] = deque()
+        self._daily_counts: Counter[Tuple[str, date]] = Counter()
+        self._sketch_positions: SketchPositions = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Serialises flushes so batches are written in order
+        self._flush_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        self._stopping = False
+
+        # Counters reported by get_stats()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self.batched = 0
+        self.failed_batches = 0
+        self.counter_upserts = 0
+        self.sketch_merges = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self.last_flush_at: Optional[float] = None
+
+    @classmethod
+    def from_settings(
+        cls,
+    ) -> "PageViewBuffer":
+        """
+        Build a buffer configured from the ANALYTICS_BUFFER_* settings.
+        """
+        return cls(
+            enabled=getattr(
+                settings,
+                "ANALYTICS_BUFFER_WRITES",
+                False,
+            ),
+            max_size=getattr(
+                settings,
+                "ANALYTICS_BUFFER_MAX_SIZE",
+                10000,
+            ),
+            batch_size=getattr(
+                settings,
+                "ANALYTICS_BUFFER_BATCH_SIZE",
+                500,
+            ),
+            flush_interval=getattr(
+                settings,
+                "ANALYTICS_BUFFER_FLUSH_INTERVAL",
+                5.0,
+            ),
+            drop_policy=getattr(
+                settings,
+                "ANALYTICS_BUFFER_DROP_POLICY",
+                DROP_NEWEST,
+            ),
+        )
+
+    def __len__(
+        self,
+    ) -> int:
+        return len(self._events)
+
+    def add(
+        self,
+        event: PageViewEvent,
+    ) -> bool:
+        """
+        Queue an event for the writer thread.
+
+        Args:
+            event: The event to queue.
+
+        Returns:
+            bool: False if the event was dropped, True otherwise.
+        """
+        if not self.enabled:
+            self.enqueued += 1
+            self._write([event])
+            self._write_counts(Counter([(event.url, event.day)]))
+            positions: SketchPositions = {}
+            _add_sketch_positions(
+                positions,
+                event,
+            )
+            self._write_sketches(positions)
+            return True
+
+        self._ensure_writer()
+        flush_now = False
+        with self._lock:
+            self._daily_counts[(event.url, event.day)] += 1
+            _add_sketch_positions(
+                self._sketch_positions,
+                event,
+            )
+            if len(self._events) >= self.max_size:
+                if self.drop_policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.drop_policy == DROP_OLDEST:
+                    self._events.popleft()
+                    self.dropped += 1
+                else:
+                    flush_now = True
+            self._events.append(event)
+            self.enqueued += 1
+            if len(self._events) >= self.batch_size:
+                self._wakeup.notify()
+
+        if flush_now:
+            # FLUSH policy: the writer is behind, so the request pays for it
+            self.flush()
+        return True
+
+    def _ensure_writer(
+        self,
+    ) -> None:
+        """
+        Start the writer thread if this process does not have one yet.
+
+        Threads do not survive a fork, so a buffer inherited from a
+        pre-forking parent starts a fresh writer in each child.
+        """
+        pid = os.getpid()
+        if (
+            self._writer is not None
+            and self._writer_pid == pid
+            and self._writer.is_alive()
+        ):
+            return
+        with self._lock:
+            if (
+                self._writer is not None
+                and self._writer_pid == pid
+                and self._writer.is_alive()
+            ):
+                return
+            self._stopping = False
+            self._writer_pid = pid
+            self._writer = threading.Thread(
+                target=self._run_writer,
+                name="analytics-writer",
+                daemon=True,
+            )
+            self._writer.start()
+
+    def _run_writer(
+        self,
+    ) -> None:
+        """
+        Writer thread loop: wait for a full batch or the flush interval.
+        """
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._events) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+            if self._events or self._daily_counts or self._sketch_positions:
+                # Drop stale or broken connections between flushes
+                close_old_connections()
+                self.flush()
+            if stopping:
+                return
+
+    def stop(
+        self,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """
+        Stop the writer thread and flush whatever is left in the queue.
+
+        Args:
+            timeout: Seconds to wait for the writer thread to finish.
+        """
+        writer = self._writer
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if (
+            writer is not None
+            and writer.is_alive()
+            and writer is not threading.current_thread()
+        ):
+            writer.join(timeout)
+        self._writer = None
+        self.flush()
+
+    def _drain(
+        self,
+        limit: Optional[int] = None,
+    ) -> List[PageViewEvent]:
+        """
+        Remove up to ``limit`` events from the front of the queue.
+        """
+        with self._lock:
+            count = len(self._events)
+            if limit is not None:
+                count = min(count, limit)
+            return [self._events.popleft() for _ in range(count)]
+
+    def flush(
+        self,
+    ) -> int:
+        """
+        Apply the accumulated daily counts and visitor sketches, then write
+        every queued event to the database in batches.
+
+        Returns:
+            int: The number of events written.
+        """
+        written = 0
+        with self._flush_lock:
+            with self._lock:
+                counts, self._daily_counts = self._daily_counts, Counter()
+                positions, self._sketch_positions = self._sketch_positions, {}
+            self._write_counts(counts)
+            self._write_sketches(positions)
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                written += self._write(batch)
+        return written
+
+    def _write(
+        self,
+        events: List[PageViewEvent],
+    ) -> int:
+        """
+        Hand a batch to the persistence layer, logging rather than raising.
+        """
+        from .persistence import (
+            write_events,
+        )
+
+        started = time.monotonic()
+        try:
+            written = write_events(events)
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error(
+                f"Failed to write batch of {len(events)} page views: {e}",
+                exc_info=True,
+            )
+            return 0
+        finally:
+            self._record_flush(
+                len(events),
+                time.monotonic() - started,
+            )
+        self.written += written
+        return written
+
+    def _write_counts(
+        self,
+        counts: Counter,
+    ) -> None:
+        """
+        Upsert the daily counter map, putting it back on failure so the
+        counts are retried on the next flush instead of lost.
+        """
+        from .persistence import (
+            increment_daily_counts,
+        )
+
+        if not counts:
+            return
+        try:
+            self.counter_upserts += increment_daily_counts(counts)
+        except Exception as e:
+            logger.error(
+                f"Failed to write {len(counts)} daily page view counts: {e}",
+                exc_info=True,
+            )
+            if self.enabled:
+                with self._lock:
+                    self._daily_counts.update(counts)
+
+    def _write_sketches(
+        self,
+        positions: SketchPositions,
+    ) -> None:
+        """
+        Merge the pending sketch updates into the stored sketches. Merging
+        is idempotent, so on failure the updates are simply put back.
+        """
+        from .persistence import (
+            merge_visitor_sketches,
+        )
+
+        if not positions:
+            return
+        try:
+            self.sketch_merges += merge_visitor_sketches(positions)
+        except Exception as e:
+            logger.error(
+                f"Failed to merge {len(positions)} visitor sketches: {e}",
+                exc_info=True,
+            )
+            if self.enabled:
+                with self._lock:
+                    for key, updates in positions.items():
+                        pending = self._sketch_positions.setdefault(
+                            key,
+                            {},
+                        )
+                        for index, rank in updates.items():
+                            if rank > pending.get(index, 0):
+                                pending[index] = rank
+
+    def _record_flush(
+        self,
+        batch_size: int,
+        seconds: float,
+    ) -> None:
+        """
+        Update the flush latency and batch size statistics.
+        """
+        self.flushes += 1
+        self.batched += batch_size
+        self.last_batch_size = batch_size
+        self.max_batch_size = max(
+            self.max_batch_size,
+            batch_size,
+        )
+        self.last_flush_seconds = seconds
+        self.max_flush_seconds = max(
+            self.max_flush_seconds,
+            seconds,
+        )
+        self.total_flush_seconds += seconds
+        self.last_flush_at = time.time()
+
+    def get_stats(
+        self,
+    ) -> Dict[str, Any]:
+        """
+        Report queue depth, drops, flush latency and batch sizes.
+
+        Returns:
+            Dict[str, Any]: A JSON-serialisable snapshot of the counters.
+        """
+        flushes = self.flushes
+        return {
+            "enabled": self.enabled,
+            "writer_alive": bool(self._writer and self._writer.is_alive()),
+            "pid": os.getpid(),
+            "queue_depth": len(self._events),
+            "pending_counter_keys": len(self._daily_counts),
+            "pending_sketch_keys": len(self._sketch_positions),
+            "max_size": self.max_size,
+            "drop_policy": self.drop_policy,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed_batches": self.failed_batches,
+            "counter_upserts": self.counter_upserts,
+            "sketch_merges": self.sketch_merges,
+            "flushes": flushes,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "avg_batch_size": (
+                round(self.batched / flushes, 1) if flushes else 0
+            ),
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 2),
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 2),
+            "avg_flush_ms": (
+                round(self.total_flush_seconds / flushes * 1000, 2)
+                if flushes
+                else 0
+            ),
+            "last_flush_at": self.last_flush_at,
+        }
+
+
+def _add_sketch_positions(
+    positions: SketchPositions,
+    event: PageViewEvent,
+) -> None:
+    """
+    Record a non-bot hit in the page and site-wide sketches, both for the
+    event's day and for all time.
+    """
+    if is_bot_user_agent(event.user_agent):
+        return
+    index, rank = hash_position(event.fingerprint)
+    for key in (
+        (event.url, event.day),
+        (event.url, None),
+        ("", event.day),
+        ("", None),
+    ):
+        registers = positions.get(key)
+        if registers is None:
+            positions[key] = {index: rank}
+        elif rank > registers.get(index, 0):
+            registers[index] = rank
+
+
+_buffer: Optional[PageViewBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> PageViewBuffer:
+    """
+    Return the process-wide buffer, creating it from settings on first use.
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = PageViewBuffer.from_settings()
+    return _buffer
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Return the statistics of this process's buffer.
+    """
+    return get_buffer().get_stats()
+
+
+def reset_buffer() -> None:
+    """
+    Stop and discard the process-wide buffer so the next call to
+    ``get_buffer`` picks up current settings. Mainly useful in tests.
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.stop()
+        _buffer = None
+
+
+def _flush_on_exit() -> None:
+    """
+    Stop the writer and write out anything still queued on shutdown.
+    """
+    if _buffer is None:
+        return
+    if len(_buffer):
+        logger.info(f"Flushing {len(_buffer)} page views on shutdown")
+    _buffer.stop(timeout=_buffer.flush_interval)
+
+
+atexit.register(_flush_on_exit)
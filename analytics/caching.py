@@ -0,0 +1,145 @@
+# analytics/caching.py
+import logging
+import time
+import uuid
+from typing import (
+    Any,
+    Callable,
+    Optional,
+)
+
+from django.conf import (
+    settings,
+)
+from django.core.cache import (
+    cache,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TIMEOUT = 60 * 5
+_UNSET = object()
+# How long a recompute may hold the refresh lock before it is presumed dead
+DEFAULT_LOCK_TIMEOUT = 30
+# How long a request without any cached value waits for another worker's
+# recompute before doing the work itself
+COLD_WAIT = 0.5
+COLD_POLL = 0.05
+
+
+def cache_timeout() -> int:
+    """Seconds a cached analytics value counts as fresh."""
+    return getattr(
+        settings,
+        "ANALYTICS_CACHE_TIMEOUT",
+        DEFAULT_CACHE_TIMEOUT,
+    )
+
+
+def get_or_refresh(
+    key: str,
+    compute: Callable[[], Any],
+    timeout: Optional[int] = None,
+    entry: Any = _UNSET,
+) -> Any:
+    """
+    Return a cached value, recomputing it in at most one request at a time.
+
+    Entries are stored as ``(fresh_until, value)`` and kept in the cache for
+    ``ANALYTICS_CACHE_STALE_TIMEOUT`` seconds past their freshness. Once an
+    entry goes stale the first request to take the ``<key>:refresh`` lock
+    (``cache.add``) recomputes it while every other request keeps getting
+    the stale value, so an expiring key on a busy page costs one set of
+    queries rather than one per concurrent request. If the recompute fails
+    the stale value is served and the next request retries.
+
+    The lock is only as shared as the cache backend: with the default
+    local-memory cache it is per worker process.
+
+    Args:
+        key: The cache key.
+        compute: Builds the value on a miss. May raise.
+        timeout: Freshness in seconds, ANALYTICS_CACHE_TIMEOUT by default.
+        entry: The raw cached entry if the caller already fetched it (e.g.
+            with ``cache.get_many``); read from the cache otherwise.
+
+    Returns:
+        Any: The fresh, stale or newly computed value.
+    """
+    if timeout is None:
+        timeout = cache_timeout()
+    if entry is _UNSET:
+        entry = cache.get(key)
+    if entry is not None and time.time() < entry[0]:
+        return entry[1]
+
+    lock_key = f"{key}:refresh"
+    lock_timeout = getattr(
+        settings,
+        "ANALYTICS_CACHE_LOCK_TIMEOUT",
+        DEFAULT_LOCK_TIMEOUT,
+    )
+    # A unique token, so a recompute that outlives its lock cannot release
+    # the lock another request has taken since
+    token = uuid.uuid4().hex
+    if not cache.add(
+        lock_key,
+        token,
+        lock_timeout,
+    ):
+        if entry is not None:
+            # Someone else is refreshing; serve stale meanwhile
+            return entry[1]
+        deadline = time.monotonic() + COLD_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(COLD_POLL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[1]
+        # The other recompute is slow or died; do the work ourselves
+        return _refresh(
+            key,
+            compute,
+            timeout,
+        )
+
+    try:
+        return _refresh(
+            key,
+            compute,
+            timeout,
+        )
+    except Exception as e:
+        if entry is None:
+            raise
+        logger.warning(
+            f"Serving stale '{key}' after failed refresh: {e}",
+            exc_info=True,
+        )
+        return entry[1]
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def _refresh(
+    key: str,
+    compute: Callable[[], Any],
+    timeout: int,
+) -> Any:
+    """Compute a value and store it with its freshness deadline."""
+    value = compute()
+    stale_timeout = getattr(
+        settings,
+        "ANALYTICS_CACHE_STALE_TIMEOUT",
+        timeout,
+    )
+    cache.set(
+        key,
+        (
+            time.time() + timeout,
+            value,
+        ),
+        timeout + stale_timeout,
+    )
+    return value
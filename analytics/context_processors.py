@@ -1,6 +1,9 @@
 # analytics/context_processors.py
 
 import logging
+from functools import (
+    partial,
+)
 from datetime import (
     date,
     timedelta,
@@ -9,6 +12,7 @@ from typing import (
     List,
     Dict,
     Any,
+    Optional,
 )
 
 from django.conf import (
@@ -23,18 +27,38 @@ from django.db.models import (
 from django.http import (
     HttpRequest,
 )
+from django.utils.functional import (
+    SimpleLazyObject,
+)
 
+from .caching import (
+    get_or_refresh,
+)
 from .models import (
-    PageView,
     DailyPageViewCount,
-    UniqueVisitor,
+    PageViewTotal,
+    VisitorSketch,
 )
 
 # Get logger instance
 logger = logging.getLogger(__name__)
 
+# One bundle shared by every page, plus a small entry per path
+SITE_CACHE_KEY = "analytics_site_data"
+PAGE_CACHE_KEY = "analytics_page_data_{path}"
+
+# Template variables provided by analytics_context
+CONTEXT_KEYS = (
+    "page_views_count",
+    "today_page_views",
+    "page_unique_visitors",
+    "total_views",
+    "unique_visitors",
+    "popular_pages",
+)
+
 
-def _should_display_analytics(
+def should_display_analytics(
     path: str,
 ) -> bool:
     """
@@ -52,131 +76,84 @@ def _should_display_analytics(
     return True
 
 
-def _get_or_cache_total_views() -> int:
+def _calculate_total_views() -> int:
     """
-    Retrieves total site views from cache or calculates and caches it.
-    Excludes paths defined in AGGREGATE_EXCLUDED_PATHS.
+    Calculates total site views from the PageViewTotal running totals: the
+    site-wide row minus the rows of the paths defined in
+    AGGREGATE_EXCLUDED_PATHS.
     Reads settings dynamically.
     """
-    cache_key = "analytics_total_site_views"
-    total_views = cache.get(cache_key)
-    if total_views is None:
-        try:
-            # Get settings inside the function
-            aggregate_excluded_paths: List[str] = getattr(
-                settings,
-                "ANALYTICS_AGGREGATE_EXCLUDED_PATHS",
-                [],
-            )
-            cache_timeout: int = getattr(
-                settings,
-                "ANALYTICS_CACHE_TIMEOUT",
-                60 * 5,
-            )
-
-            # Use count() - generally efficient enough unless table is massive
-            total_views = PageView.objects.exclude(
-                url__in=aggregate_excluded_paths
-            ).count()
-
-            cache.set(
-                cache_key,
-                total_views,
-                cache_timeout,
-            )
-        except Exception as e:
-            logger.error(
-                f"Failed to calculate total views: {e}",
-                exc_info=True,
-            )
-            total_views = 0
-    return total_views
-
-
-def _get_or_cache_unique_visitors() -> int:
-    """
-    Retrieves unique visitor count from cache or calculates and caches it.
-    Reads settings dynamically.
-    """
-    cache_key = "analytics_unique_visitors"
-    unique_visitors = cache.get(cache_key)
-    if unique_visitors is None:
-        try:
-            # Get setting inside the function
-            cache_timeout: int = getattr(
-                settings,
-                "ANALYTICS_CACHE_TIMEOUT",
-                60 * 5,
-            )
-
-            unique_visitors = UniqueVisitor.objects.filter(
-                is_bot=False
-            ).count()
-            cache.set(
-                cache_key,
-                unique_visitors,
-                cache_timeout,
-            )
-        except Exception as e:
-            logger.error(
-                f"Failed to calculate unique visitors: {e}",
-                exc_info=True,
-            )
-            unique_visitors = 0
-    return unique_visitors
+    # Get settings inside the function
+    aggregate_excluded_paths: List[str] = getattr(
+        settings,
+        "ANALYTICS_AGGREGATE_EXCLUDED_PATHS",
+        [],
+    )
+    totals = dict(
+        PageViewTotal.objects.filter(
+            url__in=[
+                PageViewTotal.SITE_TOTAL,
+                *aggregate_excluded_paths,
+            ]
+        ).values_list(
+            "url",
+            "count",
+        )
+    )
+    return totals.pop(
+        PageViewTotal.SITE_TOTAL,
+        0,
+    ) - sum(totals.values())
 
 
-def _get_or_cache_popular_pages() -> List[
+def _calculate_popular_pages() -> List[
     Dict[
         str,
         Any,
     ]
 ]:
     """
-    Retrieves top 5 pages (last 7 days) from cache or calculates/caches them.
+    Calculates the top 5 pages of the last 7 days.
     Excludes paths defined in AGGREGATE_EXCLUDED_PATHS.
     Reads settings dynamically.
     """
-    cache_key = "analytics_popular_pages"
-    popular_pages = cache.get(cache_key)
-    if popular_pages is None:
-        try:
-            # Get settings inside the function
-            aggregate_excluded_paths: List[str] = getattr(
-                settings,
-                "ANALYTICS_AGGREGATE_EXCLUDED_PATHS",
-                [],
-            )
-            cache_timeout: int = getattr(
-                settings,
-                "ANALYTICS_CACHE_TIMEOUT",
-                60 * 5,
-            )
-
-            today = date.today()
-            start_date = today - timedelta(days=7)
+    # Get settings inside the function
+    aggregate_excluded_paths: List[str] = getattr(
+        settings,
+        "ANALYTICS_AGGREGATE_EXCLUDED_PATHS",
+        [],
+    )
+    today = date.today()
+    start_date = today - timedelta(days=7)
 
-            popular_pages_query = (
-                DailyPageViewCount.objects.filter(date__gte=start_date)
-                .exclude(url__in=aggregate_excluded_paths)
-                .values("url")
-                .annotate(total_views=Sum("count"))
-                .order_by("-total_views")[:5]
+    popular_pages_query = (
+        # A bounded range lets SQLite pick the (date, url, count)
+        # covering index over the (url, date) unique index
+        DailyPageViewCount.objects.filter(
+            date__range=(
+                start_date,
+                today,
             )
+        )
+        .exclude(url__in=aggregate_excluded_paths)
+        .values("url")
+        .annotate(total_views=Sum("count"))
+        .order_by("-total_views")[:5]
+    )
+    return list(popular_pages_query)
 
-            popular_pages = list(popular_pages_query)
-            cache.set(
-                cache_key,
-                popular_pages,
-                cache_timeout,
-            )
-        except Exception as e:
-            logger.error(
-                f"Failed to calculate popular pages: {e}",
-                exc_info=True,
-            )
-            popular_pages = []
-    return popular_pages
+
+def _get_site_analytics() -> Dict[str, Any]:
+    """
+    Builds the site-wide bundle shared by every page. Unique visitors are a
+    HyperLogLog estimate read from the all-time site-wide VisitorSketch row
+    (about 1.6% standard error, see analytics.hll).
+    """
+    return {
+        "total_views": _calculate_total_views(),
+        "unique_visitors": VisitorSketch.estimate(),
+        "popular_pages": _calculate_popular_pages(),
+    }
 
 
 def _get_page_specific_analytics(
@@ -189,17 +166,25 @@ def _get_page_specific_analytics(
     page_data = {
         "page_views_count": 0,
         "today_page_views": 0,
+        "page_unique_visitors": 0,
     }
     try:
-        page_data["page_views_count"] = PageView.objects.filter(
-            url=path
-        ).count()
+        page_data["page_views_count"] = (
+            PageViewTotal.objects.filter(url=path)
+            .values_list(
+                "count",
+                flat=True,
+            )
+            .first()
+            or 0
+        )
         today = date.today()
         daily_count = DailyPageViewCount.objects.filter(
             url=path,
             date=today,
         ).first()
         page_data["today_page_views"] = daily_count.count if daily_count else 0
+        page_data["page_unique_visitors"] = VisitorSketch.estimate(url=path)
     except Exception as e:
         logger.error(
             f"Failed to get page-specific analytics for {path}: {e}",
@@ -208,6 +193,78 @@ def _get_page_specific_analytics(
     return page_data
 
 
+def load_analytics(
+    path: str,
+) -> Dict[str, Any]:
+    """
+    Loads the analytics values for a path from the cache, recomputing
+    whatever is missing or stale.
+    """
+    # 1. Fetch the shared site-wide bundle and this page's small slice in
+    # one round trip. Either one that is missing or stale is recomputed by
+    # a single request while the others keep serving the stale copy.
+    page_cache_key = PAGE_CACHE_KEY.format(path=path)
+    cached = cache.get_many(
+        [
+            SITE_CACHE_KEY,
+            page_cache_key,
+        ]
+    )
+
+    # 2. Get page-specific data
+    page_data = get_or_refresh(
+        page_cache_key,
+        lambda: _get_page_specific_analytics(path),
+        entry=cached.get(page_cache_key),
+    )
+
+    # 3. Get site-wide data
+    try:
+        site_data = get_or_refresh(
+            SITE_CACHE_KEY,
+            _get_site_analytics,
+            entry=cached.get(SITE_CACHE_KEY),
+        )
+    except Exception as e:
+        logger.error(
+            f"Failed to calculate site-wide analytics: {e}",
+            exc_info=True,
+        )
+        site_data = {
+            "total_views": 0,
+            "unique_visitors": 0,
+            "popular_pages": [],
+        }
+
+    # 4. Combine data into one dictionary
+    return {
+        **page_data,
+        **site_data,
+    }
+
+
+class _LazyAnalytics:
+    """
+    Loads the analytics values for a path the first time any of them is
+    used, then hands out the same result for the rest of the render.
+    """
+
+    def __init__(
+        self,
+        path: str,
+    ) -> None:
+        self.path = path
+        self._data: Optional[Dict[str, Any]] = None
+
+    def get(
+        self,
+        key: str,
+    ) -> Any:
+        if self._data is None:
+            self._data = load_analytics(self.path)
+        return self._data[key]
+
+
 # --- Main Context Processor ---
 
 
@@ -218,46 +275,26 @@ def analytics_context(
     Adds analytics data to the template context,
     using caching and centralized settings.
     Reads settings dynamically via helper functions.
+
+    The values are lazy: nothing is read from the cache or the database
+    until a template actually renders one of them, so pages without the
+    analytics sidebar (API views, the editor, HTMX partials) pay nothing.
+    All values share one loader, so the first one used fetches them all.
     """
     path = request.path
 
-    # 1. Check if analytics should be displayed on this path at all
-    # _should_display_analytics now reads the setting dynamically
-    if not _should_display_analytics(path):
+    # Check if analytics should be displayed on this path at all
+    # should_display_analytics now reads the setting dynamically
+    if not should_display_analytics(path):
         return {}
 
-    # 2. Prepare cache key for page-specific + global data bundle
-    cache_key = f"analytics_context_data_{path}"
-    context = cache.get(cache_key)
-
-    if context is None:
-        # 3. Get page-specific data
-        page_data = _get_page_specific_analytics(path)
-
-        # 4. Get site-wide data (helpers now read settings dynamically)
-        total_views = _get_or_cache_total_views()
-        unique_visitors = _get_or_cache_unique_visitors()
-        popular_pages = _get_or_cache_popular_pages()
-
-        # 5. Combine data into context dictionary
-        context = {
-            **page_data,
-            "total_views": total_views,
-            "unique_visitors": unique_visitors,
-            "popular_pages": popular_pages,
-        }
-
-        # 6. Cache the combined context for this page
-        # Get setting inside the function
-        cache_timeout: int = getattr(
-            settings,
-            "ANALYTICS_CACHE_TIMEOUT",
-            60 * 5,
-        )
-        cache.set(
-            cache_key,
-            context,
-            cache_timeout,
+    analytics = _LazyAnalytics(path)
+    return {
+        key: SimpleLazyObject(
+            partial(
+                analytics.get,
+                key,
+            )
         )
-
-    return context
+        for key in CONTEXT_KEYS
+    }
@@ -0,0 +1,104 @@
+# analytics/management/commands/analytics_rollup.py
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from analytics.models import (
+    PageViewRollup,
+)
+from analytics.retention import (
+    DEFAULT_BATCH_SIZE,
+    prune_visitor_sketches,
+    rollup_page_views,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll raw page views older than the retention window into hourly or "
+        "daily aggregates and delete them in small batches, then fold "
+        "expired daily visitor sketches into the all-time ones. Safe to "
+        "interrupt and re-run; schedule it e.g. nightly from cron:\n"
+        "    15 3 * * * python manage.py analytics_rollup --pause 0.1"
+    )
+
+    def add_arguments(
+        self,
+        parser,
+    ):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Keep raw page views for this many days "
+            "(default: ANALYTICS_RETENTION_DAYS)",
+        )
+        parser.add_argument(
+            "--granularity",
+            choices=[
+                PageViewRollup.HOUR,
+                PageViewRollup.DAY,
+            ],
+            default=PageViewRollup.DAY,
+            help="Rollup period (default: day)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Rows per transaction (default: {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between batches (default: 0)",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=None,
+            help="Stop after this many batches; the next run resumes",
+        )
+
+    def handle(
+        self,
+        *args,
+        **options,
+    ):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options["days"] is not None and options["days"] < 0:
+            raise CommandError("--days cannot be negative")
+
+        def progress(
+            batches,
+            rows,
+        ):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  batch {batches}: {rows} rows so far")
+
+        result = rollup_page_views(
+            older_than_days=options["days"],
+            granularity=options["granularity"],
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            max_batches=options["max_batches"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rolled up {result['rows']} page views into "
+                f"{result['rollup_keys']} {options['granularity']} rollup "
+                f"rows in {result['batches']} batches"
+            )
+        )
+        pruned = prune_visitor_sketches(
+            older_than_days=options["days"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Pruned {pruned['sketches']} daily visitor sketches"
+            )
+        )
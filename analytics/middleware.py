@@ -23,14 +23,14 @@ from django.conf import (
 from datetime import (
     date,
 )
-from django.db.models import (
-    F,
-)  # Import F expression
-
-from .models import (
-    PageView,
-    DailyPageViewCount,
-    UniqueVisitor,
+
+from .buffer import (
+    PageViewEvent,
+    get_buffer,
+)
+from .utils import (
+    referrer_host,
+    visitor_fingerprint,
 )
 
 # Configure logger
@@ -42,9 +42,9 @@ class PageViewMiddleware:
     Middleware that tracks page views, unique visitors, and daily view counts.
 
     This middleware captures analytics data for non-excluded
-    paths and stores it
-    in the database. It handles tracking page views, updating daily counts,
-    and managing unique visitor records.
+    paths and hands it to the analytics write buffer
+    (see analytics.buffer), which batches the page view, daily count and
+    unique visitor writes instead of running them per request.
 
     Attributes:
         get_response (Callable): The next middleware or view in the chain.
@@ -150,21 +150,22 @@ class PageViewMiddleware:
                 "",
             )
 
-            # --- Perform DB operations only if tracking is enabled ---
-            # Record the page view
-            self._record_page_view(
-                request.path,
-                ip_address,
-                user_agent,
-            )
-
-            # Update daily count
-            self._update_daily_count(request.path)
-
-            # Track unique visitors
-            self._track_unique_visitor(
-                ip_address,
-                user_agent,
+            # --- Queue the hit; the buffer batches the DB writes ---
+            get_buffer().add(
+                PageViewEvent(
+                    url=request.path,
+                    ip_address=ip_address,
+                    user_agent=user_agent,
+                    timestamp=now(),
+                    day=date.today(),
+                    fingerprint=visitor_fingerprint(
+                        ip_address,
+                        user_agent,
+                    ),
+                    referrer_host=referrer_host(
+                        request.META.get("HTTP_REFERER")
+                    ),
+                )
             )
 
         except Exception as e:
@@ -306,107 +307,3 @@ class PageViewMiddleware:
         ):  # Catch TypeError for None or unexpected types
             logger.warning(f"Invalid or unexpected IP address format: {ip}")
             return "0.0.0.0"  # Default fallback for invalid IPs
-
-    def _record_page_view(
-        self,
-        url: str,
-        ip_address: str,
-        user_agent: str,
-    ) -> None:
-        """
-        Record a page view in the database. Assumes URL validation happened.
-
-        Args:
-            url: The URL path that was viewed.
-            ip_address: The visitor's IP address.
-            user_agent: The visitor's user agent string.
-        """
-        try:
-            # --- REMOVED REDUNDANT CHECKS ---
-            # No need to check excluded_prefixes or excluded_paths here,
-            # as _should_track_request already handled it.
-
-            PageView.objects.create(
-                url=url,
-                ip_address=ip_address,
-                user_agent=user_agent,
-            )
-            logger.debug(
-                f"Recorded page view for URL: {url}"
-            )  # Optional debug log
-        except Exception as e:
-            logger.error(f"Failed to record page view for {url}: {str(e)}")
-
-    def _update_daily_count(
-        self,
-        url: str,
-    ) -> None:
-        """
-        Update the daily page view count for a URL. Assumes URL validation.
-
-        Args:
-            url: The URL path to update counts for.
-        """
-        today = date.today()
-        try:
-            # --- REMOVED REDUNDANT CHECKS ---
-            # No need to check excluded_prefixes or excluded_paths here.
-
-            (
-                daily_count,
-                created,
-            ) = DailyPageViewCount.objects.get_or_create(
-                url=url,
-                date=today,
-                defaults={"count": 1},
-            )
-
-            if not created:
-                # Use F() expression for atomic update to avoid race conditions
-                DailyPageViewCount.objects.filter(
-                    url=url,
-                    date=today,
-                ).update(count=F("count") + 1)
-        except Exception as e:
-            logger.error(f"Failed to update daily count for {url}: {str(e)}")
-            # Re-raise might be too disruptive; consider just logging
-            # raise
-
-    def _track_unique_visitor(
-        self,
-        ip_address: str,
-        user_agent: str,
-    ) -> None:
-        """
-        Track a unique visitor or update their visit count and last visit.
-
-        Args:
-            ip_address: The visitor's IP address.
-            user_agent: The visitor's user agent string.
-        """
-        _now = now()  # Get current time once
-        try:
-            (
-                visitor,
-                created,
-            ) = UniqueVisitor.objects.get_or_create(
-                ip_address=ip_address,
-                user_agent=user_agent,  # Consider normalizing user agents
-                defaults={
-                    "first_visit": _now,
-                    "last_visit": _now,
-                    "visit_count": 1,  # Start count at 1 for new visitors
-                },
-            )
-
-            if not created:
-                # Update the existing visitor record efficiently
-                UniqueVisitor.objects.filter(pk=visitor.pk).update(
-                    last_visit=_now,
-                    visit_count=F("visit_count") + 1,
-                )
-
-        except Exception as e:
-            logger.error(
-                f"Failed to track unique visitor {ip_address}: {str(e)}"
-            )
@@ -0,0 +1,29 @@
+# Generated by Django 5.1 on 2026-10-18 15:47
+
+from django.db import (
+    migrations,
+    models,
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "analytics",
+            "0002_uniquevisitor_is_bot",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uniquevisitor",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=32,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,110 @@
+from django.db import (
+    migrations,
+    models,
+)
+from django.db.models import (
+    Max,
+    Min,
+    Sum,
+)
+
+from analytics.utils import (
+    visitor_fingerprint,
+)
+
+BATCH_SIZE = 2000
+
+
+def backfill_fingerprints(
+    apps,
+    schema_editor,
+):
+    """
+    Set the fingerprint of every visitor row created before the column.
+
+    A NULL and an empty user agent hash to the same fingerprint, so rows
+    that only differed that way are merged into the oldest one first.
+    """
+    UniqueVisitor = apps.get_model(
+        "analytics",
+        "UniqueVisitor",
+    )
+    rows = UniqueVisitor.objects.filter(fingerprint__isnull=True)
+
+    seen = {}
+    duplicates = {}
+    for pk, ip_address, user_agent in rows.order_by("pk").values_list(
+        "pk",
+        "ip_address",
+        "user_agent",
+    ):
+        fingerprint = visitor_fingerprint(
+            ip_address,
+            user_agent,
+        )
+        if fingerprint in seen:
+            duplicates.setdefault(
+                seen[fingerprint],
+                [],
+            ).append(pk)
+        else:
+            seen[fingerprint] = pk
+
+    for keep_pk, drop_pks in duplicates.items():
+        group = UniqueVisitor.objects.filter(pk__in=[keep_pk, *drop_pks])
+        totals = group.aggregate(
+            first_visit=Min("first_visit"),
+            last_visit=Max("last_visit"),
+            visit_count=Sum("visit_count"),
+        )
+        UniqueVisitor.objects.filter(pk__in=drop_pks).delete()
+        UniqueVisitor.objects.filter(pk=keep_pk).update(**totals)
+
+    batch = []
+    for fingerprint, pk in seen.items():
+        batch.append(
+            UniqueVisitor(
+                pk=pk,
+                fingerprint=fingerprint,
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            UniqueVisitor.objects.bulk_update(
+                batch,
+                ["fingerprint"],
+            )
+            batch = []
+    if batch:
+        UniqueVisitor.objects.bulk_update(
+            batch,
+            ["fingerprint"],
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "analytics",
+            "0003_uniquevisitor_fingerprint",
+        ),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_fingerprints,
+            migrations.RunPython.noop,
+        ),
+        migrations.AlterUniqueTogether(
+            name="uniquevisitor",
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name="uniquevisitor",
+            name="fingerprint",
+            field=models.CharField(
+                editable=False,
+                max_length=32,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.1 on 2026-10-18 15:51
+
+from django.db import (
+    migrations,
+    models,
+)
+
+from analytics.hll import (
+    HyperLogLog,
+)
+
+
+def seed_site_sketch(
+    apps,
+    schema_editor,
+):
+    """
+    Build the all-time site-wide sketch from the existing visitor rows so
+    the unique visitor count carries over. Per-page and daily sketches
+    start filling from the first request after the upgrade.
+    """
+    UniqueVisitor = apps.get_model(
+        "analytics",
+        "UniqueVisitor",
+    )
+    VisitorSketch = apps.get_model(
+        "analytics",
+        "VisitorSketch",
+    )
+    sketch = HyperLogLog()
+    fingerprints = UniqueVisitor.objects.filter(is_bot=False).values_list(
+        "fingerprint",
+        flat=True,
+    )
+    for fingerprint in fingerprints.iterator(chunk_size=2000):
+        sketch.add(fingerprint)
+    VisitorSketch.objects.create(
+        url="",
+        date=None,
+        registers=sketch.to_bytes(),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "analytics",
+            "0004_backfill_uniquevisitor_fingerprint",
+        ),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VisitorSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "url",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "date",
+                    models.DateField(
+                        blank=True,
+                        null=True,
+                    ),
+                ),
+                (
+                    "registers",
+                    models.BinaryField(),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("date__isnull", False)),
+                        fields=(
+                            "url",
+                            "date",
+                        ),
+                        name="analytics_visitorsketch_url_date",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("date__isnull", True)),
+                        fields=("url",),
+                        name="analytics_visitorsketch_url_all_time",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(
+            seed_site_sketch,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.1 on 2026-10-18 16:02
+
+from django.db import (
+    migrations,
+    models,
+)
+from django.db.models import (
+    Count,
+)
+
+
+def backfill_totals(
+    apps,
+    schema_editor,
+):
+    """
+    Seed the running totals from the page views recorded so far.
+    """
+    PageView = apps.get_model(
+        "analytics",
+        "PageView",
+    )
+    PageViewTotal = apps.get_model(
+        "analytics",
+        "PageViewTotal",
+    )
+    totals = [
+        PageViewTotal(
+            url=url,
+            count=views,
+        )
+        for url, views in PageView.objects.values("url")
+        .annotate(views=Count("id"))
+        .values_list(
+            "url",
+            "views",
+        )
+    ]
+    totals.append(
+        PageViewTotal(
+            url="",
+            count=sum(total.count for total in totals),
+        )
+    )
+    PageViewTotal.objects.bulk_create(
+        totals,
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "analytics",
+            "0005_visitorsketch",
+        ),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PageViewTotal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "url",
+                    models.CharField(
+                        blank=True,
+                        max_length=255,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveBigIntegerField(default=0),
+                ),
+            ],
+        ),
+        migrations.RunPython(
+            backfill_totals,
+            migrations.RunPython.noop,
+        ),
+    ]
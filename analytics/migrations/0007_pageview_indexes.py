@@ -0,0 +1,56 @@
+# Generated by Django 5.1 on 2026-10-18 16:10
+
+from django.db import (
+    migrations,
+    models,
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "analytics",
+            "0006_pageviewtotal",
+        ),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="dailypageviewcount",
+            index=models.Index(
+                fields=[
+                    "date",
+                    "url",
+                    "count",
+                ],
+                name="analytics_dpvc_date_url_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageview",
+            index=models.Index(
+                fields=[
+                    "url",
+                    "timestamp",
+                ],
+                name="analytics_pv_url_ts_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageview",
+            index=models.Index(
+                fields=[
+                    "ip_address",
+                    "-timestamp",
+                ],
+                name="analytics_pv_ip_ts_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageview",
+            index=models.Index(
+                fields=["timestamp"],
+                name="analytics_pv_ts_idx",
+            ),
+        ),
+    ]
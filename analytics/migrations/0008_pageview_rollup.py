@@ -0,0 +1,91 @@
+# Generated by Django 5.1 on 2026-10-18 16:24
+
+from django.db import (
+    migrations,
+    models,
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "analytics",
+            "0007_pageview_indexes",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pageview",
+            name="referrer_host",
+            field=models.CharField(
+                blank=True,
+                default="",
+                max_length=255,
+            ),
+        ),
+        migrations.CreateModel(
+            name="PageViewRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[
+                            (
+                                "hour",
+                                "Hourly",
+                            ),
+                            (
+                                "day",
+                                "Daily",
+                            ),
+                        ],
+                        max_length=4,
+                    ),
+                ),
+                (
+                    "period_start",
+                    models.DateTimeField(),
+                ),
+                (
+                    "url",
+                    models.CharField(max_length=255),
+                ),
+                (
+                    "is_bot",
+                    models.BooleanField(default=False),
+                ),
+                (
+                    "referrer_bucket",
+                    models.CharField(max_length=16),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(default=0),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "granularity",
+                            "period_start",
+                            "url",
+                            "is_bot",
+                            "referrer_bucket",
+                        ),
+                        name="analytics_pageviewrollup_key",
+                    ),
+                ],
+            },
+        ),
+    ]
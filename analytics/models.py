@@ -6,6 +6,15 @@ from django.utils.timezone import (
     now,
 )
 
+from .hll import (
+    HyperLogLog,
+    merged,
+)
+from .utils import (
+    is_bot_user_agent,
+    visitor_fingerprint,
+)
+
 
 class PageView(models.Model):
     url = models.CharField(max_length=255)
@@ -15,6 +24,37 @@ class PageView(models.Model):
         null=True,
     )
     timestamp = models.DateTimeField(default=now)
+    # Host of the Referer header, empty for direct visits
+    referrer_host = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+    )
+
+    class Meta:
+        indexes = [
+            # Per-page history and the admin's url filter
+            models.Index(
+                fields=[
+                    "url",
+                    "timestamp",
+                ],
+                name="analytics_pv_url_ts_idx",
+            ),
+            # UniqueVisitor.most_common_url: filter by ip, newest first
+            models.Index(
+                fields=[
+                    "ip_address",
+                    "-timestamp",
+                ],
+                name="analytics_pv_ip_ts_idx",
+            ),
+            # Admin date_hierarchy and time range scans
+            models.Index(
+                fields=["timestamp"],
+                name="analytics_pv_ts_idx",
+            ),
+        ]
 
     def __str__(
         self,
@@ -32,6 +72,18 @@ class DailyPageViewCount(models.Model):
             "url",
             "date",
         )
+        indexes = [
+            # Popular pages: date range, grouped by url, summing count.
+            # Covers the whole query so the table itself is never read.
+            models.Index(
+                fields=[
+                    "date",
+                    "url",
+                    "count",
+                ],
+                name="analytics_dpvc_date_url_idx",
+            ),
+        ]
 
     def __str__(
         self,
@@ -39,6 +91,82 @@ class DailyPageViewCount(models.Model):
         return f"{self.url} - {self.date}: {self.count} views"
 
 
+class PageViewRollup(models.Model):
+    """
+    Page views aggregated per hour or day once the raw rows are expired.
+
+    Written by the ``analytics_rollup`` management command, which deletes
+    the PageView rows it has rolled up.
+    """
+
+    HOUR = "hour"
+    DAY = "day"
+    GRANULARITY_CHOICES = [
+        (
+            HOUR,
+            "Hourly",
+        ),
+        (
+            DAY,
+            "Daily",
+        ),
+    ]
+
+    granularity = models.CharField(
+        max_length=4,
+        choices=GRANULARITY_CHOICES,
+    )
+    period_start = models.DateTimeField()
+    url = models.CharField(max_length=255)
+    is_bot = models.BooleanField(default=False)
+    referrer_bucket = models.CharField(max_length=16)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "granularity",
+                    "period_start",
+                    "url",
+                    "is_bot",
+                    "referrer_bucket",
+                ],
+                name="analytics_pageviewrollup_key",
+            ),
+        ]
+
+    def __str__(
+        self,
+    ):
+        return (
+            f"{self.url} - {self.period_start} ({self.granularity}): "
+            f"{self.count} views"
+        )
+
+
+class PageViewTotal(models.Model):
+    """
+    All-time view count for a URL, kept up to date by the write buffer.
+
+    The row with an empty ``url`` holds the total for the whole site.
+    """
+
+    SITE_TOTAL = ""
+
+    url = models.CharField(
+        max_length=255,
+        unique=True,
+        blank=True,
+    )
+    count = models.PositiveBigIntegerField(default=0)
+
+    def __str__(
+        self,
+    ):
+        return f"{self.url or 'site'}: {self.count} views"
+
+
 class UniqueVisitor(models.Model):
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField(
@@ -49,25 +177,30 @@ class UniqueVisitor(models.Model):
     last_visit = models.DateTimeField(default=now)
     visit_count = models.PositiveIntegerField(default=1)
     is_bot = models.BooleanField(default=False)
+    # Fixed-width hash of (ip_address, user_agent), see visitor_fingerprint
+    fingerprint = models.CharField(
+        max_length=32,
+        unique=True,
+        editable=False,
+    )
 
     def save(
         self,
         *args,
         **kwargs,
     ):
-        if "bot" in self.user_agent.lower():
+        if is_bot_user_agent(self.user_agent):
             self.is_bot = True
+        if not self.fingerprint:
+            self.fingerprint = visitor_fingerprint(
+                self.ip_address,
+                self.user_agent,
+            )
         super().save(
             *args,
             **kwargs,
         )
 
-    class Meta:
-        unique_together = (
-            "ip_address",
-            "user_agent",
-        )
-
     def most_common_url(
         self,
     ):
@@ -82,3 +215,84 @@ class UniqueVisitor(models.Model):
         self,
     ):
         return f"{self.ip_address} - Visits: {self.visit_count}"
+
+
+class VisitorSketch(models.Model):
+    """
+    HyperLogLog sketch of the non-bot visitors seen on a URL and day.
+
+    An empty ``url`` holds the site-wide sketch and a NULL ``date`` the
+    all-time sketch, so site-wide and per-page totals are a single row
+    lookup; daily rows can be merged for arbitrary date ranges.
+    """
+
+    SITE_WIDE = ""
+
+    url = models.CharField(
+        max_length=255,
+        blank=True,
+        default=SITE_WIDE,
+    )
+    date = models.DateField(
+        null=True,
+        blank=True,
+    )
+    registers = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "url",
+                    "date",
+                ],
+                condition=models.Q(date__isnull=False),
+                name="analytics_visitorsketch_url_date",
+            ),
+            models.UniqueConstraint(
+                fields=["url"],
+                condition=models.Q(date__isnull=True),
+                name="analytics_visitorsketch_url_all_time",
+            ),
+        ]
+
+    @classmethod
+    def estimate(
+        cls,
+        url: str = SITE_WIDE,
+        start=None,
+        end=None,
+    ) -> int:
+        """
+        Estimate unique visitors for a URL over all time or a date range.
+
+        Args:
+            url: The page path, or ``SITE_WIDE`` for the whole site.
+            start: First day of the range, inclusive. All time when both
+                ``start`` and ``end`` are None.
+            end: Last day of the range, inclusive.
+
+        Returns:
+            int: The estimated number of unique non-bot visitors.
+        """
+        sketches = cls.objects.filter(url=url)
+        if start is None and end is None:
+            sketches = sketches.filter(date__isnull=True)
+        else:
+            sketches = sketches.filter(date__isnull=False)
+            if start is not None:
+                sketches = sketches.filter(date__gte=start)
+            if end is not None:
+                sketches = sketches.filter(date__lte=end)
+        return merged(
+            HyperLogLog.from_bytes(bytes(registers))
+            for registers in sketches.values_list(
+                "registers",
+                flat=True,
+            )
+        ).count()
+
+    def __str__(
+        self,
+    ):
+        return f"{self.url or 'site'} - {self.date or 'all time'}"
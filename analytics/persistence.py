@@ -0,0 +1,430 @@
+# analytics/persistence.py
+import logging
+from datetime import (
+    date,
+)
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+from django.db import (
+    connection,
+    models,
+    transaction,
+)
+from django.db.models import (
+    Count,
+    Q,
+    Sum,
+)
+
+from .models import (
+    PageView,
+    DailyPageViewCount,
+    PageViewRollup,
+    PageViewTotal,
+    UniqueVisitor,
+    VisitorSketch,
+)
+from .hll import (
+    HyperLogLog,
+)
+from .utils import (
+    is_bot_user_agent,
+)
+
+if TYPE_CHECKING:
+    from .buffer import (
+        PageViewEvent,
+    )
+
+logger = logging.getLogger(__name__)
+
+
+def write_events(
+    events: Iterable["PageViewEvent"],
+) -> int:
+    """
+    Persist a batch of buffered page view events in one transaction.
+
+    Raw page views are inserted with a single ``bulk_create``; unique
+    visitors are aggregated in memory by fingerprint first, so each distinct
+    visitor costs one upsert no matter how many hits it received in the
+    batch (see upsert_unique_visitors). Daily counts are not written here, the
+    buffer keeps its own counter map for them (see increment_daily_counts).
+
+    Args:
+        events: The buffered events to write.
+
+    Returns:
+        int: The number of events written.
+    """
+    events = list(events)
+    if not events:
+        return 0
+
+    with transaction.atomic():
+        PageView.objects.bulk_create(
+            [
+                PageView(
+                    url=event.url,
+                    ip_address=event.ip_address,
+                    user_agent=event.user_agent,
+                    timestamp=event.timestamp,
+                    referrer_host=event.referrer_host,
+                )
+                for event in events
+            ]
+        )
+        upsert_unique_visitors(_aggregate_visitors(events))
+
+    logger.debug(f"Wrote batch of {len(events)} page view events")
+    return len(events)
+
+
+def increment_daily_counts(
+    counts: Dict[Tuple[str, date], int],
+) -> int:
+    """
+    Add aggregated view counts to DailyPageViewCount and PageViewTotal.
+
+    Each ``(url, date)`` key is applied with a single
+    ``INSERT ... ON CONFLICT DO UPDATE SET count = count + N`` statement, so
+    a hot page costs one write per flush instead of two per hit. The same
+    counts are rolled up into the per-URL and site-wide running totals in
+    the same transaction, so the two tables never drift apart.
+
+    Args:
+        counts: Mapping of ``(url, date)`` to the number of new views.
+
+    Returns:
+        int: The number of daily keys written.
+    """
+    if not counts:
+        return 0
+
+    totals: Dict[Tuple[str], int] = {}
+    for (url, _), count in counts.items():
+        totals[(url,)] = totals.get((url,), 0) + count
+    totals[(PageViewTotal.SITE_TOTAL,)] = sum(counts.values())
+
+    with transaction.atomic():
+        written = upsert_increments(
+            DailyPageViewCount,
+            (
+                "url",
+                "date",
+            ),
+            "count",
+            counts,
+        )
+        upsert_increments(
+            PageViewTotal,
+            ("url",),
+            "count",
+            totals,
+        )
+    return written
+
+
+def rebuild_page_view_totals() -> int:
+    """
+    Recompute PageViewTotal from the raw PageView rows plus the rollups of
+    the rows that have already been expired.
+
+    Only needed to repair the totals, e.g. after importing page views
+    directly; the write buffer keeps them current otherwise.
+
+    Returns:
+        int: The number of URLs with a total.
+    """
+    per_url = (
+        PageView.objects.values("url")
+        .annotate(views=Count("id"))
+        .values_list(
+            "url",
+            "views",
+        )
+    )
+    rolled_up = (
+        PageViewRollup.objects.values("url")
+        .annotate(views=Sum("count"))
+        .values_list(
+            "url",
+            "views",
+        )
+    )
+    counts: Dict[str, int] = {}
+    for url, views in list(per_url) + list(rolled_up):
+        counts[url] = counts.get(url, 0) + views
+    totals = [
+        PageViewTotal(
+            url=url,
+            count=views,
+        )
+        for url, views in counts.items()
+    ]
+    with transaction.atomic():
+        PageViewTotal.objects.all().delete()
+        PageViewTotal.objects.bulk_create(
+            totals
+            + [
+                PageViewTotal(
+                    url=PageViewTotal.SITE_TOTAL,
+                    count=sum(total.count for total in totals),
+                )
+            ]
+        )
+    return len(totals)
+
+
+def upsert_increments(
+    model: Type[models.Model],
+    key_fields: Sequence[str],
+    count_field: str,
+    increments: Dict[Tuple, int],
+) -> int:
+    """
+    Insert counter rows or add to the existing ones in one statement per key.
+
+    ``key_fields`` must be covered by a unique constraint on ``model``. The
+    ``ON CONFLICT`` upsert syntax is shared by SQLite (3.24+) and
+    PostgreSQL.
+
+    Args:
+        model: The model holding the counters.
+        key_fields: Names of the fields identifying a counter row.
+        count_field: Name of the field to increment.
+        increments: Mapping of key tuples to the amount to add.
+
+    Returns:
+        int: The number of keys written.
+    """
+    if not increments:
+        return 0
+
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in key_fields]
+    key_columns = ", ".join(quote(field.column) for field in fields)
+    count_column = quote(model._meta.get_field(count_field).column)
+    placeholders = ", ".join(["%s"] * (len(fields) + 1))
+    sql = (
+        f"INSERT INTO {table} ({key_columns}, {count_column}) "
+        f"VALUES ({placeholders}) "
+        f"ON CONFLICT ({key_columns}) DO UPDATE SET "
+        f"{count_column} = {table}.{count_column} + excluded.{count_column}"
+    )
+    params = [
+        [
+            field.get_db_prep_save(
+                value,
+                connection,
+            )
+            for field, value in zip(
+                fields,
+                key,
+            )
+        ]
+        + [increment]
+        for key, increment in increments.items()
+    ]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                sql,
+                params,
+            )
+    return len(params)
+
+
+def merge_visitor_sketches(
+    positions: Dict[Tuple[str, Optional[date]], Dict[int, int]],
+) -> int:
+    """
+    Merge sparse HyperLogLog register updates into the stored sketches.
+
+    The touched rows are locked and read in one query, merged in memory and
+    written back with one bulk update plus one bulk insert for new keys.
+    Merging takes the register-wise max, so applying the same updates twice
+    (e.g. a retried flush, or two workers seeing the same visitor) is safe.
+
+    Args:
+        positions: Mapping of ``(url, date)`` to ``{index: rank}`` updates;
+            an empty url is the site-wide sketch and a None date all time.
+
+    Returns:
+        int: The number of sketches written.
+    """
+    if not positions:
+        return 0
+
+    urls = {url for url, _ in positions}
+    days = {day for _, day in positions if day is not None}
+    with transaction.atomic():
+        existing = {
+            (sketch.url, sketch.date): sketch
+            for sketch in VisitorSketch.objects.select_for_update().filter(
+                Q(date__isnull=True) | Q(date__in=days),
+                url__in=urls,
+            )
+        }
+        to_update = []
+        to_create = []
+        for key, updates in positions.items():
+            sketch = existing.get(key)
+            if sketch is None:
+                hll = HyperLogLog()
+                sketch = VisitorSketch(
+                    url=key[0],
+                    date=key[1],
+                )
+                to_create.append(sketch)
+            else:
+                hll = HyperLogLog.from_bytes(bytes(sketch.registers))
+                to_update.append(sketch)
+            hll.update(updates)
+            sketch.registers = hll.to_bytes()
+        if to_update:
+            VisitorSketch.objects.bulk_update(
+                to_update,
+                ["registers"],
+            )
+        if to_create:
+            VisitorSketch.objects.bulk_create(to_create)
+    return len(positions)
+
+
+def upsert_unique_visitors(
+    visitors: Dict[str, Dict],
+) -> int:
+    """
+    Record aggregated visits with one ``INSERT ... ON CONFLICT`` statement.
+
+    Rows conflict on the fixed-width ``fingerprint`` column, so the unique
+    lookup never compares the full user agent. New visitors are inserted
+    with their first/last visit and bot flag; existing ones only get
+    ``first_visit`` moved back, ``last_visit`` moved forward and
+    ``visit_count`` incremented, whatever order batches arrive in.
+
+    Args:
+        visitors: Mapping of fingerprint to the visitor data, as returned
+            by ``_aggregate_visitors``.
+
+    Returns:
+        int: The number of visitors written.
+    """
+    if not visitors:
+        return 0
+
+    quote = connection.ops.quote_name
+    opts = UniqueVisitor._meta
+    table = quote(opts.db_table)
+    names = (
+        "fingerprint",
+        "ip_address",
+        "user_agent",
+        "first_visit",
+        "last_visit",
+        "visit_count",
+        "is_bot",
+    )
+    fields = [opts.get_field(name) for name in names]
+    columns = {
+        name: quote(field.column)
+        for name, field in zip(
+            names,
+            fields,
+        )
+    }
+    def keep(
+        name,
+        comparison,
+    ):
+        # Batches can land out of order (retries, several workers), so the
+        # stored visit only moves further out. CASE rather than MIN()/MAX()
+        # or LEAST()/GREATEST() works on both SQLite and PostgreSQL.
+        column = columns[name]
+        return (
+            f"{column} = CASE "
+            f"WHEN excluded.{column} {comparison} {table}.{column} "
+            f"THEN excluded.{column} ELSE {table}.{column} END"
+        )
+
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns.values())}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))}) "
+        f"ON CONFLICT ({columns['fingerprint']}) DO UPDATE SET "
+        f"{keep('first_visit', '<')}, "
+        f"{keep('last_visit', '>')}, "
+        f"{columns['visit_count']} = "
+        f"{table}.{columns['visit_count']} + excluded.{columns['visit_count']}"
+    )
+    params = [
+        [
+            field.get_db_prep_save(
+                data[name],
+                connection,
+            )
+            for name, field in zip(
+                names,
+                fields,
+            )
+        ]
+        for data in visitors.values()
+    ]
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                sql,
+                params,
+            )
+    return len(params)
+
+
+def _aggregate_visitors(
+    events: List["PageViewEvent"],
+) -> Dict[str, Dict]:
+    """
+    Collapse events into one entry per visitor fingerprint.
+
+    Args:
+        events: The events in the batch.
+
+    Returns:
+        Dict mapping the visitor fingerprint to its identity, the first/last
+        visit timestamps and the number of visits seen in the batch.
+    """
+    visitors: Dict[str, Dict] = {}
+    for event in events:
+        key = event.fingerprint
+        visitor = visitors.get(key)
+        if visitor is None:
+            visitors[key] = {
+                "fingerprint": key,
+                "ip_address": event.ip_address,
+                "user_agent": event.user_agent,
+                "first_visit": event.timestamp,
+                "last_visit": event.timestamp,
+                "visit_count": 1,
+                "is_bot": is_bot_user_agent(event.user_agent),
+            }
+            continue
+        visitor["first_visit"] = min(
+            visitor["first_visit"],
+            event.timestamp,
+        )
+        visitor["last_visit"] = max(
+            visitor["last_visit"],
+            event.timestamp,
+        )
+        visitor["visit_count"] += 1
+    return visitors
@@ -0,0 +1,290 @@
+# analytics/retention.py
+import logging
+import time
+from collections import (
+    Counter,
+)
+from datetime import (
+    datetime,
+    timedelta,
+    timezone as dt_timezone,
+)
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Optional,
+)
+
+from django.conf import (
+    settings,
+)
+from django.db import (
+    transaction,
+)
+from django.utils import (
+    timezone,
+)
+
+from .hll import (
+    HyperLogLog,
+)
+from .models import (
+    PageView,
+    PageViewRollup,
+    VisitorSketch,
+)
+from .persistence import (
+    merge_visitor_sketches,
+    upsert_increments,
+)
+from .utils import (
+    is_bot_user_agent,
+    referrer_bucket,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 5000
+# Daily visitor sketches per transaction; each holds up to 4 KiB
+DEFAULT_SKETCH_BATCH_SIZE = 500
+# Ids per DELETE, below SQLite's 999 host parameter limit on older builds
+DELETE_CHUNK_SIZE = 900
+
+
+def truncate_timestamp(
+    timestamp: datetime,
+    granularity: str,
+) -> datetime:
+    """
+    Round a timestamp down to the start of its hour or day, in UTC.
+
+    Args:
+        timestamp: An aware datetime.
+        granularity: ``PageViewRollup.HOUR`` or ``PageViewRollup.DAY``.
+
+    Returns:
+        datetime: The start of the period containing ``timestamp``.
+    """
+    period = timestamp.astimezone(dt_timezone.utc).replace(
+        minute=0,
+        second=0,
+        microsecond=0,
+    )
+    if granularity == PageViewRollup.DAY:
+        period = period.replace(hour=0)
+    return period
+
+
+def rollup_page_views(
+    older_than_days: Optional[int] = None,
+    granularity: str = PageViewRollup.DAY,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause: float = 0.0,
+    max_batches: Optional[int] = None,
+    internal_hosts: Optional[Iterable[str]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    Roll raw page views older than the retention window into PageViewRollup
+    and delete them, one bounded batch at a time.
+
+    Each batch selects the oldest ``batch_size`` expired rows, adds them to
+    the rollups with one upsert per key and deletes them in the same short
+    transaction. Write locks are therefore only held for one batch, and an
+    interrupted run loses nothing: a batch is either fully rolled up and
+    deleted or untouched, so running the job again simply resumes.
+
+    Args:
+        older_than_days: Retention window in days. Defaults to the
+            ANALYTICS_RETENTION_DAYS setting.
+        granularity: ``PageViewRollup.HOUR`` or ``PageViewRollup.DAY``.
+        batch_size: Raw rows processed per transaction.
+        pause: Seconds to sleep between batches to let other writers in.
+        max_batches: Stop after this many batches (None for no limit).
+        internal_hosts: Referrer hosts counted as internal navigation,
+            matched like ALLOWED_HOSTS (see ``referrer_bucket``). Defaults
+            to ANALYTICS_INTERNAL_HOSTS or ALLOWED_HOSTS.
+        progress: Called with ``(batches, rows)`` after each batch.
+
+    Returns:
+        Dict[str, int]: Batches run, raw rows rolled up and rollup keys
+        written.
+    """
+    if granularity not in dict(PageViewRollup.GRANULARITY_CHOICES):
+        raise ValueError(f"Unknown rollup granularity '{granularity}'")
+    if older_than_days is None:
+        older_than_days = getattr(
+            settings,
+            "ANALYTICS_RETENTION_DAYS",
+            DEFAULT_RETENTION_DAYS,
+        )
+    if internal_hosts is None:
+        internal_hosts = getattr(
+            settings,
+            "ANALYTICS_INTERNAL_HOSTS",
+            settings.ALLOWED_HOSTS,
+        )
+    internal_hosts = set(internal_hosts)
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    result = {
+        "batches": 0,
+        "rows": 0,
+        "rollup_keys": 0,
+    }
+    while max_batches is None or result["batches"] < max_batches:
+        with transaction.atomic():
+            rows = list(
+                PageView.objects.select_for_update(skip_locked=True)
+                .filter(timestamp__lt=cutoff)
+                .order_by("timestamp")
+                .values_list(
+                    "id",
+                    "url",
+                    "timestamp",
+                    "user_agent",
+                    "referrer_host",
+                )[:batch_size]
+            )
+            if not rows:
+                break
+
+            increments: Counter = Counter()
+            for _, url, timestamp, user_agent, host in rows:
+                increments[
+                    (
+                        granularity,
+                        truncate_timestamp(
+                            timestamp,
+                            granularity,
+                        ),
+                        url,
+                        is_bot_user_agent(user_agent),
+                        referrer_bucket(
+                            host,
+                            internal_hosts,
+                        ),
+                    )
+                ] += 1
+            result["rollup_keys"] += upsert_increments(
+                PageViewRollup,
+                (
+                    "granularity",
+                    "period_start",
+                    "url",
+                    "is_bot",
+                    "referrer_bucket",
+                ),
+                "count",
+                increments,
+            )
+            ids = [row[0] for row in rows]
+            for start in range(
+                0,
+                len(ids),
+                DELETE_CHUNK_SIZE,
+            ):
+                PageView.objects.filter(
+                    id__in=ids[start : start + DELETE_CHUNK_SIZE]
+                ).delete()
+
+        result["batches"] += 1
+        result["rows"] += len(rows)
+        if progress is not None:
+            progress(
+                result["batches"],
+                result["rows"],
+            )
+        if len(rows) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    logger.info(
+        f"Rolled up {result['rows']} page views older than "
+        f"{older_than_days} days in {result['batches']} batches"
+    )
+    return result
+
+
+def prune_visitor_sketches(
+    older_than_days: Optional[int] = None,
+    batch_size: int = DEFAULT_SKETCH_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Fold daily visitor sketches older than the retention window into the
+    all-time sketch of their URL and delete them.
+
+    Every hit already updates the all-time sketch, so the merge normally
+    changes nothing; it keeps the all-time estimate correct even for daily
+    rows written without one. Merging is idempotent, so an interrupted run
+    can simply be repeated.
+
+    Args:
+        older_than_days: Retention window in days. Defaults to the
+            ANALYTICS_RETENTION_DAYS setting.
+        batch_size: Daily sketches processed per transaction.
+
+    Returns:
+        Dict[str, int]: Batches run and daily sketches deleted.
+    """
+    if older_than_days is None:
+        older_than_days = getattr(
+            settings,
+            "ANALYTICS_RETENTION_DAYS",
+            DEFAULT_RETENTION_DAYS,
+        )
+    cutoff = (timezone.now() - timedelta(days=older_than_days)).date()
+
+    result = {
+        "batches": 0,
+        "sketches": 0,
+    }
+    while True:
+        with transaction.atomic():
+            rows = list(
+                VisitorSketch.objects.select_for_update(skip_locked=True)
+                .filter(date__lt=cutoff)
+                .order_by("date", "id")
+                .values_list(
+                    "id",
+                    "url",
+                    "registers",
+                )[:batch_size]
+            )
+            if not rows:
+                break
+
+            positions: Dict = {}
+            for _, url, registers in rows:
+                updates = positions.setdefault(
+                    (url, None),
+                    {},
+                )
+                sketch = HyperLogLog.from_bytes(bytes(registers))
+                for index, rank in sketch.positions().items():
+                    if rank > updates.get(index, 0):
+                        updates[index] = rank
+            merge_visitor_sketches(positions)
+            ids = [row[0] for row in rows]
+            for start in range(
+                0,
+                len(ids),
+                DELETE_CHUNK_SIZE,
+            ):
+                VisitorSketch.objects.filter(
+                    id__in=ids[start : start + DELETE_CHUNK_SIZE]
+                ).delete()
+
+        result["batches"] += 1
+        result["sketches"] += len(rows)
+        if len(rows) < batch_size:
+            break
+
+    logger.info(
+        f"Pruned {result['sketches']} daily visitor sketches older than "
+        f"{older_than_days} days in {result['batches']} batches"
+    )
+    return result
@@ -0,0 +1,584 @@
+# analytics/tests/test_buffer.py
+
+import time
+from datetime import (
+    date,
+    timedelta,
+)
+from unittest.mock import (
+    patch,
+)
+
+from django.contrib.auth import (
+    get_user_model,
+)
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    Client,
+    override_settings,
+)
+from django.urls import (
+    reverse,
+)
+from django.utils import (
+    timezone,
+)
+
+from ..buffer import (
+    DROP_NEWEST,
+    DROP_OLDEST,
+    FLUSH,
+    PageViewBuffer,
+    PageViewEvent,
+    get_buffer,
+    reset_buffer,
+)
+from ..models import (
+    PageView,
+    DailyPageViewCount,
+    UniqueVisitor,
+    VisitorSketch,
+)
+
+TRACKABLE_PATH = "/a-trackable-page/"
+
+
+class InlineBuffer(PageViewBuffer):
+    """Buffer that never starts its writer thread; tests flush explicitly."""
+
+    def _ensure_writer(
+        self,
+    ):
+        pass
+
+
+def make_event(
+    url="/page/",
+    ip_address="198.51.100.1",
+    user_agent="TestAgent/1.0",
+    timestamp=None,
+):
+    timestamp = timestamp or timezone.now()
+    return PageViewEvent(
+        url=url,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        timestamp=timestamp,
+        day=date.today(),
+    )
+
+
+class PageViewBufferTests(TestCase):
+    def test_unbuffered_writes_immediately(
+        self,
+    ):
+        """A disabled buffer writes every event straight away."""
+        buffer = PageViewBuffer(enabled=False)
+        buffer.add(make_event())
+        self.assertEqual(
+            len(buffer),
+            0,
+        )
+        self.assertEqual(
+            PageView.objects.count(),
+            1,
+        )
+
+    def test_add_never_writes_on_caller_thread(
+        self,
+    ):
+        """Queued events are only written when the buffer is flushed."""
+        buffer = InlineBuffer(
+            batch_size=2,
+            flush_interval=0,
+        )
+        for _ in range(3):
+            buffer.add(make_event())
+        self.assertEqual(
+            PageView.objects.count(),
+            0,
+        )
+        self.assertEqual(
+            buffer.flush(),
+            3,
+        )
+        self.assertEqual(
+            PageView.objects.count(),
+            3,
+        )
+
+    def test_flush_aggregates_counters(
+        self,
+    ):
+        """Repeated hits collapse into one daily count and one visitor."""
+        buffer = InlineBuffer(
+            batch_size=100,
+            flush_interval=3600,
+        )
+        first = timezone.now() - timedelta(minutes=5)
+        last = timezone.now()
+        buffer.add(make_event(timestamp=first))
+        buffer.add(make_event(timestamp=first + timedelta(minutes=1)))
+        buffer.add(make_event(timestamp=last))
+        buffer.add(
+            make_event(
+                url="/other/",
+                timestamp=first + timedelta(minutes=2),
+            )
+        )
+        self.assertEqual(
+            buffer.flush(),
+            4,
+        )
+
+        self.assertEqual(
+            PageView.objects.count(),
+            4,
+        )
+        self.assertEqual(
+            DailyPageViewCount.objects.get(url="/page/").count,
+            3,
+        )
+        self.assertEqual(
+            DailyPageViewCount.objects.get(url="/other/").count,
+            1,
+        )
+        visitor = UniqueVisitor.objects.get()
+        self.assertEqual(
+            visitor.visit_count,
+            4,
+        )
+        self.assertEqual(
+            visitor.first_visit,
+            first,
+        )
+        self.assertEqual(
+            visitor.last_visit,
+            last,
+        )
+
+    def test_flush_adds_to_existing_rows(
+        self,
+    ):
+        """Counters from a second flush are added to the stored values."""
+        buffer = InlineBuffer(
+            batch_size=100,
+            flush_interval=3600,
+        )
+        buffer.add(make_event())
+        buffer.flush()
+        buffer.add(make_event())
+        buffer.add(make_event())
+        buffer.flush()
+        self.assertEqual(
+            DailyPageViewCount.objects.get().count,
+            3,
+        )
+        self.assertEqual(
+            UniqueVisitor.objects.get().visit_count,
+            3,
+        )
+
+    def test_flush_merges_visitor_sketches(
+        self,
+    ):
+        """Human hits feed the page and site sketches; bots are skipped."""
+        buffer = InlineBuffer(
+            batch_size=100,
+            flush_interval=3600,
+        )
+        buffer.add(make_event(ip_address="198.51.100.1"))
+        buffer.add(make_event(ip_address="198.51.100.2"))
+        buffer.add(make_event(ip_address="198.51.100.2"))
+        buffer.add(
+            make_event(
+                url="/other/",
+                ip_address="198.51.100.3",
+            )
+        )
+        buffer.add(
+            make_event(
+                ip_address="198.51.100.4",
+                user_agent="Googlebot/2.1",
+            )
+        )
+        buffer.flush()
+        self.assertEqual(
+            VisitorSketch.objects.count(),
+            6,
+        )
+        self.assertEqual(
+            VisitorSketch.estimate(),
+            3,
+        )
+        self.assertEqual(
+            VisitorSketch.estimate(url="/page/"),
+            2,
+        )
+        self.assertEqual(
+            VisitorSketch.estimate(
+                url="/page/",
+                start=date.today(),
+            ),
+            2,
+        )
+
+    def test_drop_newest_policy(
+        self,
+    ):
+        """With drop_newest, events beyond max_size are discarded."""
+        buffer = InlineBuffer(
+            max_size=2,
+            batch_size=2,
+            flush_interval=3600,
+            drop_policy=DROP_NEWEST,
+        )
+        self.assertTrue(buffer.add(make_event(url="/one/")))
+        self.assertTrue(buffer.add(make_event(url="/two/")))
+        self.assertFalse(buffer.add(make_event(url="/three/")))
+        self.assertEqual(
+            buffer.dropped,
+            1,
+        )
+        buffer.flush()
+        self.assertEqual(
+            sorted(PageView.objects.values_list("url", flat=True)),
+            ["/one/", "/two/"],
+        )
+
+    def test_drop_oldest_policy(
+        self,
+    ):
+        """With drop_oldest, the oldest queued event makes room."""
+        buffer = InlineBuffer(
+            max_size=2,
+            batch_size=2,
+            flush_interval=3600,
+            drop_policy=DROP_OLDEST,
+        )
+        buffer.add(make_event(url="/one/"))
+        buffer.add(make_event(url="/two/"))
+        self.assertTrue(buffer.add(make_event(url="/three/")))
+        self.assertEqual(
+            buffer.dropped,
+            1,
+        )
+        buffer.flush()
+        self.assertEqual(
+            sorted(PageView.objects.values_list("url", flat=True)),
+            ["/three/", "/two/"],
+        )
+
+    def test_flush_policy_never_drops(
+        self,
+    ):
+        """With the flush policy a full queue is written, not dropped."""
+        buffer = InlineBuffer(
+            max_size=2,
+            batch_size=2,
+            flush_interval=3600,
+            drop_policy=FLUSH,
+        )
+        for _ in range(5):
+            buffer.add(make_event())
+        # Each add beyond max_size flushed on the caller's thread
+        self.assertEqual(
+            PageView.objects.count(),
+            3,
+        )
+        buffer.flush()
+        self.assertEqual(
+            buffer.dropped,
+            0,
+        )
+        self.assertEqual(
+            PageView.objects.count(),
+            5,
+        )
+
+    def test_daily_counts_kept_for_dropped_events(
+        self,
+    ):
+        """The counter map tallies every hit, even dropped ones."""
+        buffer = InlineBuffer(
+            max_size=1,
+            batch_size=1,
+            flush_interval=3600,
+            drop_policy=DROP_NEWEST,
+        )
+        for _ in range(4):
+            buffer.add(make_event())
+        buffer.flush()
+        self.assertEqual(
+            PageView.objects.count(),
+            1,
+        )
+        self.assertEqual(
+            DailyPageViewCount.objects.get().count,
+            4,
+        )
+
+    def test_failed_counter_upsert_is_retried(
+        self,
+    ):
+        """Counts that fail to write are kept for the next flush."""
+        buffer = InlineBuffer(
+            batch_size=100,
+            flush_interval=3600,
+        )
+        buffer.add(make_event())
+        buffer.add(make_event())
+        with patch(
+            "analytics.persistence.increment_daily_counts",
+            side_effect=Exception("db down"),
+        ):
+            buffer.flush()
+        self.assertEqual(
+            buffer.get_stats()["pending_counter_keys"],
+            1,
+        )
+        self.assertEqual(
+            DailyPageViewCount.objects.count(),
+            0,
+        )
+
+        buffer.flush()
+        self.assertEqual(
+            DailyPageViewCount.objects.get().count,
+            2,
+        )
+
+    def test_unknown_drop_policy_rejected(
+        self,
+    ):
+        with self.assertRaises(ValueError):
+            PageViewBuffer(drop_policy="bogus")
+
+    def test_failed_write_is_logged_not_raised(
+        self,
+    ):
+        """A failing batch must never propagate into the request."""
+        buffer = PageViewBuffer(enabled=False)
+        with patch(
+            "analytics.persistence.write_events",
+            side_effect=Exception("db down"),
+        ):
+            self.assertTrue(buffer.add(make_event()))
+        self.assertEqual(
+            PageView.objects.count(),
+            0,
+        )
+        self.assertEqual(
+            buffer.get_stats()["failed_batches"],
+            1,
+        )
+
+
+class WriterThreadTests(SimpleTestCase):
+    """Exercise the writer thread with the database write stubbed out."""
+
+    def setUp(
+        self,
+    ):
+        self.batches = []
+        self.buffer = PageViewBuffer(
+            batch_size=3,
+            flush_interval=3600,
+        )
+        self.buffer._write = self.record_batch
+        self.buffer._write_counts = lambda counts: None
+
+    def tearDown(
+        self,
+    ):
+        self.buffer.stop(timeout=1)
+
+    def record_batch(
+        self,
+        events,
+    ):
+        self.batches.append(len(events))
+        self.buffer._record_flush(
+            len(events),
+            0.001,
+        )
+        self.buffer.written += len(events)
+        return len(events)
+
+    def wait_for(
+        self,
+        condition,
+    ):
+        deadline = time.monotonic() + 2
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_writer_flushes_full_batch(
+        self,
+    ):
+        """A full batch wakes the writer thread, not the caller."""
+        for _ in range(3):
+            self.buffer.add(make_event())
+        self.assertTrue(self.wait_for(lambda: self.batches == [3]))
+        self.assertEqual(
+            len(self.buffer),
+            0,
+        )
+
+    def test_writer_flushes_on_interval(
+        self,
+    ):
+        """A partial batch is written once the flush interval passes."""
+        self.buffer.flush_interval = 0.05
+        self.buffer.add(make_event())
+        self.assertTrue(self.wait_for(lambda: self.batches == [1]))
+
+    def test_stop_flushes_remaining_events(
+        self,
+    ):
+        """Stopping the writer writes whatever is still queued."""
+        self.buffer.add(make_event())
+        self.buffer.add(make_event())
+        self.buffer.stop(timeout=1)
+        self.assertEqual(
+            sum(self.batches),
+            2,
+        )
+        self.assertFalse(self.buffer.get_stats()["writer_alive"])
+
+    def test_stats_report_queue_and_flushes(
+        self,
+    ):
+        """Stats expose queue depth, drops, batch sizes and latency."""
+        for _ in range(2):
+            self.buffer.add(make_event())
+        stats = self.buffer.get_stats()
+        self.assertTrue(stats["writer_alive"])
+        self.assertEqual(
+            stats["queue_depth"],
+            2,
+        )
+        self.assertEqual(
+            stats["enqueued"],
+            2,
+        )
+
+        self.buffer.add(make_event())
+        self.assertTrue(self.wait_for(lambda: self.batches == [3]))
+        stats = self.buffer.get_stats()
+        self.assertEqual(
+            stats["queue_depth"],
+            0,
+        )
+        self.assertEqual(
+            stats["written"],
+            3,
+        )
+        self.assertEqual(
+            stats["last_batch_size"],
+            3,
+        )
+        self.assertEqual(
+            stats["avg_batch_size"],
+            3,
+        )
+        self.assertEqual(
+            stats["last_flush_ms"],
+            1.0,
+        )
+        self.assertEqual(
+            stats["dropped"],
+            0,
+        )
+
+
+@override_settings(
+    ANALYTICS_BUFFER_WRITES=True,
+    ANALYTICS_BUFFER_BATCH_SIZE=100,
+    ANALYTICS_BUFFER_FLUSH_INTERVAL=3600,
+)
+class BufferedMiddlewareTests(TestCase):
+    def setUp(
+        self,
+    ):
+        reset_buffer()
+        self.client = Client()
+
+    def tearDown(
+        self,
+    ):
+        reset_buffer()
+
+    def test_middleware_queues_instead_of_writing(
+        self,
+    ):
+        """Tracked requests are queued and only written on flush."""
+        self.client.get(
+            TRACKABLE_PATH,
+            HTTP_USER_AGENT="TestAgent/1.0",
+        )
+        self.client.get(
+            TRACKABLE_PATH,
+            HTTP_USER_AGENT="TestAgent/1.0",
+        )
+        self.assertEqual(
+            PageView.objects.count(),
+            0,
+        )
+        self.assertEqual(
+            len(get_buffer()),
+            2,
+        )
+
+        get_buffer().flush()
+        self.assertEqual(
+            PageView.objects.count(),
+            2,
+        )
+        self.assertEqual(
+            DailyPageViewCount.objects.get(url=TRACKABLE_PATH).count,
+            2,
+        )
+        self.assertEqual(
+            UniqueVisitor.objects.get().visit_count,
+            2,
+        )
+
+
+class BufferStatsViewTests(TestCase):
+    def setUp(
+        self,
+    ):
+        self.user = get_user_model().objects.create_user(
+            username="staff",
+            password="password",
+            is_staff=True,
+        )
+
+    def test_stats_view_requires_staff(
+        self,
+    ):
+        response = self.client.get(reverse("analytics:buffer-stats"))
+        self.assertEqual(
+            response.status_code,
+            302,
+        )
+
+    def test_stats_view_returns_json(
+        self,
+    ):
+        self.client.login(
+            username="staff",
+            password="password",
+        )
+        response = self.client.get(reverse("analytics:buffer-stats"))
+        self.assertEqual(
+            response.status_code,
+            200,
+        )
+        self.assertIn(
+            "queue_depth",
+            response.json(),
+        )
@@ -0,0 +1,230 @@
+# analytics/tests/test_caching.py
+
+import threading
+import time
+from unittest.mock import (
+    patch,
+)
+
+from django.core.cache import (
+    cache,
+)
+from django.test import (
+    SimpleTestCase,
+    override_settings,
+)
+
+from ..caching import (
+    get_or_refresh,
+)
+
+KEY = "analytics_test_key"
+
+
+@override_settings(
+    ANALYTICS_CACHE_TIMEOUT=60,
+    ANALYTICS_CACHE_STALE_TIMEOUT=60,
+)
+class GetOrRefreshTests(SimpleTestCase):
+    def setUp(
+        self,
+    ):
+        cache.clear()
+        self.calls = 0
+
+    def tearDown(
+        self,
+    ):
+        cache.clear()
+
+    def compute(
+        self,
+    ):
+        self.calls += 1
+        return self.calls
+
+    def expire(
+        self,
+    ):
+        """Mark the cached entry stale without evicting it."""
+        _, value = cache.get(KEY)
+        cache.set(
+            KEY,
+            (
+                time.time() - 1,
+                value,
+            ),
+            60,
+        )
+
+    def test_fresh_value_is_not_recomputed(
+        self,
+    ):
+        self.assertEqual(
+            get_or_refresh(
+                KEY,
+                self.compute,
+            ),
+            1,
+        )
+        self.assertEqual(
+            get_or_refresh(
+                KEY,
+                self.compute,
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.calls,
+            1,
+        )
+
+    def test_stale_value_refreshed_by_lock_holder(
+        self,
+    ):
+        get_or_refresh(
+            KEY,
+            self.compute,
+        )
+        self.expire()
+        self.assertEqual(
+            get_or_refresh(
+                KEY,
+                self.compute,
+            ),
+            2,
+        )
+        self.assertIsNone(cache.get(f"{KEY}:refresh"))
+
+    def test_stale_value_served_while_another_refreshes(
+        self,
+    ):
+        """Without the lock a request gets the stale value, no queries."""
+        get_or_refresh(
+            KEY,
+            self.compute,
+        )
+        self.expire()
+        cache.add(
+            f"{KEY}:refresh",
+            1,
+        )
+        self.assertEqual(
+            get_or_refresh(
+                KEY,
+                self.compute,
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.calls,
+            1,
+        )
+
+    def test_slow_refresh_keeps_a_newer_lock(
+        self,
+    ):
+        """A refresh that outlived its lock leaves the next holder's lock."""
+
+        def slow_compute():
+            # Our lock expired and another request took it meanwhile
+            cache.set(
+                f"{KEY}:refresh",
+                "other-token",
+            )
+            return self.compute()
+
+        get_or_refresh(
+            KEY,
+            slow_compute,
+        )
+        self.assertEqual(
+            cache.get(f"{KEY}:refresh"),
+            "other-token",
+        )
+
+    def test_failed_refresh_serves_stale(
+        self,
+    ):
+        get_or_refresh(
+            KEY,
+            self.compute,
+        )
+        self.expire()
+
+        def fail():
+            raise RuntimeError("db down")
+
+        with patch("analytics.caching.logger"):
+            self.assertEqual(
+                get_or_refresh(
+                    KEY,
+                    fail,
+                ),
+                1,
+            )
+        # The lock is released so the next request retries
+        self.assertIsNone(cache.get(f"{KEY}:refresh"))
+
+    def test_failed_cold_fill_raises(
+        self,
+    ):
+        def fail():
+            raise RuntimeError("db down")
+
+        with self.assertRaises(RuntimeError):
+            get_or_refresh(
+                KEY,
+                fail,
+            )
+
+    def test_concurrent_stale_requests_recompute_once(
+        self,
+    ):
+        """A burst of requests on an expired key runs one recompute."""
+        get_or_refresh(
+            KEY,
+            self.compute,
+        )
+        self.expire()
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def slow_compute():
+            started.set()
+            release.wait(2)
+            return self.compute()
+
+        refresher = threading.Thread(
+            target=lambda: results.append(
+                get_or_refresh(
+                    KEY,
+                    slow_compute,
+                )
+            )
+        )
+        refresher.start()
+        started.wait(2)
+        others = [
+            get_or_refresh(
+                KEY,
+                self.compute,
+            )
+            for _ in range(10)
+        ]
+        release.set()
+        refresher.join(2)
+
+        self.assertEqual(
+            others,
+            [1] * 10,
+        )
+        self.assertEqual(
+            results,
+            [2],
+        )
+        self.assertEqual(
+            self.calls,
+            2,
+        )
@@ -0,0 +1,190 @@
+# analytics/tests/test_hll.py
+
+from django.test import (
+    SimpleTestCase,
+)
+
+from ..hll import (
+    DEFAULT_PRECISION,
+    HyperLogLog,
+    hash_position,
+    merged,
+    standard_error,
+)
+from ..utils import (
+    visitor_fingerprint,
+)
+
+
+def fingerprints(
+    count,
+    offset=0,
+):
+    return [
+        visitor_fingerprint(
+            f"10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}",
+            "TestAgent/1.0",
+        )
+        for n in range(
+            offset,
+            offset + count,
+        )
+    ]
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_empty_sketch_counts_zero(
+        self,
+    ):
+        self.assertEqual(
+            HyperLogLog().count(),
+            0,
+        )
+
+    def test_small_counts_are_exact(
+        self,
+    ):
+        """Linear counting makes a handful of visitors exact."""
+        sketch = HyperLogLog()
+        for fingerprint in fingerprints(20):
+            sketch.add(fingerprint)
+            sketch.add(fingerprint)
+        self.assertEqual(
+            sketch.count(),
+            20,
+        )
+
+    def test_large_count_within_error_bound(
+        self,
+    ):
+        """A large count lands within three standard errors."""
+        sketch = HyperLogLog()
+        for fingerprint in fingerprints(50000):
+            sketch.add(fingerprint)
+        tolerance = 3 * standard_error(DEFAULT_PRECISION) * 50000
+        self.assertLess(
+            abs(sketch.count() - 50000),
+            tolerance,
+        )
+
+    def test_merge_is_union_and_idempotent(
+        self,
+    ):
+        """Overlapping sketches merge to the size of the union."""
+        monday = HyperLogLog()
+        tuesday = HyperLogLog()
+        for fingerprint in fingerprints(300):
+            monday.add(fingerprint)
+        for fingerprint in fingerprints(
+            300,
+            offset=200,
+        ):
+            tuesday.add(fingerprint)
+        week = merged(
+            [
+                monday,
+                tuesday,
+                tuesday,
+            ]
+        )
+        self.assertAlmostEqual(
+            week.count(),
+            500,
+            delta=500 * 3 * standard_error(),
+        )
+        before = week.count()
+        week.merge(monday)
+        self.assertEqual(
+            week.count(),
+            before,
+        )
+
+    def test_sparse_update_matches_add(
+        self,
+    ):
+        """Applying buffered positions equals adding the fingerprints."""
+        added = HyperLogLog()
+        updated = HyperLogLog()
+        positions = {}
+        for fingerprint in fingerprints(100):
+            added.add(fingerprint)
+            index, rank = hash_position(fingerprint)
+            positions[index] = max(
+                rank,
+                positions.get(index, 0),
+            )
+        updated.update(positions)
+        self.assertEqual(
+            added.to_bytes(),
+            updated.to_bytes(),
+        )
+
+    def test_bytes_round_trip(
+        self,
+    ):
+        sketch = HyperLogLog(precision=10)
+        for fingerprint in fingerprints(50):
+            sketch.add(fingerprint)
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+        self.assertEqual(
+            restored.precision,
+            10,
+        )
+        self.assertEqual(
+            restored.count(),
+            sketch.count(),
+        )
+
+    def test_small_sketches_serialize_sparsely(
+        self,
+    ):
+        """Few visitors take a few bytes; many fall back to dense form."""
+        sketch = HyperLogLog()
+        for fingerprint in fingerprints(5):
+            sketch.add(fingerprint)
+        data = sketch.to_bytes()
+        self.assertEqual(
+            len(data),
+            2 + 3 * 5,
+        )
+        self.assertEqual(
+            HyperLogLog.from_bytes(data).to_bytes(),
+            data,
+        )
+        self.assertEqual(
+            HyperLogLog.from_bytes(data).count(),
+            5,
+        )
+
+        for fingerprint in fingerprints(
+            3000,
+            offset=5,
+        ):
+            sketch.add(fingerprint)
+        self.assertEqual(
+            len(sketch.to_bytes()),
+            1 << DEFAULT_PRECISION,
+        )
+        self.assertEqual(
+            HyperLogLog.from_bytes(sketch.to_bytes()).registers,
+            sketch.registers,
+        )
+
+    def test_dense_bytes_still_load(
+        self,
+    ):
+        """Sketches stored densely before sparse encoding still load."""
+        sketch = HyperLogLog()
+        for fingerprint in fingerprints(5):
+            sketch.add(fingerprint)
+        restored = HyperLogLog.from_bytes(bytes(sketch.registers))
+        self.assertEqual(
+            restored.registers,
+            sketch.registers,
+        )
+
+    def test_invalid_precision_rejected(
+        self,
+    ):
+        with self.assertRaises(ValueError):
+            HyperLogLog(precision=2)
@@ -28,7 +28,7 @@ from datetime import (
 )
 
 # Import the models to check DB state
-from .models import (
+from ..models import (
     PageView,
     DailyPageViewCount,
     UniqueVisitor,
@@ -403,6 +403,20 @@ class PageViewMiddlewareTests(TestCase):
             ip,
         )
 
+    def test_referrer_host_recorded(
+        self,
+    ):
+        """Only the host of the Referer header is stored."""
+        self.client.get(
+            TRACKABLE_PATH,
+            HTTP_REFERER="https://www.Google.com/search?q=spellbook",
+        )
+        self.client.get(TRACKABLE_PATH)
+        self.assertEqual(
+            sorted(PageView.objects.values_list("referrer_host", flat=True)),
+            ["", "www.google.com"],
+        )
+
     def test_ip_extraction_remote_addr(
         self,
     ):
@@ -664,7 +678,7 @@ class PageViewMiddlewareValidateUrlIntegrationTests(TestCase):
         # Or just hardcode a length known to be > MAX_URL_LENGTH
         try:
             # Try importing MAX_URL_LENGTH for precision
-            from .utils import (
+            from ..utils import (
                 MAX_URL_LENGTH,
             )
         except ImportError:
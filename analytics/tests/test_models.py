@@ -1,5 +1,9 @@
 # analytics/tests.py
 
+from django.template import (
+    Context,
+    Template,
+)
 from django.test import (
     TestCase,
     RequestFactory,
@@ -20,15 +24,26 @@ from datetime import (
 )
 
 import logging
+from unittest.mock import (
+    patch,
+)
 
 # Import the models you want to test
-from .models import (
+from ..models import (
     PageView,
     DailyPageViewCount,
     UniqueVisitor,
+    VisitorSketch,
+)
+from ..hll import (
+    HyperLogLog,
+)
+from ..persistence import (
+    rebuild_page_view_totals,
 )
-from .context_processors import (
+from ..context_processors import (
     analytics_context,
+    load_analytics,
 )
 
 logging.disable(logging.CRITICAL)
@@ -254,11 +269,12 @@ class UniqueVisitorModelTests(TestCase):
             expected_str,
         )
 
-    def test_unique_visitor_unique_together_constraint(
+    def test_unique_visitor_fingerprint_constraint(
         self,
     ):
         """
-        Test that ip_address and user_agent together must be unique.
+        Test that ip_address and user_agent together must be unique, via
+        the fingerprint they hash to.
         """
         ip = "192.0.2.110"
         ua = "UniqueTestUA/1.0"
@@ -326,8 +342,12 @@ class UniqueVisitorModelTests(TestCase):
             user_agent=ua,
         )
 
-        # 1. Test with no PageView entries
-        self.assertIsNone(visitor.most_common_url())
+        # 1. Test with no PageView entries: an empty string, which the
+        # admin displays as "-"
+        self.assertEqual(
+            visitor.most_common_url(),
+            "",
+        )
 
         # 2. Test with one PageView entry
         url1 = "/page1/"
@@ -426,10 +446,20 @@ class AnalyticsContextProcessorTests(TestCase):
             ip_address=cls.ip2,
             user_agent=cls.ua_human,
         )  # Human 2
-        UniqueVisitor.objects.create(
+        bot = UniqueVisitor.objects.create(
             ip_address=cls.ip_bot,
             user_agent=cls.ua_bot,
         )  # Bot
+        # The unique visitor count is read from the site-wide sketch,
+        # which only ever receives human visitors
+        sketch = HyperLogLog()
+        for visitor in UniqueVisitor.objects.exclude(pk=bot.pk):
+            sketch.add(visitor.fingerprint)
+        VisitorSketch.objects.update_or_create(
+            url=VisitorSketch.SITE_WIDE,
+            date=None,
+            defaults={"registers": sketch.to_bytes()},
+        )
 
         # Daily Page View Counts (for popular pages)
         # Day -8 (should be excluded from 7-day calculation)
@@ -535,6 +565,9 @@ class AnalyticsContextProcessorTests(TestCase):
             timestamp=timezone.now(),
         )
 
+        # The sidebar reads the running totals, not the raw rows
+        rebuild_page_view_totals()
+
         # Total expected views EXCLUDING path_excluded_agg and path_excluded_prefix:
         # Home: 10+20+1 = 31
         # Features: 15+25 = 40
@@ -667,13 +700,11 @@ class AnalyticsContextProcessorTests(TestCase):
             15,
         )
 
-        # Check if the main context key is now in cache
-        cache_key_context = f"analytics_context_data_{self.path_features}"
-        self.assertIsNotNone(cache.get(cache_key_context))
-        # Check if helper function keys are in cache
-        self.assertIsNotNone(cache.get("analytics_total_site_views"))
-        self.assertIsNotNone(cache.get("analytics_unique_visitors"))
-        self.assertIsNotNone(cache.get("analytics_popular_pages"))
+        # Check the per-page slice is now in cache
+        cache_key_page = f"analytics_page_data_{self.path_features}"
+        self.assertIsNotNone(cache.get(cache_key_page))
+        # Site-wide values live in one bundle shared by every path
+        self.assertIsNotNone(cache.get("analytics_site_data"))
 
         # 2. Cache Hit
         # Ideally, check DB query count here if possible/needed using self.assertNumQueries
@@ -730,6 +761,68 @@ class AnalyticsContextProcessorTests(TestCase):
             15,
         )
 
+    def test_context_site_bundle_shared_across_paths(
+        self,
+    ):
+        """
+        Test that a second path reuses the cached site-wide bundle and a
+        warm request is served from a single cache.get_many.
+        """
+        # Rendering a value fills the cache
+        str(analytics_context(self.factory.get(self.path_home))["total_views"])
+        with patch(
+            "analytics.context_processors._get_site_analytics"
+        ) as site_analytics:
+            context = analytics_context(self.factory.get(self.path_pricing))
+        site_analytics.assert_not_called()
+        self.assertEqual(
+            context["page_views_count"],
+            15,
+        )
+        self.assertEqual(
+            context["unique_visitors"],
+            2,
+        )
+
+        with patch(
+            "analytics.context_processors.cache.get_many",
+            wraps=cache.get_many,
+        ) as get_many, patch(
+            "analytics.caching.cache.add",
+        ) as add:
+            str(
+                analytics_context(self.factory.get(self.path_pricing))[
+                    "popular_pages"
+                ]
+            )
+        get_many.assert_called_once()
+        # Both entries were fresh, so no refresh lock was even tried
+        add.assert_not_called()
+
+    def test_context_is_lazy(
+        self,
+    ):
+        """
+        Test that no cache or DB work happens until a value is rendered,
+        and that rendering several values loads them only once.
+        """
+        with patch(
+            "analytics.context_processors.load_analytics",
+            wraps=load_analytics,
+        ) as load:
+            with self.assertNumQueries(0):
+                context = analytics_context(self.factory.get(self.path_home))
+            load.assert_not_called()
+
+            rendered = Template(
+                "{{ page_views_count }}/{{ total_views }}/{{ unique_visitors }}"
+            ).render(Context(context))
+        load.assert_called_once()
+        self.assertEqual(
+            rendered,
+            "31/187/2",
+        )
+
     def test_context_unique_visitors_excludes_bots(
         self,
     ):
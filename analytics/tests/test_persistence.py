@@ -0,0 +1,413 @@
+# analytics/tests/test_persistence.py
+
+from datetime import (
+    date,
+    timedelta,
+)
+
+from django.db import (
+    connection,
+)
+from django.test import (
+    TestCase,
+)
+from django.test.utils import (
+    CaptureQueriesContext,
+)
+from django.utils import (
+    timezone,
+)
+
+from ..models import (
+    DailyPageViewCount,
+    PageView,
+    PageViewTotal,
+    UniqueVisitor,
+    VisitorSketch,
+)
+from ..persistence import (
+    _aggregate_visitors,
+    increment_daily_counts,
+    merge_visitor_sketches,
+    rebuild_page_view_totals,
+    upsert_unique_visitors,
+)
+from ..hll import (
+    hash_position,
+)
+from ..buffer import (
+    PageViewEvent,
+)
+from ..utils import (
+    visitor_fingerprint,
+)
+
+
+class IncrementDailyCountsTests(TestCase):
+    def test_creates_missing_rows(
+        self,
+    ):
+        """Keys without a row are inserted with their increment."""
+        today = date.today()
+        written = increment_daily_counts(
+            {
+                ("/a/", today): 3,
+                ("/b/", today): 1,
+            }
+        )
+        self.assertEqual(
+            written,
+            2,
+        )
+        self.assertEqual(
+            DailyPageViewCount.objects.get(url="/a/").count,
+            3,
+        )
+        self.assertEqual(
+            DailyPageViewCount.objects.get(url="/b/").count,
+            1,
+        )
+
+    def test_adds_to_existing_rows(
+        self,
+    ):
+        """Existing rows are incremented, not overwritten."""
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+        DailyPageViewCount.objects.create(
+            url="/a/",
+            date=today,
+            count=10,
+        )
+        DailyPageViewCount.objects.create(
+            url="/a/",
+            date=yesterday,
+            count=4,
+        )
+        increment_daily_counts({("/a/", today): 5})
+        self.assertEqual(
+            DailyPageViewCount.objects.get(
+                url="/a/",
+                date=today,
+            ).count,
+            15,
+        )
+        # Other days for the same URL are untouched
+        self.assertEqual(
+            DailyPageViewCount.objects.get(
+                url="/a/",
+                date=yesterday,
+            ).count,
+            4,
+        )
+
+    def test_updates_running_totals(
+        self,
+    ):
+        """Per-URL and site totals are incremented across days."""
+        today = date.today()
+        increment_daily_counts(
+            {
+                ("/a/", today): 3,
+                ("/a/", today - timedelta(days=1)): 2,
+                ("/b/", today): 1,
+            }
+        )
+        increment_daily_counts({("/b/", today): 4})
+        totals = dict(
+            PageViewTotal.objects.values_list(
+                "url",
+                "count",
+            )
+        )
+        self.assertEqual(
+            totals,
+            {
+                "": 10,
+                "/a/": 5,
+                "/b/": 5,
+            },
+        )
+
+    def test_empty_counts_do_nothing(
+        self,
+    ):
+        self.assertEqual(
+            increment_daily_counts({}),
+            0,
+        )
+        self.assertEqual(
+            DailyPageViewCount.objects.count(),
+            0,
+        )
+
+
+class UpsertUniqueVisitorsTests(TestCase):
+    def visitors(
+        self,
+        *timestamps,
+        user_agent="TestAgent/1.0",
+    ):
+        return _aggregate_visitors(
+            [
+                PageViewEvent(
+                    url="/page/",
+                    ip_address="198.51.100.7",
+                    user_agent=user_agent,
+                    timestamp=timestamp,
+                    day=timestamp.date(),
+                )
+                for timestamp in timestamps
+            ]
+        )
+
+    def test_inserts_new_visitor(
+        self,
+    ):
+        """A new visitor row carries the batch's first/last visit."""
+        first = timezone.now() - timedelta(hours=1)
+        last = timezone.now()
+        upsert_unique_visitors(
+            self.visitors(
+                first,
+                last,
+                user_agent="Googlebot/2.1",
+            )
+        )
+        visitor = UniqueVisitor.objects.get()
+        self.assertEqual(
+            visitor.fingerprint,
+            visitor_fingerprint(
+                "198.51.100.7",
+                "Googlebot/2.1",
+            ),
+        )
+        self.assertEqual(
+            visitor.first_visit,
+            first,
+        )
+        self.assertEqual(
+            visitor.last_visit,
+            last,
+        )
+        self.assertEqual(
+            visitor.visit_count,
+            2,
+        )
+        self.assertTrue(visitor.is_bot)
+
+    def test_updates_existing_visitor_in_one_statement(
+        self,
+    ):
+        """A returning visitor keeps first_visit and adds to visit_count."""
+        first = timezone.now() - timedelta(days=1)
+        UniqueVisitor.objects.create(
+            ip_address="198.51.100.7",
+            user_agent="TestAgent/1.0",
+            first_visit=first,
+            last_visit=first,
+            visit_count=5,
+        )
+        last = timezone.now()
+        with CaptureQueriesContext(connection) as queries:
+            upsert_unique_visitors(self.visitors(last))
+        self.assertEqual(
+            len([q for q in queries if "INSERT" in q["sql"]]),
+            1,
+        )
+        visitor = UniqueVisitor.objects.get()
+        self.assertEqual(
+            visitor.first_visit,
+            first,
+        )
+        self.assertEqual(
+            visitor.last_visit,
+            last,
+        )
+        self.assertEqual(
+            visitor.visit_count,
+            6,
+        )
+
+
+    def test_older_batch_does_not_move_last_visit_back(
+        self,
+    ):
+        """A batch applied out of order keeps the newer last_visit."""
+        newer = timezone.now()
+        UniqueVisitor.objects.create(
+            ip_address="198.51.100.7",
+            user_agent="TestAgent/1.0",
+            first_visit=newer - timedelta(days=1),
+            last_visit=newer,
+            visit_count=5,
+        )
+        upsert_unique_visitors(self.visitors(newer - timedelta(hours=1)))
+        visitor = UniqueVisitor.objects.get()
+        self.assertEqual(
+            visitor.last_visit,
+            newer,
+        )
+        self.assertEqual(
+            visitor.visit_count,
+            6,
+        )
+
+    def test_batches_flushed_out_of_order(
+        self,
+    ):
+        """An earlier batch arriving last still sets first_visit."""
+        now = timezone.now()
+        later = self.visitors(
+            now - timedelta(hours=1),
+            now,
+        )
+        earlier = self.visitors(
+            now - timedelta(hours=3),
+            now - timedelta(hours=2),
+        )
+        upsert_unique_visitors(later)
+        upsert_unique_visitors(earlier)
+        visitor = UniqueVisitor.objects.get()
+        self.assertEqual(
+            visitor.first_visit,
+            now - timedelta(hours=3),
+        )
+        self.assertEqual(
+            visitor.last_visit,
+            now,
+        )
+        self.assertEqual(
+            visitor.visit_count,
+            4,
+        )
+
+
+class MergeVisitorSketchesTests(TestCase):
+    def positions(
+        self,
+        *ip_addresses,
+    ):
+        positions = {}
+        for ip_address in ip_addresses:
+            index, rank = hash_position(
+                visitor_fingerprint(
+                    ip_address,
+                    "TestAgent/1.0",
+                )
+            )
+            positions[index] = max(
+                rank,
+                positions.get(index, 0),
+            )
+        return positions
+
+    def test_creates_and_merges_sketches(
+        self,
+    ):
+        """New keys get a row, existing rows are merged, not replaced."""
+        today = date.today()
+        merge_visitor_sketches(
+            {
+                ("/a/", today): self.positions(
+                    "203.0.113.1",
+                    "203.0.113.2",
+                ),
+                ("", None): self.positions(
+                    "203.0.113.1",
+                    "203.0.113.2",
+                ),
+            }
+        )
+        merge_visitor_sketches(
+            {
+                ("/a/", today): self.positions(
+                    "203.0.113.2",
+                    "203.0.113.3",
+                ),
+            }
+        )
+        self.assertEqual(
+            VisitorSketch.objects.count(),
+            2,
+        )
+        self.assertEqual(
+            VisitorSketch.estimate(
+                url="/a/",
+                start=today,
+                end=today,
+            ),
+            3,
+        )
+        self.assertEqual(
+            VisitorSketch.estimate(),
+            2,
+        )
+
+    def test_daily_sketches_merge_over_range(
+        self,
+    ):
+        """A date range estimate is the union of its daily sketches."""
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+        merge_visitor_sketches(
+            {
+                ("", yesterday): self.positions(
+                    "203.0.113.1",
+                    "203.0.113.2",
+                ),
+                ("", today): self.positions(
+                    "203.0.113.2",
+                    "203.0.113.3",
+                ),
+            }
+        )
+        self.assertEqual(
+            VisitorSketch.estimate(
+                start=yesterday,
+                end=today,
+            ),
+            3,
+        )
+        self.assertEqual(
+            VisitorSketch.estimate(start=today),
+            2,
+        )
+        # Daily updates never touch the all-time sketch
+        self.assertEqual(
+            VisitorSketch.estimate(),
+            0,
+        )
+
+
+class RebuildPageViewTotalsTests(TestCase):
+    def test_rebuild_counts_raw_rows(
+        self,
+    ):
+        """Stale totals are replaced by counts from the raw page views."""
+        PageViewTotal.objects.create(
+            url="/stale/",
+            count=99,
+        )
+        for url in ("/a/", "/a/", "/b/"):
+            PageView.objects.create(
+                url=url,
+                ip_address="203.0.113.1",
+            )
+        self.assertEqual(
+            rebuild_page_view_totals(),
+            2,
+        )
+        self.assertEqual(
+            dict(
+                PageViewTotal.objects.values_list(
+                    "url",
+                    "count",
+                )
+            ),
+            {
+                "": 3,
+                "/a/": 2,
+                "/b/": 1,
+            },
+        )
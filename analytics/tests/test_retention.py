@@ -0,0 +1,333 @@
+# analytics/tests/test_retention.py
+
+from datetime import (
+    datetime,
+    timedelta,
+    timezone as dt_timezone,
+)
+from io import (
+    StringIO,
+)
+
+from django.core.management import (
+    call_command,
+)
+from django.test import (
+    TestCase,
+)
+from django.utils import (
+    timezone,
+)
+
+from ..hll import (
+    HyperLogLog,
+)
+from ..models import (
+    PageView,
+    PageViewRollup,
+    PageViewTotal,
+    VisitorSketch,
+)
+from ..persistence import (
+    rebuild_page_view_totals,
+)
+from ..retention import (
+    DELETE_CHUNK_SIZE,
+    prune_visitor_sketches,
+    rollup_page_views,
+    truncate_timestamp,
+)
+from ..utils import (
+    visitor_fingerprint,
+)
+
+
+class RollupPageViewsTests(TestCase):
+    def setUp(
+        self,
+    ):
+        self.old = timezone.now() - timedelta(days=100)
+        self.recent = timezone.now() - timedelta(days=1)
+
+    def add_views(
+        self,
+        count,
+        timestamp,
+        url="/docs/",
+        user_agent="TestAgent/1.0",
+        referrer_host="",
+    ):
+        PageView.objects.bulk_create(
+            [
+                PageView(
+                    url=url,
+                    ip_address="203.0.113.1",
+                    user_agent=user_agent,
+                    timestamp=timestamp + timedelta(seconds=n),
+                    referrer_host=referrer_host,
+                )
+                for n in range(count)
+            ]
+        )
+
+    def rollups(
+        self,
+    ):
+        return {
+            (rollup.url, rollup.is_bot, rollup.referrer_bucket): rollup.count
+            for rollup in PageViewRollup.objects.all()
+        }
+
+    def test_rolls_up_and_deletes_expired_rows(
+        self,
+    ):
+        """Only rows past the retention window are aggregated and deleted."""
+        self.add_views(
+            3,
+            self.old,
+        )
+        self.add_views(
+            2,
+            self.old,
+            user_agent="Googlebot/2.1",
+            referrer_host="www.google.com",
+        )
+        self.add_views(
+            1,
+            self.old,
+            url="/changelog/",
+            referrer_host="github.com",
+        )
+        self.add_views(
+            4,
+            self.recent,
+        )
+
+        result = rollup_page_views(
+            older_than_days=90,
+            internal_hosts=[],
+        )
+        self.assertEqual(
+            result["rows"],
+            6,
+        )
+        self.assertEqual(
+            self.rollups(),
+            {
+                ("/docs/", False, "direct"): 3,
+                ("/docs/", True, "search"): 2,
+                ("/changelog/", False, "social"): 1,
+            },
+        )
+        self.assertEqual(
+            set(PageViewRollup.objects.values_list("period_start", flat=True)),
+            {truncate_timestamp(self.old, PageViewRollup.DAY)},
+        )
+        self.assertEqual(
+            PageView.objects.count(),
+            4,
+        )
+
+    def test_resumes_after_interruption(
+        self,
+    ):
+        """Stopping after a batch and re-running counts every row once."""
+        self.add_views(
+            7,
+            self.old,
+        )
+        first = rollup_page_views(
+            older_than_days=90,
+            batch_size=3,
+            max_batches=1,
+        )
+        self.assertEqual(
+            first["rows"],
+            3,
+        )
+        self.assertEqual(
+            PageView.objects.count(),
+            4,
+        )
+
+        second = rollup_page_views(
+            older_than_days=90,
+            batch_size=3,
+        )
+        self.assertEqual(
+            second["batches"],
+            2,
+        )
+        self.assertEqual(
+            PageView.objects.count(),
+            0,
+        )
+        self.assertEqual(
+            self.rollups(),
+            {("/docs/", False, "direct"): 7},
+        )
+
+    def test_large_batch_deletes_in_chunks(
+        self,
+    ):
+        """Batches over the delete chunk size still delete every row."""
+        self.add_views(
+            DELETE_CHUNK_SIZE + 50,
+            self.old,
+        )
+        result = rollup_page_views(
+            older_than_days=90,
+        )
+        self.assertEqual(
+            result["rows"],
+            DELETE_CHUNK_SIZE + 50,
+        )
+        self.assertEqual(
+            PageView.objects.count(),
+            0,
+        )
+
+    def test_hourly_granularity(
+        self,
+    ):
+        start = datetime(
+            2024,
+            1,
+            1,
+            10,
+            tzinfo=dt_timezone.utc,
+        )
+        self.add_views(
+            2,
+            start + timedelta(minutes=5),
+        )
+        self.add_views(
+            1,
+            start + timedelta(hours=1),
+        )
+        rollup_page_views(
+            older_than_days=90,
+            granularity=PageViewRollup.HOUR,
+        )
+        self.assertEqual(
+            dict(
+                PageViewRollup.objects.values_list(
+                    "period_start",
+                    "count",
+                )
+            ),
+            {
+                start: 2,
+                start + timedelta(hours=1): 1,
+            },
+        )
+
+    def test_rebuilt_totals_include_rollups(
+        self,
+    ):
+        """Expiring raw rows does not lose them from the running totals."""
+        self.add_views(
+            3,
+            self.old,
+        )
+        self.add_views(
+            2,
+            self.recent,
+        )
+        rollup_page_views(older_than_days=90)
+        rebuild_page_view_totals()
+        self.assertEqual(
+            PageViewTotal.objects.get(url="/docs/").count,
+            5,
+        )
+
+    def test_unknown_granularity_rejected(
+        self,
+    ):
+        with self.assertRaises(ValueError):
+            rollup_page_views(granularity="week")
+
+    def test_management_command(
+        self,
+    ):
+        self.add_views(
+            2,
+            self.old,
+        )
+        out = StringIO()
+        call_command(
+            "analytics_rollup",
+            "--days=90",
+            stdout=out,
+        )
+        self.assertIn(
+            "Rolled up 2 page views",
+            out.getvalue(),
+        )
+        self.assertEqual(
+            PageView.objects.count(),
+            0,
+        )
+
+
+class PruneVisitorSketchesTests(TestCase):
+    def sketch(
+        self,
+        *ip_addresses,
+    ):
+        hll = HyperLogLog()
+        for ip_address in ip_addresses:
+            hll.add(
+                visitor_fingerprint(
+                    ip_address,
+                    "TestAgent/1.0",
+                )
+            )
+        return hll.to_bytes()
+
+    def test_folds_expired_days_into_all_time(
+        self,
+    ):
+        today = timezone.now().date()
+        VisitorSketch.objects.create(
+            url="/docs/",
+            date=today - timedelta(days=100),
+            registers=self.sketch(
+                "203.0.113.1",
+                "203.0.113.2",
+            ),
+        )
+        VisitorSketch.objects.create(
+            url="/docs/",
+            date=today - timedelta(days=1),
+            registers=self.sketch("203.0.113.3"),
+        )
+        VisitorSketch.objects.create(
+            url="/docs/",
+            date=None,
+            registers=self.sketch("203.0.113.3"),
+        )
+
+        result = prune_visitor_sketches(
+            older_than_days=90,
+            batch_size=1,
+        )
+        self.assertEqual(
+            result["sketches"],
+            1,
+        )
+        self.assertEqual(
+            list(
+                VisitorSketch.objects.filter(
+                    date__isnull=False,
+                ).values_list(
+                    "date",
+                    flat=True,
+                )
+            ),
+            [today - timedelta(days=1)],
+        )
+        self.assertEqual(
+            VisitorSketch.estimate(url="/docs/"),
+            3,
+        )
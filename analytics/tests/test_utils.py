@@ -4,10 +4,13 @@ from django.test import (
     SimpleTestCase,
 )
 
-from .utils import (
+from ..utils import (
     validate_url,
     FORBIDDEN_SUBSTRINGS,
     MAX_URL_LENGTH,
+    visitor_fingerprint,
+    referrer_bucket,
+    referrer_host,
 )
 
 
@@ -217,3 +220,142 @@ class ValidateUrlTests(SimpleTestCase):
                         f"URL '{url}' should be allowed.",
                     )
                 # Add similar checks for other potentially ambiguous cases based on your lists.
+
+
+class VisitorFingerprintTests(SimpleTestCase):
+    """Tests for the analytics.utils.visitor_fingerprint function."""
+
+    def test_fixed_width_regardless_of_user_agent(
+        self,
+    ):
+        short = visitor_fingerprint(
+            "203.0.113.5",
+            "a",
+        )
+        long = visitor_fingerprint(
+            "203.0.113.5",
+            "Mozilla/5.0 " * 200,
+        )
+        self.assertEqual(
+            len(short),
+            32,
+        )
+        self.assertEqual(
+            len(long),
+            32,
+        )
+
+    def test_identity_changes_fingerprint(
+        self,
+    ):
+        base = visitor_fingerprint(
+            "203.0.113.5",
+            "TestAgent/1.0",
+        )
+        self.assertEqual(
+            base,
+            visitor_fingerprint(
+                "203.0.113.5",
+                "TestAgent/1.0",
+            ),
+        )
+        self.assertNotEqual(
+            base,
+            visitor_fingerprint(
+                "203.0.113.6",
+                "TestAgent/1.0",
+            ),
+        )
+        self.assertNotEqual(
+            base,
+            visitor_fingerprint(
+                "203.0.113.5",
+                "TestAgent/1.1",
+            ),
+        )
+
+    def test_missing_user_agent_matches_empty(
+        self,
+    ):
+        self.assertEqual(
+            visitor_fingerprint(
+                "203.0.113.5",
+                None,
+            ),
+            visitor_fingerprint(
+                "203.0.113.5",
+                "",
+            ),
+        )
+
+
+class ReferrerTests(SimpleTestCase):
+    """Tests for referrer_host and referrer_bucket."""
+
+    def test_referrer_host(
+        self,
+    ):
+        self.assertEqual(
+            referrer_host("https://News.YCombinator.com:443/item?id=1"),
+            "news.ycombinator.com",
+        )
+        self.assertEqual(
+            referrer_host(""),
+            "",
+        )
+        self.assertEqual(
+            referrer_host(None),
+            "",
+        )
+        self.assertEqual(
+            referrer_host("not a url"),
+            "",
+        )
+
+    def test_referrer_bucket(
+        self,
+    ):
+        internal = {"django-spellbook.org"}
+        cases = {
+            "": "direct",
+            "django-spellbook.org": "internal",
+            "www.google.co.uk": "search",
+            "duckduckgo.com": "search",
+            "old.reddit.com": "social",
+            "github.com": "social",
+            "example.com": "other",
+            # Suffix matches must be whole labels
+            "notgithub.com": "other",
+        }
+        for host, bucket in cases.items():
+            with self.subTest(host=host):
+                self.assertEqual(
+                    referrer_bucket(
+                        host,
+                        internal,
+                    ),
+                    bucket,
+                )
+
+    def test_referrer_bucket_matches_like_allowed_hosts(
+        self,
+    ):
+        """Internal hosts follow ALLOWED_HOSTS matching, minus a bare '*'."""
+        internal = [
+            ".django-spellbook.org",
+            "*",
+        ]
+        cases = {
+            "django-spellbook.org": "internal",
+            "docs.django-spellbook.org": "internal",
+            "example.com": "other",
+        }
+        for host, bucket in cases.items():
+            with self.subTest(host=host):
+                self.assertEqual(
+                    referrer_bucket(
+                        host,
+                        internal,
+                    ),
+                    bucket,
+                )
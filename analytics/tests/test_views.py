@@ -0,0 +1,145 @@
+# analytics/tests/test_views.py
+
+from django.core.cache import (
+    cache,
+)
+from django.test import (
+    TestCase,
+)
+from django.urls import (
+    reverse,
+)
+
+from ..models import (
+    PageView,
+    PageViewTotal,
+)
+
+
+class SidebarViewTests(TestCase):
+    def setUp(
+        self,
+    ):
+        cache.clear()
+        PageViewTotal.objects.create(
+            url="/docs/intro/",
+            count=12,
+        )
+        self.url = reverse("analytics:sidebar")
+
+    def test_renders_fragment_for_path(
+        self,
+    ):
+        response = self.client.get(
+            self.url,
+            {"path": "/docs/intro/"},
+        )
+        self.assertEqual(
+            response.status_code,
+            200,
+        )
+        self.assertContains(
+            response,
+            "12 views",
+        )
+        self.assertNotContains(
+            response,
+            "<html",
+        )
+
+    def test_layout_keeps_its_text_color(
+        self,
+    ):
+        """Only the base layout's fragment uses white heading text."""
+        base = self.client.get(
+            self.url,
+            {"path": "/docs/intro/"},
+        )
+        sidebar_left = self.client.get(
+            self.url,
+            {
+                "path": "/docs/intro/",
+                "layout": "sidebar_left",
+            },
+        )
+        self.assertContains(
+            base,
+            '<h4 class="sb-text-white sb-opacity-50">',
+        )
+        self.assertContains(
+            sidebar_left,
+            '<h4 class="sb-opacity-50">',
+        )
+        self.assertNotContains(
+            sidebar_left,
+            "sb-text-white",
+        )
+
+    def test_sets_http_caching_headers(
+        self,
+    ):
+        response = self.client.get(
+            self.url,
+            {"path": "/docs/intro/"},
+        )
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertIn(
+            "public",
+            response["Cache-Control"],
+        )
+        self.assertIn(
+            "max-age=60",
+            response["Cache-Control"],
+        )
+
+    def test_matching_etag_returns_not_modified(
+        self,
+    ):
+        first = self.client.get(
+            self.url,
+            {"path": "/docs/intro/"},
+        )
+        second = self.client.get(
+            self.url,
+            {"path": "/docs/intro/"},
+            HTTP_IF_NONE_MATCH=first["ETag"],
+        )
+        self.assertEqual(
+            second.status_code,
+            304,
+        )
+        self.assertEqual(
+            second["ETag"],
+            first["ETag"],
+        )
+
+    def test_excluded_or_invalid_path_is_empty(
+        self,
+    ):
+        for path in (
+            "",
+            "docs/intro/",
+            "/api/v1/markdown-preview/",
+        ):
+            with self.subTest(path=path):
+                response = self.client.get(
+                    self.url,
+                    {"path": path},
+                )
+                self.assertEqual(
+                    response.status_code,
+                    204,
+                )
+
+    def test_fetch_is_not_tracked(
+        self,
+    ):
+        """The middleware skips /analytics/, so the fetch is no page view."""
+        self.client.get(
+            self.url,
+            {"path": "/docs/intro/"},
+        )
+        self.assertEqual(
+            PageView.objects.count(),
+            0,
+        )
@@ -0,0 +1,21 @@
+from django.urls import (
+    path,
+)
+from . import (
+    views,
+)
+
+app_name = "analytics"
+
+urlpatterns = [
+    path(
+        "stats/",
+        views.buffer_stats,
+        name="buffer-stats",
+    ),
+    path(
+        "sidebar/",
+        views.sidebar,
+        name="sidebar",
+    ),
+]
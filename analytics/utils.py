@@ -1,4 +1,17 @@
 # analytics/utils.py
+import hashlib
+from typing import (
+    Iterable,
+    Optional,
+)
+from urllib.parse import (
+    urlsplit,
+)
+
+from django.http.request import (
+    validate_host,
+)
+
 MAX_URL_LENGTH = 512
 # Common file extensions often targeted by bots or not useful for tracking
 # Include the leading dot.
@@ -98,6 +111,42 @@ FORBIDDEN_SUBSTRINGS = {
     "//",  # Double slashes can indicate probing
 }
 
+# Referrer hosts grouped into buckets for the page view rollups.
+# Matched against the host and its parent domains, e.g. "www.google.co.uk"
+# matches "google.co.uk".
+SEARCH_REFERRER_HOSTS = {
+    "google.com",
+    "google.co.uk",
+    "google.ca",
+    "bing.com",
+    "duckduckgo.com",
+    "search.yahoo.com",
+    "yandex.ru",
+    "ecosia.org",
+    "search.brave.com",
+    "kagi.com",
+}
+SOCIAL_REFERRER_HOSTS = {
+    "github.com",
+    "reddit.com",
+    "news.ycombinator.com",
+    "twitter.com",
+    "x.com",
+    "t.co",
+    "linkedin.com",
+    "facebook.com",
+    "youtube.com",
+    "mastodon.social",
+    "discord.com",
+    "stackoverflow.com",
+}
+
+REFERRER_DIRECT = "direct"
+REFERRER_INTERNAL = "internal"
+REFERRER_SEARCH = "search"
+REFERRER_SOCIAL = "social"
+REFERRER_OTHER = "other"
+
 
 def validate_url(
     url: str,
@@ -153,3 +202,99 @@ def validate_url(
 
     # If all checks pass, the URL is considered valid for tracking
     return True
+
+
+def visitor_fingerprint(
+    ip_address: str,
+    user_agent: Optional[str],
+) -> str:
+    """
+    Hash a visitor identity into a fixed-width key.
+
+    The unique visitor upsert conflicts on this value instead of comparing
+    the full user agent, so the index stays small however long the header is.
+
+    Args:
+        ip_address: The (possibly anonymized) client IP address.
+        user_agent: The raw User-Agent header, may be empty or None.
+
+    Returns:
+        str: A 32 character hex digest (128-bit BLAKE2b).
+    """
+    identity = f"{ip_address}\x00{user_agent or ''}"
+    return hashlib.blake2b(
+        identity.encode(
+            "utf-8",
+            "surrogatepass",
+        ),
+        digest_size=16,
+    ).hexdigest()
+
+
+def is_bot_user_agent(
+    user_agent: Optional[str],
+) -> bool:
+    """
+    Flag user agents that identify themselves as bots.
+
+    Args:
+        user_agent: The raw User-Agent header, may be empty or None.
+
+    Returns:
+        bool: True if "bot" appears anywhere in the user agent.
+    """
+    return "bot" in (user_agent or "").lower()
+
+
+def referrer_host(
+    referrer: Optional[str],
+) -> str:
+    """
+    Extract the lowercased host from a Referer header.
+
+    Args:
+        referrer: The raw Referer header, may be empty or None.
+
+    Returns:
+        str: The host without port, or "" for direct visits.
+    """
+    if not referrer:
+        return ""
+    try:
+        host = urlsplit(referrer).hostname or ""
+    except ValueError:
+        return ""
+    return host[:255]
+
+
+def referrer_bucket(
+    host: str,
+    internal_hosts: Iterable[str] = (),
+) -> str:
+    """
+    Group a referrer host into a coarse traffic source bucket.
+
+    Args:
+        host: Host returned by ``referrer_host``.
+        internal_hosts: Hosts that serve this site (e.g. ALLOWED_HOSTS),
+            matched like ALLOWED_HOSTS: ``.example.com`` also covers its
+            subdomains. A bare ``*`` is ignored, since it would count every
+            referrer as internal.
+
+    Returns:
+        str: One of the ``REFERRER_*`` bucket names.
+    """
+    if not host:
+        return REFERRER_DIRECT
+    if validate_host(
+        host,
+        [pattern for pattern in internal_hosts if pattern != "*"],
+    ):
+        return REFERRER_INTERNAL
+    labels = host.split(".")
+    candidates = {".".join(labels[i:]) for i in range(len(labels) - 1)}
+    if candidates & SEARCH_REFERRER_HOSTS:
+        return REFERRER_SEARCH
+    if candidates & SOCIAL_REFERRER_HOSTS:
+        return REFERRER_SOCIAL
+    return REFERRER_OTHER
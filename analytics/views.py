@@ -1,5 +1,104 @@
-from django.shortcuts import (
-    render,
+import hashlib
+
+from django.contrib.admin.views.decorators import (
+    staff_member_required,
+)
+from django.conf import (
+    settings,
+)
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    JsonResponse,
+)
+from django.template.loader import (
+    render_to_string,
+)
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+)
+from django.views.decorators.http import (
+    require_GET,
+)
+
+from .buffer import (
+    get_stats,
 )
+from .context_processors import (
+    load_analytics,
+    should_display_analytics,
+)
+
+
+@staff_member_required
+def buffer_stats(
+    request: HttpRequest,
+) -> JsonResponse:
+    """
+    Report the analytics write buffer statistics for the worker that
+    served the request (queue depth, drops, flush latency, batch sizes).
+    """
+    return JsonResponse(get_stats())
+
+
+# Text color of the fragment's headings per page layout (``?layout=``);
+# the docs sidebar layout keeps its default text color
+LAYOUT_TEXT_CLASSES = {
+    "base": "sb-text-white",
+    "sidebar_left": "",
+}
+
+
+@require_GET
+def sidebar(
+    request: HttpRequest,
+) -> HttpResponse:
+    """
+    Render the analytics sidebar fragment for the page given in ``?path=``.
+
+    The docs pages fetch this with HTMX when the analytics section is
+    opened instead of embedding live counters, so their own HTML stays
+    cacheable. The fragment is public, cacheable for
+    ANALYTICS_SIDEBAR_MAX_AGE seconds and carries an ETag, so a repeat
+    fetch of unchanged counters is answered with a 304. ``?layout=``
+    names the including layout so the fragment keeps its styling.
+    """
+    path = request.GET.get(
+        "path",
+        "",
+    )
+    if (
+        not path.startswith("/")
+        or len(path) > 255
+        or not should_display_analytics(path)
+    ):
+        return HttpResponse(status=204)
 
-# Create your views here.
+    context = load_analytics(path)
+    context["text_class"] = LAYOUT_TEXT_CLASSES.get(
+        request.GET.get("layout"),
+        LAYOUT_TEXT_CLASSES["base"],
+    )
+    content = render_to_string(
+        "analytics/sidebar.html",
+        context,
+    )
+    etag = f'"{hashlib.md5(content.encode()).hexdigest()}"'
+    response = get_conditional_response(
+        request,
+        etag=etag,
+    ) or HttpResponse(content)
+    response["ETag"] = etag
+    max_age = getattr(
+        settings,
+        "ANALYTICS_SIDEBAR_MAX_AGE",
+        60,
+    )
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=max_age,
+        stale_while_revalidate=max_age * 5,
+    )
+    return response
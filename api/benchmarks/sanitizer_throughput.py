@@ -0,0 +1,144 @@
+"""
+Throughput benchmark for the HTML sanitizer engines.
+
+Renders a representative markdown document (headings, paragraphs with
+inline markup and links, lists, tables, code and SpellBlocks), repeats the
+HTML up to 10 KB, 100 KB and 1 MB, and sanitizes each size with the
+html5lib-based Cleaner and with the streaming fast path, checking that both
+produce the same output and printing the median time and throughput.
+
+Run from the project root:
+
+    python api/benchmarks/sanitizer_throughput.py --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+SIZES = {"10 KB": 10 * 1024, "100 KB": 100 * 1024, "1 MB": 1024 * 1024}
+
+SAMPLE_MARKDOWN = """
+# Release notes
+
+Spellbook renders **markdown** with _inline_ markup, `code`, and
+[links](https://example.com/docs?page=1&lang=en "Docs") into templates.
+
+## Features
+
+- Fast previews & caching
+- Nested lists
+    - with [relative links](/docs/getting-started/)
+    - and <span class="note">raw HTML</span>
+- A bad [link](javascript:alert(1))
+
+1. First
+2. Second
+
+> Quoted text with *emphasis* and a <script>alert("x")</script> tag.
+
+| Name | Value |
+|------|-------|
+| a    | 1 &lt; 2 |
+| b    | <b>bold</b> |
+
+```python
+def render(text):
+    return "<p>%s</p>" % text
+```
+
+{~ alert type="info" ~}
+An **alert** SpellBlock with a <!-- comment --> inside.
+{~~}
+
+{~ card title="Card" ~}
+Card body with an ![image](/static/img.png) and <u>underline</u>.
+{~~}
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Timed runs per size and engine (default: 5)",
+    )
+    parser.add_argument(
+        "--policy",
+        default="standard",
+        choices=["standard", "strict", "storage"],
+        help="Sanitizer policy (default: standard)",
+    )
+    return parser.parse_args()
+
+
+def build_document(html, size):
+    """Repeat rendered HTML until it is at least ``size`` characters."""
+    return html * (size // len(html) + 1)
+
+
+def median_seconds(func, document, repeat):
+    """Return the median wall time of ``func(document)``."""
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(document)
+        runs.append(time.perf_counter() - started)
+    return statistics.median(runs)
+
+
+def main():
+    args = parse_args()
+
+    import django
+
+    django.setup()
+
+    from django_spellbook.parsers import render_spellbook_markdown_to_html
+
+    from api.logic.sanitizers import get_cleaner
+    from api.logic.stream_sanitizer import stream_clean
+
+    cleaner = get_cleaner(args.policy)
+    html = render_spellbook_markdown_to_html(SAMPLE_MARKDOWN)
+
+    def streaming(document):
+        return stream_clean(document, cleaner)
+
+    print(f"Policy: {args.policy}, {args.repeat} runs per size\n")
+    print(
+        f"{'size':>8} {'bleach ms':>11} {'stream ms':>11} "
+        f"{'bleach MB/s':>12} {'stream MB/s':>12} {'speedup':>8}"
+    )
+    for label, size in SIZES.items():
+        document = build_document(html, size)
+        expected = cleaner.clean(document)
+        result = streaming(document)
+        if result is None:
+            print(f"{label:>8}  streaming path fell back to bleach")
+            continue
+        if result != expected:
+            raise SystemExit(f"{label}: engines disagree")
+
+        bleach_time = median_seconds(cleaner.clean, document, args.repeat)
+        stream_time = median_seconds(streaming, document, args.repeat)
+        megabytes = len(document.encode("utf-8")) / (1024 * 1024)
+        print(
+            f"{label:>8} {bleach_time * 1000:>11.1f} "
+            f"{stream_time * 1000:>11.1f} "
+            f"{megabytes / bleach_time:>12.2f} "
+            f"{megabytes / stream_time:>12.2f} "
+            f"{bleach_time / stream_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
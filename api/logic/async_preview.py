@@ -0,0 +1,143 @@
+"""
+Async rendering for the ASGI preview endpoint.
+
+Rendering is CPU-bound and synchronous, so ``render_preview_async`` runs
+``render_preview_html`` on a dedicated thread pool (large documents are
+further handed to the process pool, see render_pool) and awaits it without
+blocking the event loop.
+
+Requests that carry an editor session are tracked in preview_sessions and
+wait out its coalescing window before rendering. When a newer revision of
+the session arrives, the older request stops waiting and answers as
+superseded right away: its render is dropped if it has not started yet and
+stops at the next checkpoint otherwise.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+
+from .markdown_preview import render_preview_html
+from .preview_sessions import (
+    PreviewSuperseded,
+    acheck_shared_revision,
+    apublish_revision,
+    coalesce_window,
+    get_preview_sessions,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXECUTOR_WORKERS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_preview_executor() -> ThreadPoolExecutor:
+    """Return the thread pool previews render on, built on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(
+                        settings,
+                        "MARKDOWN_PREVIEW_EXECUTOR_WORKERS",
+                        DEFAULT_EXECUTOR_WORKERS,
+                    ),
+                    thread_name_prefix="preview-render",
+                )
+    return _executor
+
+
+async def render_preview_async(
+    raw_markdown: str,
+    enable_sanitization: bool = True,
+    strict_mode: bool = False,
+    session_id: Optional[str] = None,
+    revision: Optional[int] = None,
+) -> str:
+    """
+    Render a preview on the executor, cancelling it if it goes stale.
+
+    Args:
+        raw_markdown: The raw markdown content to process
+        enable_sanitization: Whether to sanitize the HTML output
+        strict_mode: Whether to use strict sanitization rules
+        session_id: The editor session, if the client sent one
+        revision: The request's revision within the session
+
+    Returns:
+        The preview HTML
+
+    Raises:
+        PreviewSuperseded: If the session has or gets a newer revision
+        RenderTimeout: If a pooled render exceeds its timeout
+        Exception: If rendering or sanitization fails unexpectedly
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_preview_executor()
+    job = functools.partial(
+        render_preview_html,
+        raw_markdown,
+        enable_sanitization=enable_sanitization,
+        strict_mode=strict_mode,
+    )
+    if session_id is None:
+        return await loop.run_in_executor(executor, job)
+
+    ticket = get_preview_sessions().begin(session_id, revision)
+    await apublish_revision(session_id, revision)
+    superseded = loop.create_future()
+
+    def wake() -> None:
+        if not superseded.done():
+            superseded.set_result(None)
+
+    def notify() -> None:
+        # The newer request may be served by another thread or event loop
+        try:
+            loop.call_soon_threadsafe(wake)
+        except RuntimeError:
+            pass  # This request has finished and its loop is closed
+
+    ticket.on_superseded(notify)
+    render = None
+    try:
+        # Let a burst of revisions settle on its last one
+        window = coalesce_window()
+        if window > 0:
+            await asyncio.wait({superseded}, timeout=window)
+        if not superseded.done():
+            await acheck_shared_revision(ticket)
+            render = loop.run_in_executor(
+                executor, functools.partial(job, ticket=ticket)
+            )
+            await asyncio.wait(
+                {render, superseded}, return_when=asyncio.FIRST_COMPLETED
+            )
+    except asyncio.CancelledError:
+        # The client went away
+        if render is not None:
+            render.cancel()
+        raise
+    finally:
+        if not superseded.done():
+            superseded.cancel()
+
+    if render is None or not render.done():
+        if render is not None:
+            # Drops the render if it is still queued on the executor
+            render.cancel()
+        logger.debug(
+            f"Preview revision {revision} of session {session_id} "
+            f"superseded by {ticket.latest_revision}"
+        )
+        raise PreviewSuperseded(ticket.latest_revision)
+    return render.result()
@@ -5,17 +5,32 @@ and sanitizing markdown content.
 """
 
 import logging
-from typing import Dict, List, Any
-import bleach
-from django.http import HttpResponse
+from typing import Dict, List, Any, Optional
+from django.http import HttpResponse, JsonResponse
 from django.utils.html import escape
 from rest_framework import status
 
-from django_spellbook.parsers import render_spellbook_markdown_to_html
+from .preview_cache import get_cached_preview, preview_mode, store_preview
+from .preview_sessions import PreviewSuperseded, PreviewTicket, coalesce_revision
+from .render_pool import RenderTimeout, render_markdown
+from .sanitizers import (
+    PREVIEW_PROTOCOLS,
+    STANDARD,
+    STANDARD_ATTRIBUTES,
+    STANDARD_TAGS,
+    STRICT,
+    STRICT_ATTRIBUTES,
+    STRICT_TAGS,
+    clean_html,
+)
 
 logger = logging.getLogger(__name__)
 
 
+class FallbackHTML(str):
+    """Escaped stand-in returned when rendering or sanitizing fails."""
+
+
 def render_markdown_to_html(raw_markdown: str) -> str:
     """
     Render raw markdown content to HTML using spellbook markdown processor.
@@ -24,25 +39,28 @@ def render_markdown_to_html(raw_markdown: str) -> str:
         raw_markdown: The raw markdown string to process
 
     Returns:
-        Rendered HTML string
+        Rendered HTML string, or a FallbackHTML with the escaped markdown
+        if rendering fails
 
     Raises:
-        Exception: If markdown rendering fails
+        RenderTimeout: If a pooled render exceeds its timeout
     """
     if not raw_markdown:
         return ""
 
     try:
-        html_output = render_spellbook_markdown_to_html(raw_markdown)
+        html_output = render_markdown(raw_markdown)
         logger.debug(
             f"Successfully rendered markdown ({len(raw_markdown)} "
             f"chars -> {len(html_output)} chars)"
         )
         return html_output
+    except RenderTimeout:
+        raise
     except Exception as e:
         logger.error(f"Failed to render markdown: {type(e).__name__} - {e}")
         # Return escaped markdown as fallback
-        return f"<pre><code>{escape(raw_markdown)}</code></pre>"
+        return FallbackHTML(f"<pre><code>{escape(raw_markdown)}</code></pre>")
 
 
 def sanitize_html_content(html_content: str, strict_mode: bool = False) -> str:
@@ -54,29 +72,16 @@ def sanitize_html_content(html_content: str, strict_mode: bool = False) -> str:
         strict_mode: If True, uses more restrictive sanitization rules
 
     Returns:
-        Sanitized HTML string
+        Sanitized HTML string, or a FallbackHTML with the escaped content
+        if sanitization fails
     """
     if not html_content:
         return ""
 
     try:
-        # Define allowed HTML tags
-        allowed_tags = _get_allowed_tags(strict_mode)
-
-        # Define allowed attributes per tag
-        allowed_attributes = _get_allowed_attributes(strict_mode)
-
-        # Define allowed protocols for links
-        allowed_protocols = _get_allowed_protocols()
-
-        # Perform sanitization
-        sanitized_html = bleach.clean(
-            html_content,
-            tags=frozenset(allowed_tags),
-            attributes=allowed_attributes,
-            protocols=frozenset(allowed_protocols),
-            strip=True,
-            strip_comments=True,
+        # Pre-built Cleaner for the policy (see sanitizers)
+        sanitized_html = clean_html(
+            html_content, policy=STRICT if strict_mode else STANDARD
         )
 
         logger.debug(
@@ -88,46 +93,169 @@ def sanitize_html_content(html_content: str, strict_mode: bool = False) -> str:
     except Exception as e:
         logger.error(f"Failed to sanitize HTML: {type(e).__name__} - {e}")
         # Return escaped content as fallback
-        return escape(html_content)
+        return FallbackHTML(escape(html_content))
+
+
+def render_preview_html(
+    raw_markdown: str,
+    enable_sanitization: bool = True,
+    strict_mode: bool = False,
+    ticket: Optional[PreviewTicket] = None,
+) -> str:
+    """
+    Render and optionally sanitize markdown, reusing cached previews.
+
+    The final HTML is cached by a hash of the markdown and the sanitization
+    mode (see preview_cache), so identical input skips both steps. Fallback
+    output from a failed step is returned but not cached, so the next
+    request tries again.
+
+    Args:
+        raw_markdown: The raw markdown content to process
+        enable_sanitization: Whether to sanitize the HTML output
+        strict_mode: Whether to use strict sanitization rules
+        ticket: The editor session ticket; work stops once it is superseded
+
+    Returns:
+        The preview HTML
+
+    Raises:
+        PreviewSuperseded: If the ticket was superseded before or after
+            rendering
+        RenderTimeout: If a pooled render exceeds its timeout
+        Exception: If rendering or sanitization fails unexpectedly
+    """
+    if not enable_sanitization:
+        logger.warning(
+            "HTML sanitization is DISABLED - this may be a security risk"
+        )
+
+    raw_markdown = raw_markdown or ""
+    mode = preview_mode(enable_sanitization, strict_mode)
+    html_output = get_cached_preview(raw_markdown, mode)
+    if html_output is not None:
+        return html_output
+
+    # Step 1: Render markdown to HTML
+    if ticket is not None:
+        ticket.check()
+    html_output = render_markdown_to_html(raw_markdown)
+    failed = isinstance(html_output, FallbackHTML)
+
+    # Step 2: Sanitize HTML if enabled
+    if ticket is not None:
+        ticket.check()
+    if enable_sanitization:
+        html_output = sanitize_html_content(
+            html_output, strict_mode=strict_mode
+        )
+        failed = failed or isinstance(html_output, FallbackHTML)
+
+    if not failed:
+        store_preview(raw_markdown, mode, html_output)
+    return html_output
+
+
+def superseded_response(revision: int) -> HttpResponse:
+    """
+    Answer a preview request that a newer revision has made pointless.
+
+    Args:
+        revision: The session's newest revision
+
+    Returns:
+        A small 409 JSON response the editor can ignore
+    """
+    return JsonResponse(
+        {"superseded": True, "revision": revision},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
+def render_timeout_response(error: RenderTimeout) -> HttpResponse:
+    """
+    Answer a preview whose render exceeded the render pool timeout.
+
+    Args:
+        error: The timeout raised by the render pool
+
+    Returns:
+        A 503 JSON response, as the StoredMarkdown views send
+    """
+    return JsonResponse(
+        {"detail": str(error)},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+def full_upload_response(detail: str) -> HttpResponse:
+    """
+    Ask the editor to resend a patched request as the whole document.
+
+    Args:
+        detail: Why the patch could not be applied
+
+    Returns:
+        A small 412 JSON response
+    """
+    return JsonResponse(
+        {"error": detail, "full_upload_required": True},
+        status=status.HTTP_412_PRECONDITION_FAILED,
+    )
 
 
 def process_markdown_preview(
     raw_markdown: str,
     enable_sanitization: bool = True,
     strict_mode: bool = False,
+    session_id: Optional[str] = None,
+    revision: Optional[int] = None,
 ) -> HttpResponse:
     """
     Process markdown preview request with rendering and optional sanitization.
 
+    Requests with an editor session are coalesced: only the newest revision
+    of a session is rendered and older ones get superseded_response.
+
     Args:
         raw_markdown: The raw markdown content to process
         enable_sanitization: Whether to sanitize the HTML output
         strict_mode: Whether to use strict sanitization rules
+        session_id: The editor session, if the client sent one
+        revision: The request's revision within the session
 
     Returns:
         HttpResponse with the processed HTML content
     """
     try:
-        # Step 1: Render markdown to HTML
-        html_output = render_markdown_to_html(raw_markdown)
-
-        # Step 2: Sanitize HTML if enabled
-        if enable_sanitization:
-            html_output = sanitize_html_content(
-                html_output, strict_mode=strict_mode
-            )
-        else:
-            logger.warning(
-                "HTML sanitization is DISABLED - this may be a security risk"
-            )
-
-        # Step 3: Return response
+        ticket = None
+        if session_id is not None:
+            ticket = coalesce_revision(session_id, revision)
+
+        html_output = render_preview_html(
+            raw_markdown,
+            enable_sanitization=enable_sanitization,
+            strict_mode=strict_mode,
+            ticket=ticket,
+        )
+
         return HttpResponse(
             html_output,
             content_type="text/html",
             status=status.HTTP_200_OK,
         )
 
+    except PreviewSuperseded as e:
+        logger.debug(
+            f"Preview revision {revision} of session {session_id} "
+            f"superseded by {e.revision}"
+        )
+        return superseded_response(e.revision)
+
+    except RenderTimeout as e:
+        logger.warning(f"Markdown preview timed out: {e}")
+        return render_timeout_response(e)
+
     except Exception as e:
         logger.error(
             f"Failed to process markdown preview: {type(e).__name__} - {e}"
@@ -154,81 +282,7 @@ def _get_allowed_tags(strict_mode: bool = False) -> List[str]:
     Returns:
         List of allowed HTML tag names
     """
-    if strict_mode:
-        # Strict mode: only basic formatting tags
-        return [
-            "p",
-            "br",
-            "hr",
-            "strong",
-            "b",
-            "em",
-            "i",
-            "u",
-            "ul",
-            "ol",
-            "li",
-            "blockquote",
-            "pre",
-            "code",
-            "h1",
-            "h2",
-            "h3",
-            "h4",
-            "h5",
-            "h6",
-        ]
-
-    # Standard mode: includes layout and semantic tags
-    return [
-        "h1",
-        "h2",
-        "h3",
-        "h4",
-        "h5",
-        "h6",
-        "p",
-        "br",
-        "hr",
-        "strong",
-        "b",
-        "em",
-        "i",
-        "u",
-        "strike",
-        "del",
-        "ul",
-        "ol",
-        "li",
-        "blockquote",
-        "pre",
-        "code",
-        "a",
-        "img",
-        "table",
-        "thead",
-        "tbody",
-        "tr",
-        "th",
-        "td",
-        "div",
-        "span",
-        "section",
-        "article",
-        "aside",
-        "header",
-        "footer",
-        "main",
-        "details",
-        "summary",
-        "button",
-        "form",
-        "input",
-        "label",
-        "select",
-        "option",
-        "textarea",
-    ]
+    return sorted(STRICT_TAGS if strict_mode else STANDARD_TAGS)
 
 
 def _get_allowed_attributes(strict_mode: bool = False) -> Dict[str, List[str]]:
@@ -241,56 +295,8 @@ def _get_allowed_attributes(strict_mode: bool = False) -> Dict[str, List[str]]:
     Returns:
         Dictionary mapping tag names to lists of allowed attributes
     """
-    if strict_mode:
-        # Strict mode: minimal attributes
-        return {
-            "a": ["href", "title"],
-            "img": ["src", "alt", "title"],
-            "code": ["class"],
-            "pre": ["class"],
-        }
-
-    # Standard mode: comprehensive attributes for spellblocks
-    return {
-        "a": ["href", "title", "target", "rel"],
-        "img": ["src", "alt", "title", "width", "height"],
-        "div": ["class", "id", "data-*"],
-        "span": ["class", "id", "data-*"],
-        "section": ["class", "id", "data-*"],
-        "article": ["class", "id", "data-*"],
-        "aside": ["class", "id", "data-*"],
-        "header": ["class", "id", "data-*"],
-        "footer": ["class", "id", "data-*"],
-        "main": ["class", "id", "data-*"],
-        "table": ["class", "id"],
-        "th": ["scope", "class"],
-        "td": ["colspan", "rowspan", "class"],
-        "tr": ["class"],
-        "thead": ["class"],
-        "tbody": ["class"],
-        "code": ["class"],
-        "pre": ["class"],
-        "button": ["class", "id", "type", "onclick", "aria-*"],
-        "form": ["class", "id", "action", "method"],
-        "input": ["class", "id", "type", "name", "value", "placeholder"],
-        "label": ["class", "id", "for"],
-        "select": ["class", "id", "name"],
-        "option": ["value", "selected"],
-        "textarea": ["class", "id", "name", "placeholder", "rows", "cols"],
-        "details": ["class", "id", "open"],
-        "summary": ["class", "id"],
-        "h1": ["class", "id"],
-        "h2": ["class", "id"],
-        "h3": ["class", "id"],
-        "h4": ["class", "id"],
-        "h5": ["class", "id"],
-        "h6": ["class", "id"],
-        "p": ["class", "id"],
-        "ul": ["class", "id"],
-        "ol": ["class", "id"],
-        "li": ["class", "id"],
-        "blockquote": ["class", "id"],
-    }
+    attributes = STRICT_ATTRIBUTES if strict_mode else STANDARD_ATTRIBUTES
+    return {tag: list(names) for tag, names in attributes.items()}
 
 
 def _get_allowed_protocols() -> List[str]:
@@ -300,7 +306,7 @@ def _get_allowed_protocols() -> List[str]:
     Returns:
         List of allowed URL protocols
     """
-    return ["http", "https", "mailto", "tel", "ftp"]
+    return sorted(PREVIEW_PROTOCOLS)
 
 
 def disable_html_sanitization_temporarily() -> None:
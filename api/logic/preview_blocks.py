@@ -0,0 +1,160 @@
+"""
+Block-level incremental rendering for the editor preview.
+
+A document is split into top-level blocks (paragraphs, headings, lists,
+fenced code and whole SpellBlocks), each block is rendered and sanitized on
+its own through the content-addressed preview cache, and every block gets
+an ID derived from its source. Editing one paragraph therefore re-renders
+only that paragraph, and the client, which reports the block IDs it already
+shows, only receives the HTML of blocks it has not seen.
+"""
+
+import hashlib
+import logging
+import re
+from typing import Any, Dict, Iterable, List
+
+from .markdown_preview import render_preview_html
+
+logger = logging.getLogger(__name__)
+
+FENCE_PATTERN = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+SPELLBLOCK_OPEN_PATTERN = re.compile(r"{~\s*\w+[^~]*?(?<!/)~}")
+SPELLBLOCK_CLOSE_PATTERN = re.compile(r"{~~}")
+LIST_ITEM_PATTERN = re.compile(r"^\s{0,3}(?:[*+-]|\d+[.)])\s")
+INDENTED_PATTERN = re.compile(r"^(?: {4}|\t)")
+# Reference links and footnotes resolve across blocks, so documents using
+# them are rendered as a single block.
+CROSS_BLOCK_PATTERN = re.compile(r"^\s{0,3}\[\^?[^\]]+\]:", re.MULTILINE)
+
+
+def split_blocks(raw_markdown: str) -> List[str]:
+    """
+    Split markdown into independently renderable top-level blocks.
+
+    Blocks are separated by blank lines, except inside fenced code and
+    SpellBlocks (which may nest). A chunk that is indented or continues a
+    list is kept with the previous block so lists render as one element.
+
+    Args:
+        raw_markdown: The raw markdown content
+
+    Returns:
+        List of block sources, in document order
+    """
+    if not raw_markdown or not raw_markdown.strip():
+        return []
+    if CROSS_BLOCK_PATTERN.search(raw_markdown):
+        return [raw_markdown.strip("\n")]
+
+    blocks: List[List[str]] = []
+    current: List[str] = []
+    fence = None
+    depth = 0
+    joins_previous = False
+
+    def finish() -> None:
+        if not current:
+            return
+        if joins_previous and blocks:
+            blocks[-1].append("")
+            blocks[-1].extend(current)
+        else:
+            blocks.append(list(current))
+        current.clear()
+
+    for line in raw_markdown.splitlines():
+        if fence is None and depth == 0 and not line.strip():
+            finish()
+            continue
+
+        if not current:
+            joins_previous = bool(blocks) and (
+                INDENTED_PATTERN.match(line) is not None
+                or (
+                    LIST_ITEM_PATTERN.match(line) is not None
+                    and LIST_ITEM_PATTERN.match(blocks[-1][0]) is not None
+                )
+            )
+        current.append(line)
+
+        fence_match = FENCE_PATTERN.match(line)
+        if fence is not None:
+            if fence_match and fence_match.group(1)[0] == fence:
+                fence = None
+            continue
+        if fence_match:
+            fence = fence_match.group(1)[0]
+            continue
+        depth += len(SPELLBLOCK_OPEN_PATTERN.findall(line))
+        depth = max(depth - len(SPELLBLOCK_CLOSE_PATTERN.findall(line)), 0)
+
+    finish()
+    return ["\n".join(block) for block in blocks]
+
+
+def block_ids(blocks: Iterable[str]) -> List[str]:
+    """
+    Derive stable IDs for blocks from their content.
+
+    An unchanged block keeps its ID across edits; repeated identical blocks
+    get a numeric suffix so IDs are unique within the document.
+
+    Args:
+        blocks: Block sources, as returned by split_blocks
+
+    Returns:
+        List of block IDs, one per block
+    """
+    ids = []
+    seen: Dict[str, int] = {}
+    for block in blocks:
+        digest = hashlib.sha256(block.encode("utf-8")).hexdigest()[:16]
+        count = seen.get(digest, 0) + 1
+        seen[digest] = count
+        ids.append(f"b{digest}" if count == 1 else f"b{digest}-{count}")
+    return ids
+
+
+def render_preview_blocks(
+    raw_markdown: str,
+    known_ids: Iterable[str] = (),
+    enable_sanitization: bool = True,
+    strict_mode: bool = False,
+) -> Dict[str, Any]:
+    """
+    Render a document block by block, skipping blocks the client has.
+
+    Args:
+        raw_markdown: The raw markdown content
+        known_ids: Block IDs already present in the client's preview
+        enable_sanitization: Whether to sanitize each block's HTML
+        strict_mode: Whether to use strict sanitization rules
+
+    Returns:
+        Dict with ``order`` (all block IDs in document order) and ``blocks``
+        (mapping of ID to HTML for the blocks the client lacks)
+
+    Raises:
+        RenderTimeout: If rendering a block exceeds the render pool timeout
+    """
+    known = set(known_ids)
+    blocks = split_blocks(raw_markdown)
+    ids = block_ids(blocks)
+    fragments = {}
+    for block_id, block in zip(ids, blocks):
+        if block_id in known or block_id in fragments:
+            continue
+        fragments[block_id] = render_preview_html(
+            block,
+            enable_sanitization=enable_sanitization,
+            strict_mode=strict_mode,
+        )
+
+    logger.debug(
+        f"Block preview: {len(ids)} blocks, {len(fragments)} rendered"
+    )
+    return {
+        "order": ids,
+        "blocks": fragments,
+    }
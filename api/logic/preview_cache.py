@@ -0,0 +1,176 @@
+"""
+Content-addressed cache for rendered markdown previews.
+
+Previews are keyed by a hash of the raw markdown and the sanitization mode
+and store the final HTML, so a repeated preview (undo/redo, retries, several
+tabs, the same example document) skips both markdown rendering and
+sanitization. Entries live in a small per-process LRU, bounded by entry
+count and total size. When the Django cache is shared between workers (see
+has_shared_cache) it backs the LRU, so workers also benefit from each
+other's renders; a per-process cache would only hold a second copy and
+push out the cached pages and analytics. Previews larger than
+MARKDOWN_PREVIEW_CACHE_MAX_SIZE are not cached at all.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .preview_sessions import has_shared_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LRU_SIZE = 256
+# Total characters of HTML held by the per-process LRU
+DEFAULT_LRU_MAX_CHARS = 8 * 1024 * 1024
+# Characters of HTML above which a preview is not cached
+DEFAULT_MAX_ENTRY_SIZE = 256 * 1024
+DEFAULT_CACHE_TIMEOUT = 60 * 60
+# Bump when rendering or sanitization rules change so old entries are ignored
+CACHE_VERSION = 1
+
+MODE_RAW = "raw"
+MODE_STANDARD = "standard"
+MODE_STRICT = "strict"
+
+_lru: "OrderedDict[str, str]" = OrderedDict()
+_lru_chars = 0
+_lock = threading.Lock()
+
+
+def preview_mode(enable_sanitization: bool, strict_mode: bool) -> str:
+    """
+    Name the sanitization mode a preview was produced with.
+
+    Args:
+        enable_sanitization: Whether the HTML is sanitized
+        strict_mode: Whether the strict rules are used
+
+    Returns:
+        One of MODE_RAW, MODE_STANDARD or MODE_STRICT
+    """
+    if not enable_sanitization:
+        return MODE_RAW
+    return MODE_STRICT if strict_mode else MODE_STANDARD
+
+
+def preview_cache_key(raw_markdown: str, mode: str) -> str:
+    """
+    Build the cache key for a markdown document in a sanitization mode.
+
+    Args:
+        raw_markdown: The raw markdown content
+        mode: The sanitization mode, see preview_mode
+
+    Returns:
+        Cache key string
+    """
+    digest = hashlib.sha256(raw_markdown.encode("utf-8")).hexdigest()
+    return f"md_preview:v{CACHE_VERSION}:{mode}:{digest}"
+
+
+def get_cached_preview(raw_markdown: str, mode: str) -> Optional[str]:
+    """
+    Look up the final HTML of a previously rendered preview.
+
+    Args:
+        raw_markdown: The raw markdown content
+        mode: The sanitization mode, see preview_mode
+
+    Returns:
+        The cached HTML, or None on a miss
+    """
+    key = preview_cache_key(raw_markdown, mode)
+    with _lock:
+        html = _lru.get(key)
+        if html is not None:
+            _lru.move_to_end(key)
+            return html
+
+    if not has_shared_cache():
+        return None
+    try:
+        html = cache.get(key)
+    except Exception as e:
+        # A cache outage must not fail previews, render them instead
+        logger.warning(f"Failed to read preview from cache: {e}")
+        return None
+    if html is not None:
+        _remember(key, html)
+    return html
+
+
+def store_preview(raw_markdown: str, mode: str, html: str) -> None:
+    """
+    Store the final HTML of a rendered preview.
+
+    The HTML goes into the per-process LRU and, when it is shared between
+    workers, the Django cache. Previews above the size cap are skipped.
+
+    Args:
+        raw_markdown: The raw markdown content
+        mode: The sanitization mode, see preview_mode
+        html: The rendered (and sanitized) HTML
+    """
+    max_entry_size = getattr(
+        settings,
+        "MARKDOWN_PREVIEW_CACHE_MAX_SIZE",
+        DEFAULT_MAX_ENTRY_SIZE,
+    )
+    if len(html) > max_entry_size:
+        return
+
+    key = preview_cache_key(raw_markdown, mode)
+    _remember(key, html)
+    if not has_shared_cache():
+        return
+    try:
+        cache.set(
+            key,
+            html,
+            getattr(
+                settings,
+                "MARKDOWN_PREVIEW_CACHE_TIMEOUT",
+                DEFAULT_CACHE_TIMEOUT,
+            ),
+        )
+    except Exception as e:
+        # The local LRU still has it; a cache outage must not fail previews
+        logger.warning(f"Failed to store preview in cache: {e}")
+
+
+def clear_preview_cache() -> None:
+    """Empty the per-process LRU (the shared cache expires on its own)."""
+    global _lru_chars
+    with _lock:
+        _lru.clear()
+        _lru_chars = 0
+
+
+def _remember(key: str, html: str) -> None:
+    """Insert into the per-process LRU, evicting the oldest entries."""
+    global _lru_chars
+    max_size = getattr(
+        settings,
+        "MARKDOWN_PREVIEW_LRU_SIZE",
+        DEFAULT_LRU_SIZE,
+    )
+    max_chars = getattr(
+        settings,
+        "MARKDOWN_PREVIEW_LRU_MAX_CHARS",
+        DEFAULT_LRU_MAX_CHARS,
+    )
+    with _lock:
+        previous = _lru.pop(key, None)
+        if previous is not None:
+            _lru_chars -= len(previous)
+        _lru[key] = html
+        _lru_chars += len(html)
+        while _lru and (len(_lru) > max_size or _lru_chars > max_chars):
+            _, evicted = _lru.popitem(last=False)
+            _lru_chars -= len(evicted)
@@ -0,0 +1,225 @@
+"""
+Diff-based preview uploads.
+
+Instead of posting the whole document on every edit, an editor with a
+session may send a ``patch`` against the last document it uploaded,
+identified by its SHA-256 ``base`` hash. The server keeps that document per
+session, applies the patch and renders the result. If the server no longer
+has the base (evicted, restarted) or the hashes disagree, the request is
+answered with 412 and the editor falls back to a full upload.
+
+The base must reach whichever worker serves the next request, so patches
+need a cache shared by all workers (see preview_sessions.has_shared_cache).
+With the default per-process LocMemCache and several workers, most patches
+would miss their base and cost an extra round trip. Patches are therefore
+only accepted, and advertised to the editor, when patches_enabled() says
+so: MARKDOWN_PREVIEW_PATCHES, or by default whether the cache is shared.
+
+A patch is a list of ``[start, end, text]`` splices in ascending order.
+Offsets count UTF-16 code units, as JavaScript string indices do, so they
+line up with the editor's own string operations.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .preview_sessions import DEFAULT_SESSION_TIMEOUT, has_shared_cache
+
+DEFAULT_DOCUMENT_LIMIT = 256
+
+
+class DocumentMismatch(Exception):
+    """The patch does not apply to the document the server holds."""
+
+
+def document_hash(text: str) -> str:
+    """Return the hex SHA-256 of a document's UTF-8 encoding."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def apply_patch(base: str, patch: list) -> str:
+    """
+    Apply ``[start, end, text]`` splices to a document.
+
+    Args:
+        base: The document the patch was made against
+        patch: Splices in ascending, non-overlapping order; offsets are
+            UTF-16 code units
+
+    Returns:
+        The patched document
+
+    Raises:
+        ValueError: If the patch is malformed or out of range
+        DocumentMismatch: If the patch splits a surrogate pair, i.e. it
+            was made against a different document
+    """
+    if not isinstance(patch, list):
+        raise ValueError("'patch' must be a list")
+    units = base.encode("utf-16-le")
+    length = len(units) // 2
+    pieces = []
+    position = 0
+    for splice in patch:
+        if not isinstance(splice, list) or len(splice) != 3:
+            raise ValueError("Each splice must be [start, end, text]")
+        start, end, text = splice
+        if (
+            not isinstance(start, int)
+            or not isinstance(end, int)
+            or isinstance(start, bool)
+            or isinstance(end, bool)
+            or not isinstance(text, str)
+        ):
+            raise ValueError("Each splice must be [start, end, text]")
+        if not position <= start <= end <= length:
+            raise ValueError("Splices must be in order and within the base")
+        pieces.append(units[position * 2 : start * 2])
+        pieces.append(text.encode("utf-16-le", "surrogatepass"))
+        position = end
+    pieces.append(units[position * 2 :])
+    try:
+        return b"".join(pieces).decode("utf-16-le")
+    except UnicodeDecodeError:
+        # A splice fell between the halves of a surrogate pair; the editor
+        # never produces that for the document it holds, so resync
+        raise DocumentMismatch("Patch splits a surrogate pair") from None
+
+
+class PreviewDocuments:
+    """Last uploaded document per editor session, bounded by ``limit``."""
+
+    def __init__(self, limit: int = DEFAULT_DOCUMENT_LIMIT):
+        self.limit = limit
+        self._documents: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Tuple[str, str]]:
+        """
+        Return the session's ``(hash, document)``, if known.
+
+        Falls back to the shared cache, which other workers also fill.
+        """
+        with self._lock:
+            entry = self._documents.get(session_id)
+            if entry is not None:
+                self._documents.move_to_end(session_id)
+                return entry
+        return cache.get(_document_key(session_id))
+
+    def put(self, session_id: str, text: str) -> str:
+        """Remember the session's latest document and return its hash."""
+        entry = (document_hash(text), text)
+        with self._lock:
+            self._documents[session_id] = entry
+            self._documents.move_to_end(session_id)
+            while len(self._documents) > self.limit:
+                self._documents.popitem(last=False)
+        cache.set(
+            _document_key(session_id),
+            entry,
+            getattr(
+                settings,
+                "MARKDOWN_PREVIEW_SESSION_TIMEOUT",
+                DEFAULT_SESSION_TIMEOUT,
+            ),
+        )
+        return entry[0]
+
+    def clear(self) -> None:
+        """Forget every local document."""
+        with self._lock:
+            self._documents.clear()
+
+
+def patches_enabled() -> bool:
+    """Whether preview requests may send a patch instead of the document."""
+    enabled = getattr(settings, "MARKDOWN_PREVIEW_PATCHES", None)
+    if enabled is not None:
+        return enabled
+    return has_shared_cache()
+
+
+def _document_key(session_id: str) -> str:
+    return f"md_preview_doc:{session_id}"
+
+
+_documents: Optional[PreviewDocuments] = None
+_documents_lock = threading.Lock()
+
+
+def get_preview_documents() -> PreviewDocuments:
+    """Return the process-wide document store, built on first use."""
+    global _documents
+    if _documents is None:
+        with _documents_lock:
+            if _documents is None:
+                _documents = PreviewDocuments(
+                    limit=getattr(
+                        settings,
+                        "MARKDOWN_PREVIEW_DOCUMENT_LIMIT",
+                        DEFAULT_DOCUMENT_LIMIT,
+                    )
+                )
+    return _documents
+
+
+def resolve_markdown(data, session_id: Optional[str] = None) -> str:
+    """
+    Return the markdown a preview request refers to.
+
+    A request carries either the full ``markdown`` or a ``patch`` against
+    the document with hash ``base``, plus optionally the ``hash`` of the
+    result. With a session and patches enabled, the resolved document
+    becomes the base for the session's next patch.
+
+    Args:
+        data: The parsed request body
+        session_id: The editor session, if the client sent one
+
+    Returns:
+        The markdown to render
+
+    Raises:
+        DocumentMismatch: If patches are disabled, the base is unknown or
+            a hash does not match, so the client must upload the whole
+            document
+        ValueError: If the request is malformed
+    """
+    patch = data.get("patch")
+    if patch is None:
+        markdown = data.get("markdown", "") or ""
+        if not isinstance(markdown, str):
+            raise ValueError("'markdown' must be a string")
+    else:
+        if session_id is None:
+            raise ValueError("'patch' requires a 'session'")
+        if not patches_enabled():
+            raise DocumentMismatch("Patches are not enabled")
+        documents = get_preview_documents()
+        entry = documents.get(session_id)
+        if entry is None or entry[0] != data.get("base"):
+            raise DocumentMismatch("Unknown base document")
+        markdown = apply_patch(entry[1], patch)
+        max_size = getattr(
+            settings,
+            "MAX_API_REQUEST_SIZE",
+            settings.DATA_UPLOAD_MAX_MEMORY_SIZE,
+        )
+        if len(markdown) > max_size:
+            raise ValueError(
+                f"Patched document exceeds {max_size} characters"
+            )
+        target = data.get("hash")
+        if target is not None and document_hash(markdown) != target:
+            raise DocumentMismatch("Patched document does not match 'hash'")
+
+    if session_id is not None and patches_enabled():
+        get_preview_documents().put(session_id, markdown)
+    return markdown
+
@@ -0,0 +1,329 @@
+"""
+Editor session tracking for live previews.
+
+An editor identifies itself with a session ID and numbers its preview
+requests with a monotonically increasing revision. Only the newest revision
+of a session is worth rendering: when a newer one arrives, the ticket of
+the older request is superseded, which stops its render at the next
+checkpoint and lets the waiting request answer at once.
+
+Tickets live per process in a bounded LRU. Each session's latest revision
+is also published to the Django cache, so a worker can tell that a request
+it holds was superseded by one served elsewhere. Before rendering, a
+request may wait a short coalescing window (MARKDOWN_PREVIEW_COALESCE_WINDOW)
+so a burst of keystrokes collapses into a single render of the last one.
+
+The window only pays off when a newer revision can actually reach the
+waiting request. The async endpoint always waits it, since one event loop
+serves the whole burst. The sync endpoint only waits when the cache is
+shared between workers (see has_shared_cache); with sync workers and the
+per-process LocMemCache nothing could supersede the request meanwhile, and
+the window would only hold the worker.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_SESSION_LIMIT = 1024
+DEFAULT_SESSION_TIMEOUT = 10 * 60
+DEFAULT_COALESCE_WINDOW = 0.1
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# Cache backends whose entries are private to one process
+LOCAL_CACHE_BACKENDS = {
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+}
+# Short-lived lock serializing updates of a session's shared revision
+REVISION_LOCK_TIMEOUT = 1
+REVISION_LOCK_ATTEMPTS = 50
+REVISION_LOCK_DELAY = 0.002
+
+
+class PreviewSuperseded(Exception):
+    """A newer revision of the same editor session has been requested."""
+
+    def __init__(self, revision: int):
+        super().__init__(f"Superseded by revision {revision}")
+        self.revision = revision
+
+
+class PreviewTicket:
+    """One preview request of an editor session."""
+
+    def __init__(self, session_id: str, revision: int):
+        self.session_id = session_id
+        self.revision = revision
+        self.latest_revision = revision
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def superseded(self) -> bool:
+        return self._event.is_set()
+
+    def supersede(self, revision: int) -> None:
+        """Mark the request stale and run its callbacks."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.latest_revision = revision
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_superseded(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` once the ticket is superseded (now if it is)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds; return True if superseded."""
+        return self._event.wait(timeout)
+
+    def check(self) -> None:
+        """
+        Raise if a newer revision has been requested.
+
+        Raises:
+            PreviewSuperseded: If the ticket is superseded
+        """
+        if self._event.is_set():
+            raise PreviewSuperseded(self.latest_revision)
+
+
+class PreviewSessions:
+    """Latest preview ticket per editor session, bounded by ``limit``."""
+
+    def __init__(self, limit: int = DEFAULT_SESSION_LIMIT):
+        self.limit = limit
+        self._tickets: "OrderedDict[str, PreviewTicket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, session_id: str, revision: int) -> PreviewTicket:
+        """
+        Register a request and supersede the session's older request.
+
+        Args:
+            session_id: The editor session ID
+            revision: The request's revision number
+
+        Returns:
+            The request's ticket
+
+        Raises:
+            PreviewSuperseded: If the session already has a newer revision
+        """
+        ticket = PreviewTicket(session_id, revision)
+        with self._lock:
+            current = self._tickets.get(session_id)
+            if current is not None and revision < current.revision:
+                raise PreviewSuperseded(current.revision)
+            self._tickets[session_id] = ticket
+            self._tickets.move_to_end(session_id)
+            while len(self._tickets) > self.limit:
+                self._tickets.popitem(last=False)
+        if current is not None:
+            current.supersede(revision)
+        return ticket
+
+    def latest_revision(self, session_id: str) -> Optional[int]:
+        """Return the newest revision seen for a session, if any."""
+        with self._lock:
+            ticket = self._tickets.get(session_id)
+            return ticket.revision if ticket is not None else None
+
+    def clear(self) -> None:
+        """Forget every session."""
+        with self._lock:
+            self._tickets.clear()
+
+
+_sessions: Optional[PreviewSessions] = None
+_sessions_lock = threading.Lock()
+
+
+def get_preview_sessions() -> PreviewSessions:
+    """Return the process-wide session registry, built on first use."""
+    global _sessions
+    if _sessions is None:
+        with _sessions_lock:
+            if _sessions is None:
+                _sessions = PreviewSessions(
+                    limit=getattr(
+                        settings,
+                        "MARKDOWN_PREVIEW_SESSION_LIMIT",
+                        DEFAULT_SESSION_LIMIT,
+                    )
+                )
+    return _sessions
+
+
+def coalesce_window() -> float:
+    """Seconds a session request waits for a newer revision."""
+    return getattr(
+        settings, "MARKDOWN_PREVIEW_COALESCE_WINDOW", DEFAULT_COALESCE_WINDOW
+    )
+
+
+def has_shared_cache() -> bool:
+    """
+    Whether the default cache is shared by every worker process.
+
+    MARKDOWN_PREVIEW_SHARED_CACHE overrides the guess made from the
+    ``default`` backend in CACHES (LocMemCache and DummyCache are not).
+    """
+    shared = getattr(settings, "MARKDOWN_PREVIEW_SHARED_CACHE", None)
+    if shared is not None:
+        return shared
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    return backend not in LOCAL_CACHE_BACKENDS
+
+
+def _revision_key(session_id: str) -> str:
+    return f"md_preview_session:{session_id}"
+
+
+def _session_timeout() -> int:
+    return getattr(
+        settings, "MARKDOWN_PREVIEW_SESSION_TIMEOUT", DEFAULT_SESSION_TIMEOUT
+    )
+
+
+def publish_revision(session_id: str, revision: int) -> None:
+    """
+    Record a session's newest revision in the shared cache.
+
+    The first revision of a session is stored with an atomic ``add``.
+    Later ones compare and set under a lock taken with ``add``, so two
+    workers publishing at once cannot move the revision backwards.
+
+    Raises:
+        PreviewSuperseded: If another worker has seen a newer revision
+    """
+    key = _revision_key(session_id)
+    if cache.add(key, revision, _session_timeout()):
+        return
+    lock = f"{key}:lock"
+    for _ in range(REVISION_LOCK_ATTEMPTS):
+        if cache.add(lock, True, REVISION_LOCK_TIMEOUT):
+            break
+        time.sleep(REVISION_LOCK_DELAY)
+    else:
+        lock = None  # Held by a stuck worker; it expires on its own
+    try:
+        latest = cache.get(key)
+        if latest is not None and latest > revision:
+            raise PreviewSuperseded(latest)
+        cache.set(key, revision, _session_timeout())
+    finally:
+        if lock is not None:
+            cache.delete(lock)
+
+
+async def apublish_revision(session_id: str, revision: int) -> None:
+    """Async variant of publish_revision."""
+    key = _revision_key(session_id)
+    if await cache.aadd(key, revision, _session_timeout()):
+        return
+    lock = f"{key}:lock"
+    for _ in range(REVISION_LOCK_ATTEMPTS):
+        if await cache.aadd(lock, True, REVISION_LOCK_TIMEOUT):
+            break
+        await asyncio.sleep(REVISION_LOCK_DELAY)
+    else:
+        lock = None
+    try:
+        latest = await cache.aget(key)
+        if latest is not None and latest > revision:
+            raise PreviewSuperseded(latest)
+        await cache.aset(key, revision, _session_timeout())
+    finally:
+        if lock is not None:
+            await cache.adelete(lock)
+
+
+def check_shared_revision(ticket: PreviewTicket) -> None:
+    """
+    Supersede a ticket if any worker has seen a newer revision.
+
+    Raises:
+        PreviewSuperseded: If the ticket is superseded
+    """
+    latest = cache.get(_revision_key(ticket.session_id))
+    if latest is not None and latest > ticket.revision:
+        ticket.supersede(latest)
+    ticket.check()
+
+
+async def acheck_shared_revision(ticket: PreviewTicket) -> None:
+    """Async variant of check_shared_revision."""
+    latest = await cache.aget(_revision_key(ticket.session_id))
+    if latest is not None and latest > ticket.revision:
+        ticket.supersede(latest)
+    ticket.check()
+
+
+def coalesce_revision(session_id: str, revision: int) -> PreviewTicket:
+    """
+    Register a request and wait out the coalescing window.
+
+    Returns once the request is still the session's newest revision after
+    the window, so the caller should render it. Without a shared cache the
+    window is skipped (see the module docstring).
+
+    Args:
+        session_id: The editor session ID
+        revision: The request's revision number
+
+    Returns:
+        The request's ticket, to pass to render_preview_html
+
+    Raises:
+        PreviewSuperseded: If a newer revision arrives first
+    """
+    ticket = get_preview_sessions().begin(session_id, revision)
+    publish_revision(session_id, revision)
+    window = coalesce_window()
+    if window > 0 and has_shared_cache() and ticket.wait(window):
+        ticket.check()
+    check_shared_revision(ticket)
+    return ticket
+
+
+def parse_session(session_id, revision) -> Optional[Tuple[str, int]]:
+    """
+    Validate the session fields of a preview request.
+
+    Args:
+        session_id: The ``session`` value sent by the editor, if any
+        revision: The ``revision`` value sent by the editor, if any
+
+    Returns:
+        ``(session_id, revision)``, or None if the request has no session
+
+    Raises:
+        ValueError: If the fields are present but malformed
+    """
+    if session_id in (None, ""):
+        return None
+    if not isinstance(session_id, str) or not SESSION_ID_PATTERN.fullmatch(
+        session_id
+    ):
+        raise ValueError(
+            "'session' must be 1-64 letters, digits, '-' or '_'"
+        )
+    if isinstance(revision, bool) or not isinstance(revision, (int, str)):
+        raise ValueError("'revision' must be an integer")
+    return session_id, int(revision)
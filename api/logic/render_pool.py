@@ -0,0 +1,360 @@
+"""
+Process pool for CPU-heavy markdown rendering.
+
+``render_spellbook_markdown_to_html`` is pure Python and holds the GIL for
+its whole run (roughly 20 ms per KB of markdown), so a large document
+rendered on a request thread stalls every other request its worker could
+serve. ``render_markdown`` renders small documents inline and hands large
+ones to a pool of warm worker processes, waiting at most a per-task timeout.
+
+Each web worker process owns its pool: it is started by
+``warm_render_pool`` (see core/wsgi.py) or on first use, and re-created if
+the process was forked since. A task that times out is killed together with
+the pool, which is replaced, so a pathological document cannot keep a
+render process busy forever. The other renders the old pool held are
+submitted again to the new one, so only the stuck render fails, but they
+start over and wait for the new workers to come up.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django_spellbook.parsers import render_spellbook_markdown_to_html
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_SIZE = 4 * 1024
+DEFAULT_TIMEOUT = 30
+DEFAULT_START_METHOD = "forkserver"
+# Seconds between checks for a restart while waiting on a pooled render
+POLL_INTERVAL = 0.05
+
+# Rendered once by every new worker so its first real task is fast
+WARM_UP_MARKDOWN = '# Ready\n\n{~ alert type="info" ~}\n*Warm*\n{~~}\n'
+
+
+class RenderTimeout(Exception):
+    """A pooled render did not finish within its timeout."""
+
+
+class RenderPool:
+    """
+    Route markdown renders inline or to a pool of worker processes.
+
+    Documents shorter than ``min_size`` characters render on the calling
+    thread, where the pool's IPC overhead would outweigh the render itself.
+    With ``workers`` set to 0 everything renders inline.
+    """
+
+    def __init__(
+        self,
+        workers: int = 0,
+        min_size: int = DEFAULT_MIN_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_tasks_per_child: Optional[int] = None,
+        start_method: Optional[str] = DEFAULT_START_METHOD,
+    ):
+        self.workers = workers
+        self.min_size = min_size
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self.start_method = start_method
+        self._pool = None
+        self._pool_pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+        # Counters reported by get_stats()
+        self.started_at: Optional[float] = None
+        self.inline = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.resubmitted = 0
+        self.busy = 0
+        self.max_busy = 0
+        self.busy_seconds = 0.0
+        self.max_task_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls) -> "RenderPool":
+        """Build a pool configured from the MARKDOWN_RENDER_POOL_* settings."""
+        return cls(
+            workers=getattr(settings, "MARKDOWN_RENDER_POOL_WORKERS", 0),
+            min_size=getattr(
+                settings, "MARKDOWN_RENDER_POOL_MIN_SIZE", DEFAULT_MIN_SIZE
+            ),
+            timeout=getattr(
+                settings, "MARKDOWN_RENDER_POOL_TIMEOUT", DEFAULT_TIMEOUT
+            ),
+            max_tasks_per_child=getattr(
+                settings, "MARKDOWN_RENDER_POOL_MAX_TASKS_PER_CHILD", None
+            ),
+            start_method=getattr(
+                settings,
+                "MARKDOWN_RENDER_POOL_START_METHOD",
+                DEFAULT_START_METHOD,
+            ),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def start(self) -> None:
+        """Start the worker processes now rather than on the first render."""
+        if self.enabled:
+            with self._lock:
+                self._ensure_pool()
+
+    def stop(self) -> None:
+        """Terminate the worker processes; a later render starts new ones."""
+        with self._lock:
+            pool = self._detach_pool()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    def render(self, markdown_string: str) -> str:
+        """
+        Render markdown to HTML, in the pool if the document is large.
+
+        Args:
+            markdown_string: The markdown to render
+
+        Returns:
+            The rendered HTML
+
+        Raises:
+            RenderTimeout: If a pooled render exceeds the timeout
+            Exception: Whatever the renderer raises
+        """
+        if not self.enabled or len(markdown_string) < self.min_size:
+            with self._lock:
+                self.inline += 1
+            return render_spellbook_markdown_to_html(markdown_string)
+
+        with self._lock:
+            pool = self._ensure_pool()
+            self.submitted += 1
+            self.busy += 1
+            self.max_busy = max(self.max_busy, self.busy)
+        started = time.monotonic()
+        outcome = "failed"
+        try:
+            html = self._render_in_pool(pool, markdown_string)
+            outcome = "completed"
+            return html
+        except RenderTimeout:
+            outcome = "timeouts"
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                setattr(self, outcome, getattr(self, outcome) + 1)
+                self.busy -= 1
+                self.busy_seconds += elapsed
+                self.max_task_seconds = max(self.max_task_seconds, elapsed)
+
+    def _render_in_pool(self, pool, markdown_string: str) -> str:
+        """
+        Render in ``pool``, waiting up to the timeout.
+
+        Terminating a pool loses every task it holds, not just the stuck
+        one, and their results never arrive. A task whose pool was
+        restarted by another render's timeout is therefore submitted again
+        to the new pool with a fresh timeout, so only the stuck render
+        fails.
+
+        Raises:
+            RenderTimeout: If this render exceeds the timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        result = pool.apply_async(_render_in_worker, (markdown_string,))
+        while True:
+            remaining = max(deadline - time.monotonic(), 0)
+            try:
+                return result.get(min(POLL_INTERVAL, remaining))
+            except multiprocessing.TimeoutError:
+                pass
+            with self._lock:
+                restarted = self._pool is not pool
+                if restarted:
+                    pool = self._ensure_pool()
+                    self.resubmitted += 1
+            if restarted:
+                deadline = time.monotonic() + self.timeout
+                result = pool.apply_async(
+                    _render_in_worker, (markdown_string,)
+                )
+            elif time.monotonic() >= deadline:
+                break
+
+        logger.error(
+            f"Markdown render of {len(markdown_string)} chars timed out "
+            f"after {self.timeout}s; restarting the render pool"
+        )
+        self._restart(pool)
+        raise RenderTimeout(
+            f"Rendering took longer than {self.timeout} seconds"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report routing counters and pool utilization for this process.
+
+        ``utilization`` is the share of workers busy right now and
+        ``average_utilization`` the share of worker time spent rendering
+        since the pool started.
+        """
+        with self._lock:
+            uptime = (
+                time.monotonic() - self.started_at
+                if self.started_at is not None
+                else 0.0
+            )
+            pooled = self.completed + self.failed + self.timeouts
+            return {
+                "pid": os.getpid(),
+                "enabled": self.enabled,
+                "running": self._pool is not None
+                and self._pool_pid == os.getpid(),
+                "workers": self.workers,
+                "min_size": self.min_size,
+                "timeout": self.timeout,
+                "inline": self.inline,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "restarts": self.restarts,
+                "resubmitted": self.resubmitted,
+                "busy": self.busy,
+                "max_busy": self.max_busy,
+                "utilization": (
+                    self.busy / self.workers if self.workers else 0.0
+                ),
+                "average_utilization": (
+                    min(self.busy_seconds / (self.workers * uptime), 1.0)
+                    if self.workers and uptime
+                    else 0.0
+                ),
+                "average_task_ms": (
+                    self.busy_seconds * 1000 / pooled if pooled else 0.0
+                ),
+                "max_task_ms": self.max_task_seconds * 1000,
+                "uptime_seconds": uptime,
+            }
+
+    def _ensure_pool(self):
+        """Return this process's pool, starting it if needed (lock held)."""
+        if self._pool is None or self._pool_pid != os.getpid():
+            # A pool inherited through fork belongs to the parent
+            context = multiprocessing.get_context(self.start_method)
+            self._pool = context.Pool(
+                processes=self.workers,
+                initializer=_init_worker,
+                maxtasksperchild=self.max_tasks_per_child,
+            )
+            self._pool_pid = os.getpid()
+            self.started_at = time.monotonic()
+            logger.info(
+                f"Started markdown render pool with {self.workers} workers "
+                f"({self.start_method or 'default'} start method)"
+            )
+        return self._pool
+
+    def _detach_pool(self):
+        """Forget this process's pool and return it (lock held)."""
+        pool = self._pool if self._pool_pid == os.getpid() else None
+        self._pool = None
+        self._pool_pid = None
+        return pool
+
+    def _restart(self, pool) -> None:
+        """Kill a pool with a stuck task; the next render starts a new one."""
+        with self._lock:
+            if self._pool is not pool:
+                return  # Another thread already replaced it
+            self._detach_pool()
+            self.restarts += 1
+        pool.terminate()
+
+
+def _init_worker() -> None:
+    """Set up Django in a new worker process and warm up the renderer."""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+        django.setup()
+    render_spellbook_markdown_to_html(WARM_UP_MARKDOWN)
+
+
+def _render_in_worker(markdown_string: str) -> str:
+    return render_spellbook_markdown_to_html(markdown_string)
+
+
+_render_pool: Optional[RenderPool] = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> RenderPool:
+    """Return the process-wide RenderPool, built from settings on first use."""
+    global _render_pool
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                _render_pool = RenderPool.from_settings()
+    return _render_pool
+
+
+def render_markdown(markdown_string: str) -> str:
+    """
+    Render markdown to HTML, offloading large documents to the render pool.
+
+    Args:
+        markdown_string: The markdown to render
+
+    Returns:
+        The rendered HTML
+
+    Raises:
+        RenderTimeout: If a pooled render exceeds the timeout
+    """
+    return get_render_pool().render(markdown_string)
+
+
+def warm_render_pool() -> None:
+    """Start the render pool's workers ahead of the first request."""
+    try:
+        get_render_pool().start()
+    except Exception as e:
+        # Renders fall back to starting the pool on first use
+        logger.warning(f"Could not start the markdown render pool: {e}")
+
+
+def get_render_pool_stats() -> Dict[str, Any]:
+    """Report the render pool statistics for this process."""
+    return get_render_pool().get_stats()
+
+
+def reset_render_pool() -> None:
+    """Stop and forget the render pool, e.g. after changing its settings."""
+    global _render_pool
+    with _render_pool_lock:
+        pool, _render_pool = _render_pool, None
+    if pool is not None:
+        pool.stop()
+
+
+# Stop the workers before interpreter teardown rather than in Pool.__del__
+atexit.register(reset_render_pool)
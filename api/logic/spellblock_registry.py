@@ -2,17 +2,27 @@
 Logic functions for SpellBlock Registry API endpoint.
 Provides clean, testable helper functions for extracting
 and processing spellblock information.
+
+Building the registry inspects every block's source, and blocks only change
+on deploy, so the serialized response is built once per process (see
+get_spellblock_registry_payload) and served with an ETag.
 """
 
+import hashlib
 import inspect
 import re
 import logging
-from typing import Dict, List, Tuple, Any
+import threading
+from typing import Dict, List, Optional, Tuple, Any
 
 from django_spellbook.blocks import SpellBlockRegistry
+from rest_framework.renderers import JSONRenderer
 
 logger = logging.getLogger(__name__)
 
+_payload: Optional[Tuple[bytes, str]] = None
+_payload_lock = threading.Lock()
+
 
 def extract_default_parameters(block_class) -> Dict[str, Dict[str, Any]]:
     """
@@ -141,6 +151,39 @@ def build_spellblock_registry() -> List[Dict[str, Any]]:
     return registry_data
 
 
+def get_spellblock_registry_payload() -> Tuple[bytes, str]:
+    """
+    Return the serialized registry API response and its strong ETag.
+
+    The registry is built on first use rather than at startup, since apps
+    later in INSTALLED_APPS may still register blocks in their ready().
+
+    Returns:
+        Tuple of (JSON body, quoted ETag)
+    """
+    global _payload
+    if _payload is None:
+        with _payload_lock:
+            if _payload is None:
+                registry_data = build_spellblock_registry()
+                body = JSONRenderer().render(
+                    {
+                        "blocks": registry_data,
+                        "count": len(registry_data),
+                    }
+                )
+                etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+                _payload = (body, etag)
+    return _payload
+
+
+def clear_spellblock_registry_cache() -> None:
+    """Forget the built registry, e.g. after registering new blocks."""
+    global _payload
+    with _payload_lock:
+        _payload = None
+
+
 def _get_block_description(block_class, block_name: str) -> str:
     """
     Get the description for a spellblock from its docstring
@@ -0,0 +1,397 @@
+"""
+Streaming fast path for the HTML sanitizer.
+
+``bleach.Cleaner.clean`` runs html5lib's character-by-character tokenizer,
+builds a DOM tree, walks it back into tokens, filters them and serializes.
+For large previews the tokenizer and tree builder dominate. Markdown output
+is well-formed HTML, so this module tokenizes it with a few regular
+expressions in a single pass and feeds the tokens straight into bleach's own
+sanitizer filter and serializer, skipping the tree entirely.
+
+Only the subset of HTML whose html5lib tree construction is a plain stack
+push/pop is handled here. Anything that would make html5lib repair the
+document (misnested or stray tags, implied ``<p>``/``<li>`` closes, foster
+parenting in tables, raw text elements, unusual markup declarations, ...)
+aborts the pass and the caller falls back to the full Cleaner, so the output
+is always the one bleach would produce.
+"""
+
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+import bleach
+from bleach.html5lib_shim import HTML_TAGS_BLOCK_LEVEL
+from bleach.sanitizer import BleachSanitizerFilter
+
+_ATTRIBUTE = (
+    r"[\t\n\x0c ]+([^\t\n\x0c />\"'<=][^\t\n\x0c />=\"'<]*)"
+    r"(?:[\t\n\x0c ]*=[\t\n\x0c ]*"
+    r"(?:\"([^\"]*)\"|'([^']*)'|([^\t\n\x0c >\"'<=`]+)))?"
+)
+START_TAG_PATTERN = re.compile(
+    r"<([a-zA-Z][^\t\n\x0c />]*)((?:" + _ATTRIBUTE + r")*)[\t\n\x0c ]*/?>"
+)
+ATTRIBUTE_PATTERN = re.compile(_ATTRIBUTE)
+END_TAG_PATTERN = re.compile(r"</([a-zA-Z][^\t\n\x0c />]*)[\t\n\x0c ]*>")
+COMMENT_PATTERN = re.compile(r"<!--(.*?)-->", re.DOTALL)
+NON_SPACE_PATTERN = re.compile(r"[^\t\n\x0c ]")
+
+_ASCII_LOWER = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"
+)
+
+HEADINGS = frozenset(["h1", "h2", "h3", "h4", "h5", "h6"])
+VOID_TAGS = frozenset(["br", "hr", "img", "input", "wbr"])
+# Start tags that close an open <p> (html5lib's "in body" rules)
+CLOSES_P = HEADINGS | frozenset(
+    [
+        "address",
+        "article",
+        "aside",
+        "blockquote",
+        "center",
+        "details",
+        "dir",
+        "div",
+        "dl",
+        "fieldset",
+        "figcaption",
+        "figure",
+        "footer",
+        "header",
+        "hgroup",
+        "hr",
+        "li",
+        "main",
+        "menu",
+        "nav",
+        "ol",
+        "p",
+        "pre",
+        "section",
+        "summary",
+        "table",
+        "ul",
+    ]
+)
+# Elements whose end tag first closes any open <p> or <li> inside them
+CLOSES_IMPLIED = (CLOSES_P - frozenset(["hr", "p", "table"])) | frozenset(
+    ["button", "dialog"]
+)
+IMPLIED_END_TAGS = frozenset(["li", "p"])
+FORMATTING_TAGS = frozenset(
+    [
+        "a",
+        "b",
+        "big",
+        "code",
+        "em",
+        "font",
+        "i",
+        "s",
+        "small",
+        "strike",
+        "strong",
+        "tt",
+        "u",
+    ]
+)
+INLINE_TAGS = frozenset(
+    [
+        "abbr",
+        "bdi",
+        "bdo",
+        "cite",
+        "data",
+        "del",
+        "dfn",
+        "ins",
+        "kbd",
+        "label",
+        "mark",
+        "q",
+        "samp",
+        "span",
+        "sub",
+        "sup",
+        "time",
+        "var",
+    ]
+)
+# Table elements and the children each may contain directly
+TABLE_CHILDREN = {
+    "table": frozenset(["thead", "tbody"]),
+    "thead": frozenset(["tr"]),
+    "tbody": frozenset(["tr"]),
+    "tr": frozenset(["td", "th"]),
+}
+TABLE_TAGS = frozenset(["table", "thead", "tbody", "tr", "td", "th"])
+# Allowed tags outside this set (forms, raw text elements, ...) abort the
+# fast path
+SUPPORTED_TAGS = (
+    CLOSES_P | CLOSES_IMPLIED | VOID_TAGS | FORMATTING_TAGS | INLINE_TAGS
+) | TABLE_TAGS
+# Elements that stop the search for an open <li> when a new one starts
+# (html5lib's "special" elements other than address, div and p)
+LIST_ITEM_BOUNDARIES = (CLOSES_IMPLIED | TABLE_TAGS) - frozenset(
+    [
+        "address",
+        "dialog",
+        "div",
+        "figcaption",
+        "hgroup",
+        "li",
+        "main",
+        "p",
+        "summary",
+    ]
+)
+
+
+class Unsupported(Exception):
+    """The document needs html5lib's error recovery."""
+
+
+def stream_clean(html: str, cleaner: bleach.Cleaner) -> Optional[str]:
+    """
+    Sanitize HTML in a single streaming pass, if the document allows it.
+
+    The result is identical to ``cleaner.clean(html)``.
+
+    Args:
+        html: The HTML to sanitize
+        cleaner: The Cleaner whose policy and serializer to use
+
+    Returns:
+        Sanitized HTML string, or None if the document needs the full
+        Cleaner
+    """
+    if not html:
+        return ""
+    if not (cleaner.strip and cleaner.strip_comments):
+        return None
+    if "\r" in html or "\x00" in html or html.startswith("\ufeff"):
+        # html5lib normalizes these before tokenizing
+        return None
+
+    filtered = BleachSanitizerFilter(
+        source=_tokens(html, cleaner.tags),
+        allowed_tags=cleaner.tags,
+        attributes=cleaner.attributes,
+        strip_disallowed_tags=cleaner.strip,
+        strip_html_comments=cleaner.strip_comments,
+        css_sanitizer=cleaner.css_sanitizer,
+        allowed_protocols=cleaner.protocols,
+    )
+    for filter_class in cleaner.filters:
+        filtered = filter_class(source=filtered)
+
+    try:
+        return cleaner.serializer.render(filtered)
+    except Unsupported:
+        return None
+
+
+def _tokens(html: str, allowed_tags) -> Iterator[Dict[str, Any]]:
+    """
+    Tokenize HTML into the token stream html5lib's tree walker would emit.
+
+    Disallowed tags are dropped here, as bleach's tokenizer does, so they
+    never affect tree construction.
+
+    Raises:
+        Unsupported: If html5lib would build a different tree than the
+            plain stack of open elements tracked here
+    """
+    stack: List[str] = []
+    text: List[str] = []
+    # bleach turns a stripped block tag into a newline after the first tag
+    seen_tag = False
+    # html5lib drops a newline directly after <pre>
+    after_pre = False
+
+    def flush() -> Iterator[Dict[str, Any]]:
+        if not text:
+            return
+        data = "".join(text)
+        text.clear()
+        if stack and stack[-1] in TABLE_CHILDREN:
+            if NON_SPACE_PATTERN.search(data):
+                # Text directly in a table is foster parented
+                raise Unsupported()
+        yield {"type": "Characters", "data": data}
+
+    pos = 0
+    length = len(html)
+    while pos < length:
+        lt = html.find("<", pos)
+        if lt == -1:
+            lt = length
+        if lt > pos:
+            data = html[pos:lt]
+            if after_pre and data.startswith("\n"):
+                data = data[1:]
+            after_pre = False
+            text.append(data)
+            pos = lt
+            if pos == length:
+                break
+
+        marker = html[lt + 1 : lt + 2]
+        if marker == "!":
+            match = COMMENT_PATTERN.match(html, lt)
+            if match is None or after_pre:
+                raise Unsupported()
+            body = match.group(1)
+            if body.startswith(">") or body.startswith("->") or "--!" in body:
+                raise Unsupported()
+            yield from flush()
+            yield {"type": "Comment", "data": body}
+            pos = match.end()
+            continue
+
+        if marker == "/":
+            match = END_TAG_PATTERN.match(html, lt)
+            if match is None:
+                raise Unsupported()
+            name = _tag_name(match.group(1))
+            pos = match.end()
+            seen_tag = True
+            if name not in allowed_tags:
+                if after_pre:
+                    raise Unsupported()
+                continue
+            after_pre = False
+            yield from flush()
+            yield from _end_tag(name, stack)
+            continue
+
+        if not ("a" <= marker <= "z" or "A" <= marker <= "Z"):
+            # A "<" that does not open a tag is text
+            if marker == "?":
+                raise Unsupported()
+            after_pre = False
+            text.append("<")
+            pos = lt + 1
+            continue
+
+        match = START_TAG_PATTERN.match(html, lt)
+        if match is None:
+            raise Unsupported()
+        name = _tag_name(match.group(1))
+        pos = match.end()
+        if name not in allowed_tags:
+            if after_pre:
+                raise Unsupported()
+            if seen_tag and name in HTML_TAGS_BLOCK_LEVEL:
+                text.append("\n")
+            seen_tag = True
+            continue
+        seen_tag = True
+        after_pre = False
+        closes_p = _check_start_tag(name, stack)
+        yield from flush()
+        if closes_p:
+            yield {"type": "EndTag", "name": stack.pop()}
+        attributes = _attributes(match.group(2))
+        if name in VOID_TAGS:
+            yield {"type": "EmptyTag", "name": name, "data": attributes}
+        else:
+            stack.append(name)
+            yield {"type": "StartTag", "name": name, "data": attributes}
+            # Table cells insert whitespace without html5lib's <pre> check
+            after_pre = name == "pre" and not (
+                "td" in stack or "th" in stack
+            )
+
+    yield from flush()
+    while stack:
+        yield {"type": "EndTag", "name": stack.pop()}
+
+
+def _tag_name(raw: str) -> str:
+    """Lowercase a tag name the way html5lib does (ASCII only)."""
+    if not raw.isascii():
+        raise Unsupported()
+    return raw.translate(_ASCII_LOWER)
+
+
+def _attributes(raw: str) -> Dict[Any, str]:
+    """Parse a start tag's attributes; the first of duplicates wins."""
+    attributes: Dict[Any, str] = {}
+    for match in ATTRIBUTE_PATTERN.finditer(raw):
+        name = match.group(1)
+        if not name.isascii():
+            raise Unsupported()
+        key = (None, name.translate(_ASCII_LOWER))
+        if key in attributes:
+            continue
+        value = match.group(2)
+        if value is None:
+            value = match.group(3)
+        if value is None:
+            value = match.group(4) or ""
+        attributes[key] = value
+    return attributes
+
+
+def _check_start_tag(name: str, stack: List[str]) -> bool:
+    """
+    Reject start tags html5lib would not simply push onto the stack.
+
+    Returns:
+        True if the tag first closes the <p> on top of the stack
+    """
+    if name not in SUPPORTED_TAGS:
+        raise Unsupported()
+    top = stack[-1] if stack else None
+    if top in TABLE_CHILDREN:
+        if name not in TABLE_CHILDREN[top]:
+            raise Unsupported()
+        return False
+    if name in TABLE_TAGS and name != "table":
+        raise Unsupported()
+    if name == "a" and "a" in stack:
+        raise Unsupported()
+    if name == "button" and "button" in stack:
+        raise Unsupported()
+    if name == "li":
+        for open_tag in reversed(stack):
+            if open_tag == "li":
+                raise Unsupported()
+            if open_tag in LIST_ITEM_BOUNDARIES:
+                break
+
+    closes_p = name in CLOSES_P and "p" in stack
+    if closes_p:
+        if top != "p":
+            raise Unsupported()
+        top = stack[-2] if len(stack) > 1 else None
+    if name in HEADINGS and top in HEADINGS:
+        raise Unsupported()
+    return closes_p
+
+
+def _end_tag(name: str, stack: List[str]) -> Iterator[Dict[str, Any]]:
+    """Pop the element an end tag closes, with any implied end tags."""
+    if stack and stack[-1] == name:
+        stack.pop()
+        yield {"type": "EndTag", "name": name}
+        return
+    if name == "p" and "p" not in stack:
+        if stack and stack[-1] in TABLE_CHILDREN:
+            raise Unsupported()
+        # A stray </p> becomes an empty paragraph
+        yield {"type": "StartTag", "name": "p", "data": {}}
+        yield {"type": "EndTag", "name": "p"}
+        return
+    if name not in CLOSES_IMPLIED or name not in stack:
+        raise Unsupported()
+    index = len(stack) - 1 - stack[::-1].index(name)
+    implied = stack[index + 1 :]
+    if any(tag not in IMPLIED_END_TAGS for tag in implied):
+        raise Unsupported()
+    if name == "li" and "li" in implied:
+        raise Unsupported()
+    while len(stack) > index:
+        yield {"type": "EndTag", "name": stack.pop()}
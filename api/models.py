@@ -3,10 +3,14 @@
 from django.db import (
     models,
 )
-from django_spellbook.parsers import (
-    render_spellbook_markdown_to_html,
+
+from .logic.render_pool import (
+    render_markdown,
+)
+from .logic.sanitizers import (
+    STORAGE,
+    clean_html,
 )
-import bleach  # Import bleach
 
 
 class StoredMarkdown(models.Model):
@@ -35,56 +39,14 @@ class StoredMarkdown(models.Model):
         *args,
         **kwargs,
     ):
-        markdown_allowed_tags = [
-            "p",
-            "br",
-            "strong",
-            "em",
-            "u",
-            "s",
-            "sub",
-            "sup",
-            "div",
-            "span",
-            "h1",
-            "h2",
-            "h3",
-            "h4",
-            "h5",
-            "h6",
-            "ul",
-            "ol",
-            "li",
-            "blockquote",
-            "code",
-            "pre",
-            "hr",
-            "a",
-            "img",  # Allowing links and images as raw HTML in markdown
-        ]
-        markdown_allowed_attributes = {
-            "a": [
-                "href",
-                "title",
-            ],
-            "img": [
-                "src",
-                "alt",
-                "title",
-            ],
-        }
-
         # Clean the markdown_content. This will remove any HTML tags
-        # not in markdown_allowed_tags (e.g., <script>).
-        bleached_markdown = bleach.clean(
+        # not allowed by the storage policy (e.g., <script>).
+        bleached_markdown = clean_html(
             str(self.markdown_content),
-            tags=frozenset(markdown_allowed_tags),
-            attributes=markdown_allowed_attributes,
-            strip=True,  # Remove disallowed tags and their content
-            strip_comments=True,
+            policy=STORAGE,
         )
 
-        self.html_content = render_spellbook_markdown_to_html(
+        self.html_content = render_markdown(
             markdown_string=str(bleached_markdown),  # Use the bleached version
         )
 
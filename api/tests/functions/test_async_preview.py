@@ -0,0 +1,305 @@
+# api/tests/functions/test_async_preview.py
+"""
+Tests for editor preview sessions, revision coalescing and the async
+preview renderer.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from api.logic.async_preview import render_preview_async
+from api.logic.markdown_preview import (
+    process_markdown_preview,
+    render_preview_html,
+)
+from api.logic.preview_cache import clear_preview_cache
+from api.logic.preview_sessions import (
+    PreviewSessions,
+    PreviewSuperseded,
+    check_shared_revision,
+    coalesce_revision,
+    get_preview_sessions,
+    has_shared_cache,
+    parse_session,
+    publish_revision,
+)
+
+
+class TestPreviewSessions(TestCase):
+    """Test revision tracking per editor session."""
+
+    def test_newer_revision_supersedes_older(self):
+        """Beginning a newer revision supersedes the previous ticket."""
+        sessions = PreviewSessions()
+        first = sessions.begin("s1", 1)
+        notified = []
+        first.on_superseded(lambda: notified.append(True))
+
+        second = sessions.begin("s1", 2)
+
+        self.assertTrue(first.superseded)
+        self.assertEqual(first.latest_revision, 2)
+        self.assertEqual(notified, [True])
+        self.assertFalse(second.superseded)
+        with self.assertRaises(PreviewSuperseded):
+            first.check()
+
+    def test_stale_revision_is_rejected(self):
+        """A revision older than the session's latest is refused."""
+        sessions = PreviewSessions()
+        sessions.begin("s1", 5)
+
+        with self.assertRaises(PreviewSuperseded) as raised:
+            sessions.begin("s1", 4)
+        self.assertEqual(raised.exception.revision, 5)
+
+    def test_sessions_are_independent(self):
+        """Revisions only compete within their own session."""
+        sessions = PreviewSessions()
+        first = sessions.begin("s1", 1)
+        sessions.begin("s2", 7)
+
+        self.assertFalse(first.superseded)
+
+    def test_callback_after_supersede_runs_immediately(self):
+        """Registering on an already superseded ticket calls back at once."""
+        sessions = PreviewSessions()
+        first = sessions.begin("s1", 1)
+        sessions.begin("s1", 2)
+        notified = []
+
+        first.on_superseded(lambda: notified.append(True))
+
+        self.assertEqual(notified, [True])
+
+    def test_sessions_are_bounded(self):
+        """The least recently used session is evicted past the limit."""
+        sessions = PreviewSessions(limit=2)
+        sessions.begin("a", 1)
+        sessions.begin("b", 1)
+        sessions.begin("c", 1)
+
+        self.assertIsNone(sessions.latest_revision("a"))
+        self.assertEqual(sessions.latest_revision("c"), 1)
+
+    def test_parse_session(self):
+        """Session fields are optional but validated when present."""
+        self.assertIsNone(parse_session(None, None))
+        self.assertIsNone(parse_session("", 3))
+        self.assertEqual(parse_session("abc", 3), ("abc", 3))
+        self.assertEqual(parse_session("abc", "4"), ("abc", 4))
+        for session_id, revision in (
+            ("abc", None),
+            ("abc", "x"),
+            ("abc", True),
+            (12, 1),
+            ("x" * 65, 1),
+            ("has space", 1),
+        ):
+            with self.subTest(session_id=session_id, revision=revision):
+                with self.assertRaises(ValueError):
+                    parse_session(session_id, revision)
+
+
+@override_settings(MARKDOWN_PREVIEW_COALESCE_WINDOW=0)
+class TestRevisionCoalescing(TestCase):
+    """Test coalescing preview requests across threads and workers."""
+
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+        get_preview_sessions().clear()
+
+    def test_newer_revision_from_another_worker(self):
+        """A revision published by another worker supersedes this one."""
+        ticket = coalesce_revision("s1", 1)
+        # Another worker's request for the same session
+        publish_revision("s1", 2)
+
+        with self.assertRaises(PreviewSuperseded):
+            check_shared_revision(ticket)
+        with self.assertRaises(PreviewSuperseded):
+            coalesce_revision("s1", 1)
+
+    def test_concurrent_publishes_keep_the_newest_revision(self):
+        """Racing workers never move the shared revision backwards."""
+        revisions = list(range(1, 41))
+        random.shuffle(revisions)
+
+        def publish(revision):
+            try:
+                publish_revision("s1", revision)
+            except PreviewSuperseded:
+                pass
+
+        threads = [
+            threading.Thread(target=publish, args=(revision,))
+            for revision in revisions
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        with self.assertRaises(PreviewSuperseded) as raised:
+            publish_revision("s1", 39)
+        self.assertEqual(raised.exception.revision, 40)
+
+    @override_settings(
+        MARKDOWN_PREVIEW_COALESCE_WINDOW=5,
+        MARKDOWN_PREVIEW_SHARED_CACHE=False,
+    )
+    def test_window_is_skipped_without_shared_cache(self):
+        """A sync worker with a per-process cache does not wait."""
+        with patch(
+            "api.logic.preview_sessions.PreviewTicket.wait"
+        ) as mock_wait:
+            ticket = coalesce_revision("s1", 1)
+
+        mock_wait.assert_not_called()
+        self.assertFalse(ticket.superseded)
+
+    def test_has_shared_cache(self):
+        """Shared caches are guessed from the backend unless configured."""
+        for backend, shared in (
+            ("django.core.cache.backends.locmem.LocMemCache", False),
+            ("django.core.cache.backends.dummy.DummyCache", False),
+            ("django.core.cache.backends.redis.RedisCache", True),
+        ):
+            with self.subTest(backend=backend), override_settings(
+                CACHES={"default": {"BACKEND": backend}}
+            ):
+                self.assertEqual(has_shared_cache(), shared)
+        with override_settings(MARKDOWN_PREVIEW_SHARED_CACHE=True):
+            self.assertTrue(has_shared_cache())
+
+    @override_settings(
+        MARKDOWN_PREVIEW_COALESCE_WINDOW=5,
+        MARKDOWN_PREVIEW_SHARED_CACHE=True,
+    )
+    def test_burst_is_rendered_once(self):
+        """Only the last request of a burst renders; the rest are 409."""
+        responses = {}
+
+        def send(revision):
+            responses[revision] = process_markdown_preview(
+                f"# Revision {revision}",
+                session_id="s1",
+                revision=revision,
+            )
+
+        with patch(
+            "api.logic.markdown_preview.render_markdown_to_html",
+            side_effect=lambda markdown: f"<h1>{markdown}</h1>",
+        ) as mock_render:
+            threads = []
+            for revision in (1, 2, 3):
+                thread = threading.Thread(target=send, args=(revision,))
+                thread.start()
+                threads.append(thread)
+                while (
+                    get_preview_sessions().latest_revision("s1") != revision
+                ):
+                    time.sleep(0.001)
+            # The burst ends; its last request skips the window here
+            with override_settings(MARKDOWN_PREVIEW_COALESCE_WINDOW=0):
+                send(4)
+            for thread in threads:
+                thread.join(10)
+
+        mock_render.assert_called_once_with("# Revision 4")
+        self.assertEqual(responses[4].status_code, 200)
+        for revision in (1, 2, 3):
+            self.assertEqual(responses[revision].status_code, 409)
+            self.assertEqual(
+                json.loads(responses[revision].content)["revision"],
+                revision + 1,
+            )
+
+    def test_latest_revision_renders(self):
+        """Without competition the request renders normally."""
+        response = process_markdown_preview(
+            "# Hello", session_id="s1", revision=1
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Hello", response.content.decode())
+
+
+class TestRenderPreviewAsync(TestCase):
+    """Test rendering previews on the executor."""
+
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+        get_preview_sessions().clear()
+
+    def test_renders_without_session(self):
+        """Without a session the preview is simply rendered."""
+        html = asyncio.run(render_preview_async("# Hello"))
+
+        self.assertEqual(html, render_preview_html("# Hello"))
+
+    def test_ticket_stops_render_before_sanitizing(self):
+        """A superseded ticket stops render_preview_html at a checkpoint."""
+        ticket = PreviewSessions().begin("s1", 1)
+        ticket.supersede(2)
+
+        with patch(
+            "api.logic.markdown_preview.render_markdown_to_html"
+        ) as mock_render:
+            with self.assertRaises(PreviewSuperseded):
+                render_preview_html("# Stale", ticket=ticket)
+        mock_render.assert_not_called()
+
+    def test_newer_revision_cancels_waiting_request(self):
+        """An in-flight request answers as superseded once a newer arrives."""
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow_render(raw_markdown, **kwargs):
+            started.set()
+            release.wait(5)
+            return f"<p>{raw_markdown}</p>"
+
+        async def scenario():
+            old = asyncio.ensure_future(
+                render_preview_async("old", session_id="s1", revision=1)
+            )
+            await asyncio.get_running_loop().run_in_executor(
+                None, started.wait, 5
+            )
+            new = asyncio.ensure_future(
+                render_preview_async("new", session_id="s1", revision=2)
+            )
+            with self.assertRaises(PreviewSuperseded) as raised:
+                await old
+            self.assertEqual(raised.exception.revision, 2)
+            release.set()
+            return await new
+
+        with patch(
+            "api.logic.async_preview.render_preview_html",
+            side_effect=slow_render,
+        ):
+            self.assertEqual(asyncio.run(scenario()), "<p>new</p>")
+
+    def test_stale_request_is_refused(self):
+        """A request older than the session's latest revision never renders."""
+        get_preview_sessions().begin("s1", 3)
+
+        with patch(
+            "api.logic.async_preview.render_preview_html"
+        ) as mock_render:
+            with self.assertRaises(PreviewSuperseded):
+                asyncio.run(
+                    render_preview_async("old", session_id="s1", revision=2)
+                )
+        mock_render.assert_not_called()
@@ -5,6 +5,7 @@ Tests for markdown p"review helper functions.
 
 from unittest.mock import patch
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.http import HttpResponse
 
@@ -17,12 +18,13 @@ from api.logic.markdown_preview import (
     _get_allowed_attributes,
     _get_allowed_protocols,
 )
+from api.logic.preview_cache import clear_preview_cache
 
 
 class TestRenderMarkdownToHtml(TestCase):
     """Test the render_markdown_to_html function."""
 
-    @patch("api.logic.markdown_preview.render_spellbook_markdown_to_html")
+    @patch("api.logic.markdown_preview.render_markdown")
     def test_render_markdown_success(self, mock_render):
         """Test successful markdown rendering."""
         mock_render.return_value = "<p>Hello World</p>"
@@ -42,7 +44,7 @@ class TestRenderMarkdownToHtml(TestCase):
         result = render_markdown_to_html(None)
         self.assertEqual(result, "")
 
-    @patch("api.logic.markdown_preview.render_spellbook_markdown_to_html")
+    @patch("api.logic.markdown_preview.render_markdown")
     @patch("api.logic.markdown_preview.logger")
     def test_render_markdown_exception_fallback(
         self, mock_logger, mock_render
@@ -112,7 +114,7 @@ class TestSanitizeHtmlContent(TestCase):
         result = sanitize_html_content(None)
         self.assertEqual(result, "")
 
-    @patch("api.logic.markdown_preview.bleach.clean")
+    @patch("api.logic.markdown_preview.clean_html")
     @patch("api.logic.markdown_preview.logger")
     def test_sanitize_html_exception_fallback(self, mock_logger, mock_clean):
         """Test fallback behavior when sanitization fails."""
@@ -128,6 +130,10 @@ class TestSanitizeHtmlContent(TestCase):
 class TestProcessMarkdownPreview(TestCase):
     """Test the process_markdown_preview function."""
 
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+
     @patch("api.logic.markdown_preview.render_markdown_to_html")
     @patch("api.logic.markdown_preview.sanitize_html_content")
     def test_process_markdown_success_with_sanitization(
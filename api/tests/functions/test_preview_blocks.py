@@ -0,0 +1,135 @@
+# api/tests/functions/test_preview_blocks.py
+"""
+Tests for block-level preview rendering.
+"""
+
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.logic.preview_blocks import (
+    block_ids,
+    render_preview_blocks,
+    split_blocks,
+)
+from api.logic.preview_cache import clear_preview_cache
+
+
+class TestSplitBlocks(TestCase):
+    """Test the split_blocks function."""
+
+    def test_paragraphs_and_headings(self):
+        """Blank lines separate top-level blocks."""
+        blocks = split_blocks("# Title\n\nFirst paragraph\nstill first\n\nSecond")
+
+        self.assertEqual(
+            blocks, ["# Title", "First paragraph\nstill first", "Second"]
+        )
+
+    def test_empty_input(self):
+        """Empty or blank markdown has no blocks."""
+        self.assertEqual(split_blocks(""), [])
+        self.assertEqual(split_blocks("\n \n"), [])
+
+    def test_fenced_code_keeps_blank_lines(self):
+        """Blank lines inside a code fence do not split it."""
+        markdown = "Intro\n\n```python\na = 1\n\nb = 2\n```\n\nOutro"
+
+        self.assertEqual(
+            split_blocks(markdown),
+            ["Intro", "```python\na = 1\n\nb = 2\n```", "Outro"],
+        )
+
+    def test_spellblocks_are_one_block(self):
+        """A SpellBlock, including nested ones, stays in one block."""
+        markdown = (
+            '{~ card title="Outer" ~}\n\nText\n\n'
+            '{~ alert type="info" ~}\n\nInner\n\n{~~}\n\nMore\n\n{~~}\n\n'
+            "After"
+        )
+
+        blocks = split_blocks(markdown)
+
+        self.assertEqual(len(blocks), 2)
+        self.assertTrue(blocks[0].endswith("More\n\n{~~}"))
+        self.assertEqual(blocks[1], "After")
+
+    def test_self_closing_spellblock(self):
+        """Self-closing SpellBlocks do not open a nesting level."""
+        blocks = split_blocks('{~ hero title="Hi" /~}\n\nNext')
+
+        self.assertEqual(blocks, ['{~ hero title="Hi" /~}', "Next"])
+
+    def test_loose_lists_stay_together(self):
+        """List items separated by blank lines form one block."""
+        markdown = "1. One\n\n2. Two\n\n    continued\n\nAfter"
+
+        self.assertEqual(
+            split_blocks(markdown),
+            ["1. One\n\n2. Two\n\n    continued", "After"],
+        )
+
+    def test_reference_links_render_whole_document(self):
+        """Documents with reference definitions are a single block."""
+        markdown = "See [docs][1]\n\nMore\n\n[1]: https://example.com"
+
+        self.assertEqual(split_blocks(markdown), [markdown])
+
+
+class TestBlockIds(TestCase):
+    """Test the block_ids function."""
+
+    def test_ids_are_stable_and_unique(self):
+        """Unchanged blocks keep their IDs; duplicates get a suffix."""
+        ids = block_ids(["a", "b", "a"])
+
+        self.assertEqual(ids[0], block_ids(["a"])[0])
+        self.assertEqual(ids[2], f"{ids[0]}-2")
+        self.assertEqual(len(set(ids)), 3)
+
+
+class TestRenderPreviewBlocks(TestCase):
+    """Test the render_preview_blocks function."""
+
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+
+    def test_renders_every_block(self):
+        """Without known blocks, every block's HTML is returned."""
+        result = render_preview_blocks("# Title\n\nHello **world**")
+
+        self.assertEqual(len(result["order"]), 2)
+        self.assertEqual(set(result["blocks"]), set(result["order"]))
+        html = "".join(result["blocks"][i] for i in result["order"])
+        self.assertIn("<h1", html)
+        self.assertIn("<strong>world</strong>", html)
+
+    def test_known_blocks_are_skipped(self):
+        """Only blocks the client does not have are returned."""
+        first = render_preview_blocks("# Title\n\nHello")
+
+        second = render_preview_blocks(
+            "# Title\n\nHello there", known_ids=first["order"]
+        )
+
+        self.assertEqual(second["order"][0], first["order"][0])
+        self.assertEqual(list(second["blocks"]), [second["order"][1]])
+
+    @patch("api.logic.markdown_preview.render_markdown_to_html")
+    def test_unchanged_blocks_are_not_rerendered(self, mock_render):
+        """Blocks are cached by content, so edits re-render one block."""
+        mock_render.side_effect = lambda block: f"<p>{block}</p>"
+
+        render_preview_blocks("One\n\nTwo\n\nThree")
+        render_preview_blocks("One\n\nTwo changed\n\nThree")
+
+        self.assertEqual(mock_render.call_count, 4)
+
+    def test_block_html_is_sanitized(self):
+        """Each block goes through sanitization."""
+        result = render_preview_blocks("Hi\n\n<script>alert(1)</script>")
+
+        html = "".join(result["blocks"].values())
+        self.assertNotIn("<script", html)
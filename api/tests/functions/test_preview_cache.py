@@ -0,0 +1,174 @@
+# api/tests/functions/test_preview_cache.py
+"""
+Tests for the markdown preview render cache.
+"""
+
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from api.logic.markdown_preview import process_markdown_preview
+from api.logic.preview_cache import (
+    MODE_RAW,
+    MODE_STANDARD,
+    MODE_STRICT,
+    clear_preview_cache,
+    get_cached_preview,
+    preview_cache_key,
+    preview_mode,
+    store_preview,
+)
+
+
+class TestPreviewCacheHelpers(TestCase):
+    """Test the cache key and storage helpers."""
+
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+
+    def test_preview_mode(self):
+        """Each sanitization setting maps to its own mode."""
+        self.assertEqual(preview_mode(False, False), MODE_RAW)
+        self.assertEqual(preview_mode(False, True), MODE_RAW)
+        self.assertEqual(preview_mode(True, False), MODE_STANDARD)
+        self.assertEqual(preview_mode(True, True), MODE_STRICT)
+
+    def test_key_depends_on_content_and_mode(self):
+        """Keys differ by markdown and mode, and are stable otherwise."""
+        key = preview_cache_key("# Hi", MODE_STANDARD)
+
+        self.assertEqual(key, preview_cache_key("# Hi", MODE_STANDARD))
+        self.assertNotEqual(key, preview_cache_key("# Hi", MODE_STRICT))
+        self.assertNotEqual(key, preview_cache_key("# Ho", MODE_STANDARD))
+
+    def test_store_and_get(self):
+        """Stored previews come back from the local LRU."""
+        self.assertIsNone(get_cached_preview("# Hi", MODE_STANDARD))
+
+        store_preview("# Hi", MODE_STANDARD, "<h1>Hi</h1>")
+
+        self.assertEqual(get_cached_preview("# Hi", MODE_STANDARD), "<h1>Hi</h1>")
+        self.assertIsNone(get_cached_preview("# Hi", MODE_STRICT))
+
+    @override_settings(MARKDOWN_PREVIEW_SHARED_CACHE=True)
+    def test_shared_cache_fills_other_processes(self):
+        """A preview stored by another worker is found in the shared cache."""
+        store_preview("# Hi", MODE_STANDARD, "<h1>Hi</h1>")
+        clear_preview_cache()
+
+        self.assertEqual(get_cached_preview("# Hi", MODE_STANDARD), "<h1>Hi</h1>")
+
+    @override_settings(MARKDOWN_PREVIEW_SHARED_CACHE=False)
+    def test_local_cache_is_not_written(self):
+        """A per-process cache would only hold a second copy of the LRU."""
+        store_preview("# Hi", MODE_STANDARD, "<h1>Hi</h1>")
+
+        self.assertIsNone(cache.get(preview_cache_key("# Hi", MODE_STANDARD)))
+        self.assertEqual(get_cached_preview("# Hi", MODE_STANDARD), "<h1>Hi</h1>")
+
+    @override_settings(MARKDOWN_PREVIEW_SHARED_CACHE=True)
+    def test_cache_outage_is_a_miss(self):
+        """A failing cache backend does not fail the preview."""
+        with patch("api.logic.preview_cache.cache") as mock_cache:
+            mock_cache.get.side_effect = ConnectionError("cache down")
+            mock_cache.set.side_effect = ConnectionError("cache down")
+            self.assertIsNone(get_cached_preview("# Hi", MODE_STANDARD))
+            store_preview("# Hi", MODE_STANDARD, "<h1>Hi</h1>")
+
+        self.assertEqual(get_cached_preview("# Hi", MODE_STANDARD), "<h1>Hi</h1>")
+
+    @override_settings(MARKDOWN_PREVIEW_CACHE_MAX_SIZE=4)
+    def test_large_previews_are_not_cached(self):
+        """Previews above the size cap are skipped by both layers."""
+        store_preview("# Hi", MODE_STANDARD, "<h1>Hi</h1>")
+
+        self.assertIsNone(get_cached_preview("# Hi", MODE_STANDARD))
+
+    @override_settings(MARKDOWN_PREVIEW_LRU_SIZE=2)
+    def test_lru_is_bounded(self):
+        """The oldest local entry is evicted once the LRU is full."""
+        with patch("api.logic.preview_cache.cache") as mock_cache:
+            mock_cache.get.return_value = None
+            store_preview("one", MODE_STANDARD, "1")
+            store_preview("two", MODE_STANDARD, "2")
+            get_cached_preview("one", MODE_STANDARD)
+            store_preview("three", MODE_STANDARD, "3")
+
+            self.assertEqual(get_cached_preview("one", MODE_STANDARD), "1")
+            self.assertIsNone(get_cached_preview("two", MODE_STANDARD))
+            self.assertEqual(get_cached_preview("three", MODE_STANDARD), "3")
+
+    @override_settings(MARKDOWN_PREVIEW_LRU_MAX_CHARS=10)
+    def test_lru_is_bounded_by_size(self):
+        """Entries are evicted once the LRU holds too much HTML."""
+        with patch("api.logic.preview_cache.cache") as mock_cache:
+            mock_cache.get.return_value = None
+            store_preview("one", MODE_STANDARD, "1" * 4)
+            store_preview("two", MODE_STANDARD, "2" * 4)
+            store_preview("three", MODE_STANDARD, "3" * 4)
+
+            self.assertIsNone(get_cached_preview("one", MODE_STANDARD))
+            self.assertEqual(get_cached_preview("two", MODE_STANDARD), "2" * 4)
+            self.assertEqual(get_cached_preview("three", MODE_STANDARD), "3" * 4)
+
+
+class TestProcessMarkdownPreviewCaching(TestCase):
+    """Test that process_markdown_preview reuses cached previews."""
+
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+
+    @patch("api.logic.markdown_preview.sanitize_html_content")
+    @patch("api.logic.markdown_preview.render_markdown_to_html")
+    def test_repeat_preview_skips_render_and_sanitize(
+        self, mock_render, mock_sanitize
+    ):
+        """The second identical preview is served from the cache."""
+        mock_render.return_value = "<p>Hello</p>"
+        mock_sanitize.return_value = "<p>Hello</p>"
+
+        first = process_markdown_preview("Hello")
+        second = process_markdown_preview("Hello")
+
+        self.assertEqual(first.content, second.content)
+        mock_render.assert_called_once_with("Hello")
+        mock_sanitize.assert_called_once()
+
+    @patch("api.logic.markdown_preview.render_markdown_to_html")
+    def test_modes_are_cached_separately(self, mock_render):
+        """Strict and standard previews of the same text are distinct."""
+        mock_render.return_value = "<div><p>Hello</p></div>"
+
+        standard = process_markdown_preview("Hello")
+        strict = process_markdown_preview("Hello", strict_mode=True)
+
+        self.assertIn("<div", standard.content.decode())
+        self.assertNotIn("<div", strict.content.decode())
+        self.assertEqual(mock_render.call_count, 2)
+
+    @patch("api.logic.markdown_preview.render_markdown_to_html")
+    def test_errors_are_not_cached(self, mock_render):
+        """A failed preview is retried on the next request."""
+        mock_render.side_effect = [Exception("boom"), "<p>Hello</p>"]
+
+        failed = process_markdown_preview("Hello")
+        retried = process_markdown_preview("Hello")
+
+        self.assertEqual(failed.status_code, 500)
+        self.assertEqual(retried.status_code, 200)
+        self.assertEqual(retried.content.decode(), "<p>Hello</p>")
+
+    @patch("api.logic.markdown_preview.render_markdown")
+    def test_fallback_render_is_not_cached(self, mock_render):
+        """The escaped fallback of a failed render is not cached."""
+        mock_render.side_effect = [Exception("boom"), "<p>Hello</p>"]
+
+        failed = process_markdown_preview("Hello")
+        retried = process_markdown_preview("Hello")
+
+        self.assertIn("<pre><code>Hello</code></pre>", failed.content.decode())
+        self.assertEqual(retried.content.decode(), "<p>Hello</p>")
+        self.assertEqual(mock_render.call_count, 2)
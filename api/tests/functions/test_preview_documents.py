@@ -0,0 +1,181 @@
+# api/tests/functions/test_preview_documents.py
+"""
+Tests for diff-based preview uploads.
+"""
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from api.logic.preview_documents import (
+    DocumentMismatch,
+    PreviewDocuments,
+    apply_patch,
+    document_hash,
+    get_preview_documents,
+    patches_enabled,
+    resolve_markdown,
+)
+
+
+class TestApplyPatch(TestCase):
+    """Test applying splices to a document."""
+
+    def test_splices(self):
+        """Insertions, deletions and replacements apply in order."""
+        self.assertEqual(apply_patch("abc", [[2, 2, "X"]]), "abXc")
+        self.assertEqual(apply_patch("hello world", [[5, 11, ""]]), "hello")
+        self.assertEqual(apply_patch("", [[0, 0, "hi"]]), "hi")
+        self.assertEqual(
+            apply_patch("one two three", [[0, 3, "1"], [8, 13, "3"]]),
+            "1 two 3",
+        )
+        self.assertEqual(apply_patch("same", []), "same")
+
+    def test_offsets_are_utf16_code_units(self):
+        """Offsets match JavaScript string indices, even inside emoji."""
+        self.assertEqual(apply_patch("😀x", [[2, 3, "y"]]), "😀y")
+        # Only the low surrogate differs between these two emoji
+        self.assertEqual(apply_patch("a😀b", [[2, 3, "\ude01"]]), "a😁b")
+
+    def test_splitting_a_surrogate_pair_is_a_mismatch(self):
+        """Half an emoji left behind means the bases differ."""
+        for patch in ([[2, 3, "x"]], [[1, 2, ""]], [[2, 2, "y"]]):
+            with self.subTest(patch=patch):
+                with self.assertRaises(DocumentMismatch):
+                    apply_patch("a😀b", patch)
+
+    def test_malformed_patches(self):
+        """Bad shapes, overlaps and out-of-range offsets are rejected."""
+        for patch in (
+            "0,0,x",
+            [[0, 0]],
+            [["0", 0, "x"]],
+            [[0, 0, 1]],
+            [[True, 1, "x"]],
+            [[2, 1, "x"]],
+            [[0, 99, "x"]],
+            [[2, 3, "x"], [0, 1, "y"]],
+        ):
+            with self.subTest(patch=patch):
+                with self.assertRaises(ValueError):
+                    apply_patch("abc", patch)
+
+
+@override_settings(MARKDOWN_PREVIEW_PATCHES=True)
+class TestResolveMarkdown(TestCase):
+    """Test turning full and patched requests into markdown."""
+
+    def setUp(self):
+        cache.clear()
+        get_preview_documents().clear()
+
+    def upload(self, markdown):
+        return resolve_markdown({"markdown": markdown}, "s1")
+
+    def test_full_upload_becomes_the_base(self):
+        """A full upload is returned and stored for the session."""
+        self.assertEqual(self.upload("# Hello"), "# Hello")
+
+        self.assertEqual(
+            get_preview_documents().get("s1"),
+            (document_hash("# Hello"), "# Hello"),
+        )
+
+    def test_patch_applies_to_the_base(self):
+        """A patch against the stored base yields the new document."""
+        self.upload("# Hello")
+
+        markdown = resolve_markdown(
+            {
+                "base": document_hash("# Hello"),
+                "patch": [[7, 7, " world"]],
+                "hash": document_hash("# Hello world"),
+            },
+            "s1",
+        )
+
+        self.assertEqual(markdown, "# Hello world")
+        self.assertEqual(
+            get_preview_documents().get("s1")[0],
+            document_hash("# Hello world"),
+        )
+
+    def test_mismatches_require_a_full_upload(self):
+        """Unknown bases and wrong result hashes raise DocumentMismatch."""
+        with self.assertRaises(DocumentMismatch):
+            resolve_markdown(
+                {"base": document_hash("x"), "patch": []}, "s1"
+            )
+
+        self.upload("# Hello")
+        with self.assertRaises(DocumentMismatch):
+            resolve_markdown(
+                {"base": document_hash("# Other"), "patch": []}, "s1"
+            )
+        with self.assertRaises(DocumentMismatch):
+            resolve_markdown(
+                {
+                    "base": document_hash("# Hello"),
+                    "patch": [[0, 0, "!"]],
+                    "hash": document_hash("# Hello"),
+                },
+                "s1",
+            )
+
+    def test_patches_need_a_shared_cache(self):
+        """Without a shared cache patches are refused and no base is kept."""
+        with override_settings(
+            MARKDOWN_PREVIEW_PATCHES=None,
+            MARKDOWN_PREVIEW_SHARED_CACHE=False,
+        ):
+            self.assertFalse(patches_enabled())
+            self.assertEqual(self.upload("# Hello"), "# Hello")
+            with self.assertRaises(DocumentMismatch):
+                resolve_markdown(
+                    {"base": document_hash("# Hello"), "patch": []}, "s1"
+                )
+
+        self.assertIsNone(get_preview_documents().get("s1"))
+        with override_settings(
+            MARKDOWN_PREVIEW_PATCHES=None,
+            MARKDOWN_PREVIEW_SHARED_CACHE=True,
+        ):
+            self.assertTrue(patches_enabled())
+
+    def test_patch_requires_session(self):
+        """Without a session there is no base to patch."""
+        with self.assertRaises(ValueError):
+            resolve_markdown({"base": "x", "patch": []})
+
+    def test_shared_cache_serves_other_workers(self):
+        """A base uploaded to another worker is found in the shared cache."""
+        self.upload("# Hello")
+        get_preview_documents().clear()
+
+        markdown = resolve_markdown(
+            {"base": document_hash("# Hello"), "patch": [[7, 7, "!"]]},
+            "s1",
+        )
+
+        self.assertEqual(markdown, "# Hello!")
+
+    @override_settings(MAX_API_REQUEST_SIZE=10)
+    def test_patched_document_size_is_limited(self):
+        """Patches cannot grow a document past MAX_API_REQUEST_SIZE."""
+        self.upload("# Hello")
+
+        with self.assertRaises(ValueError):
+            resolve_markdown(
+                {"base": document_hash("# Hello"), "patch": [[7, 7, "!!!!"]]},
+                "s1",
+            )
+
+    def test_documents_are_bounded(self):
+        """The least recently used session's document is evicted locally."""
+        documents = PreviewDocuments(limit=1)
+        documents.put("a", "first")
+        documents.put("b", "second")
+        cache.clear()
+
+        self.assertIsNone(documents.get("a"))
+        self.assertEqual(documents.get("b")[1], "second")
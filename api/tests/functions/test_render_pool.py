@@ -0,0 +1,165 @@
+# api/tests/functions/test_render_pool.py
+"""
+Tests for the markdown render process pool.
+"""
+
+import multiprocessing
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+from django_spellbook.parsers import render_spellbook_markdown_to_html
+
+from api.logic import render_pool
+from api.logic.render_pool import (
+    RenderPool,
+    RenderTimeout,
+    get_render_pool,
+    get_render_pool_stats,
+    render_markdown,
+    reset_render_pool,
+)
+
+LARGE_MARKDOWN = "# Title\n\n" + "Some **bold** text.\n\n" * 300
+
+
+def hanging_pool():
+    """A stand-in pool whose tasks never finish."""
+    pool = MagicMock()
+    pool.apply_async.return_value.get.side_effect = (
+        multiprocessing.TimeoutError
+    )
+    return pool
+
+
+class TestRenderPoolRouting(TestCase):
+    """Test which renders go to the pool."""
+
+    def test_disabled_pool_renders_inline(self):
+        """With no workers every document renders on the calling thread."""
+        pool = RenderPool(workers=0)
+        with patch.object(pool, "_ensure_pool") as ensure:
+            html = pool.render(LARGE_MARKDOWN)
+
+        ensure.assert_not_called()
+        self.assertEqual(html, render_spellbook_markdown_to_html(LARGE_MARKDOWN))
+        self.assertEqual(pool.get_stats()["inline"], 1)
+
+    def test_small_documents_render_inline(self):
+        """Documents under min_size skip the pool."""
+        pool = RenderPool(workers=2, min_size=1024)
+        with patch.object(pool, "_ensure_pool") as ensure:
+            html = pool.render("# Small")
+
+        ensure.assert_not_called()
+        self.assertIn("Small", html)
+
+    def test_large_documents_use_the_pool(self):
+        """Documents at or above min_size are rendered by a worker."""
+        pool = RenderPool(workers=2, min_size=1024, start_method="fork")
+        try:
+            html = pool.render(LARGE_MARKDOWN)
+            stats = pool.get_stats()
+        finally:
+            pool.stop()
+
+        self.assertEqual(html, render_spellbook_markdown_to_html(LARGE_MARKDOWN))
+        self.assertEqual(stats["submitted"], 1)
+        self.assertEqual(stats["completed"], 1)
+        self.assertEqual(stats["inline"], 0)
+        self.assertTrue(stats["running"])
+        self.assertEqual(stats["busy"], 0)
+        self.assertGreater(stats["max_task_ms"], 0)
+        self.assertFalse(pool.get_stats()["running"])
+
+
+class TestRenderPoolTimeouts(TestCase):
+    """Test the per-task timeout."""
+
+    def test_timeout_restarts_the_pool(self):
+        """A stuck task raises RenderTimeout and the pool is replaced."""
+        pool = RenderPool(workers=1, min_size=0, timeout=0.1)
+        stuck = hanging_pool()
+        with patch.object(pool, "_ensure_pool", return_value=stuck):
+            pool._pool = stuck
+            pool._pool_pid = render_pool.os.getpid()
+            with self.assertRaises(RenderTimeout):
+                pool.render("# Slow")
+
+        stuck.terminate.assert_called_once()
+        self.assertIsNone(pool._pool)
+        stats = pool.get_stats()
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["restarts"], 1)
+        self.assertEqual(stats["busy"], 0)
+
+    def test_task_lost_to_another_restart_is_resubmitted(self):
+        """Only the stuck render fails; others move to the new pool."""
+        pool = RenderPool(workers=1, min_size=0, timeout=5)
+        lost = hanging_pool()
+        fresh = MagicMock()
+        fresh.apply_async.return_value.get.return_value = "<p>Done</p>"
+        # Another render timed out and replaced the pool meanwhile
+        pool._pool = fresh
+        pool._pool_pid = render_pool.os.getpid()
+        with patch.object(pool, "_ensure_pool", side_effect=[lost, fresh]):
+            html = pool.render("# Waiting")
+
+        self.assertEqual(html, "<p>Done</p>")
+        lost.terminate.assert_not_called()
+        stats = pool.get_stats()
+        self.assertEqual(stats["resubmitted"], 1)
+        self.assertEqual(stats["completed"], 1)
+        self.assertEqual(stats["timeouts"], 0)
+
+    def test_worker_errors_propagate(self):
+        """Renderer exceptions are re-raised and counted as failures."""
+        pool = RenderPool(workers=1, min_size=0)
+        broken = MagicMock()
+        broken.apply_async.return_value.get.side_effect = ValueError("bad")
+        with patch.object(pool, "_ensure_pool", return_value=broken):
+            with self.assertRaises(ValueError):
+                pool.render("# Broken")
+
+        self.assertEqual(pool.get_stats()["failed"], 1)
+
+
+class TestRenderPoolModule(TestCase):
+    """Test the process-wide pool helpers."""
+
+    def setUp(self):
+        reset_render_pool()
+
+    def tearDown(self):
+        reset_render_pool()
+
+    @override_settings(
+        MARKDOWN_RENDER_POOL_WORKERS=3,
+        MARKDOWN_RENDER_POOL_MIN_SIZE=10,
+        MARKDOWN_RENDER_POOL_TIMEOUT=5,
+    )
+    def test_pool_is_built_from_settings(self):
+        """get_render_pool reads the MARKDOWN_RENDER_POOL_* settings."""
+        pool = get_render_pool()
+
+        self.assertIs(pool, get_render_pool())
+        self.assertEqual(pool.workers, 3)
+        self.assertEqual(pool.min_size, 10)
+        self.assertEqual(pool.timeout, 5)
+
+    @override_settings(MARKDOWN_RENDER_POOL_WORKERS=0)
+    def test_render_markdown_and_stats(self):
+        """render_markdown goes through the shared pool and is counted."""
+        self.assertIn("Hello", render_markdown("# Hello"))
+
+        stats = get_render_pool_stats()
+        self.assertEqual(stats["inline"], 1)
+        self.assertFalse(stats["enabled"])
+
+    def test_reset_stops_the_pool(self):
+        """reset_render_pool stops the current pool and forgets it."""
+        pool = get_render_pool()
+        with patch.object(pool, "stop") as stop:
+            reset_render_pool()
+
+        stop.assert_called_once()
+        self.assertIsNot(get_render_pool(), pool)
@@ -0,0 +1,61 @@
+# api/tests/functions/test_sanitizers.py
+"""
+Tests for the pre-built sanitizer policies.
+"""
+
+import threading
+
+import bleach
+from django.test import TestCase
+
+from api.logic.sanitizers import (
+    POLICIES,
+    STANDARD,
+    STORAGE,
+    STRICT,
+    clean_html,
+    get_cleaner,
+)
+
+SAMPLE_HTML = (
+    '<div class="card" data-x="1" onclick="evil()">'
+    "<h2 id='t'>Title</h2><script>alert(1)</script>"
+    '<p>Text <a href="javascript:alert(1)">bad</a> '
+    '<a href="tel:123" target="_blank">ok</a></p>'
+    "<!-- note --><s>old</s><button onclick='x()'>Go</button>"
+    '<img src="a.png" alt="A" onerror="x()"></div>'
+)
+
+
+class TestSanitizerPolicies(TestCase):
+    """Test the pre-built Cleaners."""
+
+    def test_matches_bleach_clean_for_every_policy(self):
+        """Each Cleaner behaves exactly like bleach.clean with its policy."""
+        for policy in (STANDARD, STRICT, STORAGE):
+            with self.subTest(policy=policy):
+                self.assertEqual(
+                    clean_html(SAMPLE_HTML, policy=policy),
+                    bleach.clean(SAMPLE_HTML, **POLICIES[policy]),
+                )
+
+    def test_cleaner_is_reused_within_a_thread(self):
+        """The same Cleaner instance is returned on every call."""
+        self.assertIs(get_cleaner(STANDARD), get_cleaner(STANDARD))
+        self.assertIsNot(get_cleaner(STANDARD), get_cleaner(STRICT))
+
+    def test_threads_get_their_own_cleaner(self):
+        """Cleaners hold parser state, so threads do not share them."""
+        other = []
+        thread = threading.Thread(
+            target=lambda: other.append(get_cleaner(STANDARD))
+        )
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(other[0], get_cleaner(STANDARD))
+
+    def test_unknown_policy(self):
+        """Unknown policies raise KeyError."""
+        with self.assertRaises(KeyError):
+            clean_html("<p>x</p>", policy="nope")
@@ -2,14 +2,18 @@
 Tests for spellblock registry helper functions.
 """
 
+import json
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 from django.test import TestCase
+from django.urls import reverse
 
 from api.logic.spellblock_registry import (
     extract_default_parameters,
     extract_kwargs_parameters,
     build_spellblock_registry,
+    clear_spellblock_registry_cache,
+    get_spellblock_registry_payload,
     _get_block_description,
     _infer_parameter_type,
 )
@@ -258,6 +262,72 @@ class TestBuildSpellblockRegistry(TestCase):
         self.assertEqual(result[0]["name"], "card")
 
 
+class TestSpellblockRegistryPayload(TestCase):
+    """Test the cached registry API payload."""
+
+    def setUp(self):
+        clear_spellblock_registry_cache()
+
+    def tearDown(self):
+        clear_spellblock_registry_cache()
+
+    def test_payload_is_built_once(self):
+        """The registry is walked once and the same payload reused."""
+        with patch(
+            'api.logic.spellblock_registry.build_spellblock_registry',
+            return_value=[{"name": "card"}],
+        ) as mock_build:
+            body, etag = get_spellblock_registry_payload()
+            again = get_spellblock_registry_payload()
+
+        mock_build.assert_called_once()
+        self.assertEqual(again, (body, etag))
+        self.assertEqual(
+            json.loads(body), {"blocks": [{"name": "card"}], "count": 1}
+        )
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+    def test_clear_rebuilds_with_new_etag(self):
+        """Clearing the cache picks up registry changes."""
+        with patch(
+            'api.logic.spellblock_registry.build_spellblock_registry',
+            side_effect=[[{"name": "card"}], [{"name": "alert"}]],
+        ):
+            _, first = get_spellblock_registry_payload()
+            clear_spellblock_registry_cache()
+            _, second = get_spellblock_registry_payload()
+
+        self.assertNotEqual(first, second)
+
+
+class TestSpellblockRegistryView(TestCase):
+    """Test caching headers of the registry endpoint."""
+
+    def setUp(self):
+        clear_spellblock_registry_cache()
+        self.url = reverse("api:spellblock-registry")
+
+    def test_etag_and_cache_control(self):
+        """Responses carry a strong ETag and a long public max-age."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(json.loads(response.content)["count"], 0)
+        self.assertFalse(response["ETag"].startswith("W/"))
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("max-age=86400", response["Cache-Control"])
+
+    def test_revalidation_returns_304(self):
+        """A matching If-None-Match is answered without a body."""
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+
 class TestGetBlockDescription(TestCase):
     """Test the _get_block_description helper function."""
     
@@ -0,0 +1,202 @@
+# api/tests/functions/test_stream_sanitizer.py
+"""
+Differential tests for the streaming sanitizer.
+
+Every document the fast path accepts must come out exactly as
+``bleach.clean`` would produce it; everything else must be refused so the
+caller falls back to the Cleaner.
+"""
+
+import random
+from unittest.mock import patch
+
+import bleach
+from django.test import TestCase, override_settings
+
+from api.logic.markdown_preview import render_markdown_to_html
+from api.logic.sanitizers import (
+    ENGINE_AUTO,
+    ENGINE_BLEACH,
+    ENGINE_STREAM,
+    POLICIES,
+    STANDARD,
+    STRICT,
+    clean_html,
+    get_cleaner,
+)
+from api.logic.stream_sanitizer import stream_clean
+
+# Documents the streaming pass handles itself
+STREAMED = [
+    "",
+    "plain text",
+    "<p>Hello <strong>world</strong></p>",
+    "<P CLASS='x'>upper case</P>",
+    '<div class="card" data-x="1" onclick="evil()"><p>x</p></div>',
+    '<a href="javascript:alert(1)">bad</a> <a href="tel:1">ok</a>',
+    '<a href="https://e.com/?a=1&b=2" title="&quot;q&quot; &bogus;">x</a>',
+    "<a href=#top title=unquoted>anchor</a>",
+    "a &amp; b &lt;c&gt; &copy; &#39;q&#x27; & d &nosuch; e",
+    "1 < 2 > 0 <3 <",
+    "<script>alert('x')</script><style>p {}</style>",
+    "<p>one<!-- comment -->two</p>",
+    "<pre>\ncode\n</pre><pre><code>x</code></pre>",
+    "<ul><li>one</li><li>two",
+    "<ul><li><p>one</ul>",
+    "<p>a<p>b</p>",
+    "<p>a<div>b</div>",
+    "<div></p></div>",
+    "<br><br/><hr><img src=a.png alt='A' onerror=x()>",
+    "<section><foo>stripped</foo><div>block</div></section>",
+    "<p>x</p><custom>y</custom><article>z</article>",
+    "<table>\n<thead><tr><th>h</th></tr></thead>\n"
+    "<tbody><tr><td>1</td><td><pre>\nx</pre></td></tr></tbody></table>",
+    "<details open><summary>S</summary>body</details>",
+    "<p>unclosed <em>inline",
+    "<div>a\x07b</div>",
+    "<button onclick='x()'>Go</button>",
+]
+
+# Documents html5lib repairs, which the streaming pass must refuse
+REFUSED = [
+    "<b><i>misnested</b></i>",
+    "<div><b>x</div>y",
+    "<p><b>a<div>b</div>",
+    "<table><tr><td>implied tbody</td></tr></table>",
+    "<table>text in table</table>",
+    "<td>cell outside table</td>",
+    "<a href=x>1<a href=y>2</a></a>",
+    "<h1>a<h2>b</h2></h1>",
+    "<textarea><b>x</b></textarea>",
+    "<form><input></form>",
+    "<!DOCTYPE html><p>x</p>",
+    "<?php echo 1 ?>",
+    "<!-->",
+    "</ broken>",
+    "<div",
+    '<a href="x"title="y">z</a>',
+    "line\r\nbreak",
+    "<pre><!-- c -->\nx</pre>",
+    "<span>x</div>",
+    "<ul><li>one<li>two</ul>",
+]
+
+
+class TestStreamSanitizer(TestCase):
+    """Compare the streaming pass with bleach.clean."""
+
+    def assertMatchesBleach(self, html, policy):
+        result = stream_clean(html, get_cleaner(policy))
+        self.assertIsNotNone(result, f"refused {html!r}")
+        self.assertEqual(
+            result, bleach.clean(html, **POLICIES[policy]), html
+        )
+
+    def test_streamed_documents_match_bleach(self):
+        """Handled documents produce bleach's exact output."""
+        for policy in POLICIES:
+            for html in STREAMED:
+                with self.subTest(policy=policy, html=html):
+                    self.assertMatchesBleach(html, policy)
+
+    def test_documents_needing_repair_are_refused(self):
+        """Documents html5lib would repair are left to the Cleaner."""
+        for html in REFUSED:
+            with self.subTest(html=html):
+                self.assertIsNone(stream_clean(html, get_cleaner(STANDARD)))
+
+    def test_rendered_markdown_is_streamed(self):
+        """Markdown renderer output takes the fast path."""
+        markdown = (
+            "# Title\n\nSome **bold** and [a link](https://e.com).\n\n"
+            "- one\n- two\n\n> quote\n\n```python\nx = 1 < 2\n```\n\n"
+            "{~ alert type=\"info\" ~}\nAn *alert*\n{~~}\n"
+        )
+        html = render_markdown_to_html(markdown)
+        for policy in POLICIES:
+            with self.subTest(policy=policy):
+                self.assertMatchesBleach(html, policy)
+
+    def test_random_documents(self):
+        """Randomly generated trees agree with bleach whenever streamed."""
+        rng = random.Random(20)
+        tags = [
+            "div",
+            "p",
+            "ul",
+            "li",
+            "pre",
+            "h2",
+            "span",
+            "a",
+            "b",
+            "code",
+            "foo",
+            "script",
+            "details",
+            "blockquote",
+        ]
+        attributes = [
+            "",
+            ' class="x"',
+            " id=a",
+            ' href="javascript:x()"',
+            " href='/p?a=1&b=2'",
+            ' title="&quot;<"',
+            " onclick=x()",
+        ]
+        texts = ["hi", " ", "\n", "a & b", "&lt;", "x < y", "&copy;"]
+
+        def node(depth):
+            if depth > 3 or rng.random() < 0.3:
+                return rng.choice(texts)
+            tag = rng.choice(tags)
+            inner = "".join(node(depth + 1) for _ in range(rng.randint(0, 3)))
+            if rng.random() < 0.1:
+                inner = "<!-- c -->" + inner
+            close = "" if rng.random() < 0.1 else f"</{tag}>"
+            return f"<{tag}{rng.choice(attributes)}>{inner}{close}"
+
+        streamed = 0
+        for _ in range(300):
+            html = "".join(node(0) for _ in range(rng.randint(1, 4)))
+            for policy in (STANDARD, STRICT):
+                result = stream_clean(html, get_cleaner(policy))
+                if result is None:
+                    continue
+                streamed += 1
+                self.assertEqual(
+                    result, bleach.clean(html, **POLICIES[policy]), html
+                )
+        self.assertGreater(streamed, 100)
+
+
+class TestCleanHtmlEngines(TestCase):
+    """Test how clean_html picks an engine."""
+
+    def test_engines_agree(self):
+        """Every engine returns bleach's output, including on fallback."""
+        for html in STREAMED + REFUSED:
+            expected = bleach.clean(html, **POLICIES[STANDARD])
+            for engine in (ENGINE_AUTO, ENGINE_BLEACH, ENGINE_STREAM):
+                with self.subTest(html=html, engine=engine):
+                    self.assertEqual(clean_html(html, engine=engine), expected)
+
+    @override_settings(SANITIZER_STREAMING_MIN_SIZE=100)
+    def test_auto_streams_large_documents_only(self):
+        """ENGINE_AUTO streams documents at or above the size threshold."""
+        with patch(
+            "api.logic.sanitizers.stream_clean", return_value="streamed"
+        ) as mock_stream:
+            self.assertNotEqual(clean_html("<p>small</p>"), "streamed")
+            mock_stream.assert_not_called()
+
+            self.assertEqual(clean_html("<p>" + "x" * 100 + "</p>"), "streamed")
+            mock_stream.assert_called_once()
+
+    @override_settings(SANITIZER_ENGINE=ENGINE_BLEACH)
+    def test_engine_setting(self):
+        """The SANITIZER_ENGINE setting selects the default engine."""
+        with patch("api.logic.sanitizers.stream_clean") as mock_stream:
+            clean_html("<p>" + "x" * 100_000 + "</p>")
+        mock_stream.assert_not_called()
@@ -0,0 +1,337 @@
+# api/tests/test_markdown_preview_views.py
+import json
+import threading
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from api.logic.preview_cache import clear_preview_cache
+from api.logic.preview_documents import document_hash, get_preview_documents
+from api.logic.preview_sessions import get_preview_sessions
+from api.logic.render_pool import RenderTimeout
+
+
+class MarkdownPreviewBlocksAPITests(TestCase):
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse("api:markdown-preview-blocks")
+
+    def test_returns_order_and_new_blocks(self):
+        response = self.client.post(
+            self.url,
+            {"markdown": "# Title\n\nHello"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["order"]), 2)
+        self.assertEqual(len(response.data["blocks"]), 2)
+
+    def test_known_blocks_are_omitted(self):
+        first = self.client.post(
+            self.url,
+            {"markdown": "# Title\n\nHello"},
+            format="json",
+        )
+
+        response = self.client.post(
+            self.url,
+            {
+                "markdown": "# Title\n\nHello again",
+                "known_blocks": first.data["order"],
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data["blocks"]), [response.data["order"][1]])
+
+    def test_rejects_malformed_payload(self):
+        response = self.client.post(
+            self.url,
+            {"markdown": "Hi", "known_blocks": "nope"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RenderPoolStatsAPITests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("api:render-pool-stats")
+
+    def test_requires_staff(self):
+        response = self.client.get(self.url)
+
+        self.assertIn(
+            response.status_code,
+            (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN),
+        )
+
+    def test_reports_pool_stats(self):
+        from django.contrib.auth import get_user_model
+
+        admin = get_user_model().objects.create_user(
+            username="admin", password="pw", is_staff=True
+        )
+        self.client.force_authenticate(user=admin)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for key in ("pid", "inline", "submitted", "timeouts", "utilization"):
+            self.assertIn(key, response.data)
+
+
+@override_settings(MARKDOWN_PREVIEW_COALESCE_WINDOW=0)
+class MarkdownPreviewAsyncAPITests(TestCase):
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+        get_preview_sessions().clear()
+        self.url = reverse("api:markdown-preview-async")
+
+    async def test_renders_html(self):
+        response = await self.async_client.post(
+            self.url,
+            {"markdown": "# Hello"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Hello", response.content.decode())
+
+    async def test_stale_revision_is_superseded(self):
+        body = {"markdown": "# Hi", "session": "editor-1", "revision": 2}
+        await self.async_client.post(
+            self.url, body, content_type="application/json"
+        )
+
+        response = await self.async_client.post(
+            self.url,
+            {**body, "revision": 1},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            json.loads(response.content),
+            {"superseded": True, "revision": 2},
+        )
+
+    async def test_invalid_request(self):
+        response = await self.async_client.post(
+            self.url,
+            {"markdown": "# Hi", "session": "editor-1"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_requires_post(self):
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(
+            response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+
+
+class MarkdownPreviewSessionAPITests(TestCase):
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+        get_preview_sessions().clear()
+        self.client = APIClient()
+        self.url = reverse("api:markdown-preview")
+
+    @override_settings(MARKDOWN_PREVIEW_COALESCE_WINDOW=0)
+    def test_stale_revision_is_superseded(self):
+        body = {"markdown": "# Hi", "session": "editor-1", "revision": 2}
+        first = self.client.post(self.url, body, format="json")
+
+        response = self.client.post(
+            self.url, {**body, "revision": 1}, format="json"
+        )
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            json.loads(response.content),
+            {"superseded": True, "revision": 2},
+        )
+
+    @override_settings(
+        MARKDOWN_PREVIEW_SHARED_CACHE=True, MARKDOWN_PREVIEW_COALESCE_WINDOW=1
+    )
+    def test_burst_is_coalesced_into_newest_revision(self):
+        body = {"markdown": "# Hi", "session": "editor-1", "revision": 1}
+        responses = {}
+        first = threading.Thread(
+            target=lambda: responses.update(
+                first=APIClient().post(self.url, body, format="json")
+            )
+        )
+        first.start()
+        deadline = time.monotonic() + 5
+        while (
+            get_preview_sessions().latest_revision("editor-1") is None
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.001)
+
+        response = self.client.post(
+            self.url, {**body, "markdown": "# Hi!", "revision": 2},
+            format="json",
+        )
+        first.join()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Hi!", response.content.decode())
+        self.assertEqual(
+            responses["first"].status_code, status.HTTP_409_CONFLICT
+        )
+        self.assertEqual(
+            json.loads(responses["first"].content),
+            {"superseded": True, "revision": 2},
+        )
+
+    def test_invalid_session(self):
+        response = self.client.post(
+            self.url,
+            {"markdown": "# Hi", "session": "editor 1", "revision": 1},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(MARKDOWN_PREVIEW_PATCHES=True)
+class MarkdownPreviewPatchAPITests(TestCase):
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+        get_preview_sessions().clear()
+        get_preview_documents().clear()
+        self.client = APIClient()
+        self.url = reverse("api:markdown-preview-blocks")
+
+    def post(self, body):
+        return self.client.post(
+            self.url,
+            {"session": "editor-1", "revision": 1, **body},
+            format="json",
+        )
+
+    def test_patch_against_previous_upload(self):
+        first = self.post({"markdown": "# Title\n\nHello"})
+
+        response = self.post(
+            {
+                "base": document_hash("# Title\n\nHello"),
+                "patch": [[14, 14, " again"]],
+                "known_blocks": first.data["order"],
+            }
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["blocks"]), 1)
+        self.assertIn("Hello again", list(response.data["blocks"].values())[0])
+
+    def test_patch_support_is_advertised(self):
+        self.assertTrue(self.post({"markdown": "# Hi"}).data["patches"])
+        with override_settings(MARKDOWN_PREVIEW_PATCHES=False):
+            self.assertFalse(self.post({"markdown": "# Hi"}).data["patches"])
+
+    def test_unknown_base_requires_full_upload(self):
+        response = self.post({"base": document_hash("# Gone"), "patch": []})
+
+        self.assertEqual(
+            response.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
+        self.assertTrue(json.loads(response.content)["full_upload_required"])
+
+    def test_patch_splitting_an_emoji_requires_full_upload(self):
+        self.post({"markdown": "# Hi 😀"})
+
+        response = self.post(
+            {"base": document_hash("# Hi 😀"), "patch": [[6, 7, "!"]]}
+        )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
+        self.assertTrue(json.loads(response.content)["full_upload_required"])
+
+    @override_settings(MARKDOWN_PREVIEW_COALESCE_WINDOW=0)
+    def test_patch_on_plain_preview_endpoint(self):
+        url = reverse("api:markdown-preview")
+        self.client.post(
+            url,
+            {"session": "editor-2", "revision": 1, "markdown": "# Hi"},
+            format="json",
+        )
+
+        response = self.client.post(
+            url,
+            {
+                "session": "editor-2",
+                "revision": 2,
+                "base": document_hash("# Hi"),
+                "patch": [[4, 4, " there"]],
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Hi there", response.content.decode())
+
+
+class MarkdownPreviewTimeoutAPITests(TestCase):
+    def setUp(self):
+        clear_preview_cache()
+        cache.clear()
+        get_preview_sessions().clear()
+        self.client = APIClient()
+
+    def post_timing_out(self, name):
+        with patch(
+            "api.logic.markdown_preview.render_markdown",
+            side_effect=RenderTimeout("Rendering took longer than 1 seconds"),
+        ):
+            return self.client.post(
+                reverse(name), {"markdown": "# Slow"}, format="json"
+            )
+
+    def test_timeouts_are_503_and_not_cached(self):
+        for name in (
+            "api:markdown-preview",
+            "api:markdown-preview-blocks",
+            "api:markdown-preview-async",
+        ):
+            with self.subTest(name=name):
+                clear_preview_cache()
+                cache.clear()
+                response = self.post_timing_out(name)
+
+                self.assertEqual(
+                    response.status_code,
+                    status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
+                self.assertEqual(
+                    json.loads(response.content),
+                    {"detail": "Rendering took longer than 1 seconds"},
+                )
+
+                retried = self.client.post(
+                    reverse(name), {"markdown": "# Slow"}, format="json"
+                )
+                self.assertEqual(retried.status_code, status.HTTP_200_OK)
+                self.assertIn("Slow", retried.content.decode())
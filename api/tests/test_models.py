@@ -178,7 +178,7 @@ class StoredMarkdownModelSaveTests(TestCase):
 
         # Let's simplify: Test that a spell tag itself isn't mangled by pre-bleach,
         # and that markdown around it is processed.
-        # We will *mock* render_spellbook_markdown_to_html to verify what it receives.
+        # We will *mock* render_markdown to verify what it receives.
 
         from unittest.mock import (
             patch,
@@ -186,7 +186,7 @@ class StoredMarkdownModelSaveTests(TestCase):
 
         # Mock the actual renderer to check the input it receives after bleaching
         with patch(
-            "api.models.render_spellbook_markdown_to_html"
+            "api.models.render_markdown"
         ) as mock_render:
             # Set a return value for the mock so save() completes
             mock_render.return_value = "<p>Mocked HTML Output</p>"
@@ -8,7 +8,10 @@ from .views import (
     StoredMarkdownDetailAPIView,
     RenderedMarkdownDetailAPIView,
     markdown_preview_api,
+    markdown_preview_async_api,
+    markdown_preview_blocks_api,
     random_markdown_api,
+    render_pool_stats_api,
     spellblock_registry_api,
 )
 
@@ -35,11 +38,26 @@ urlpatterns = [
         markdown_preview_api,
         name="markdown-preview",
     ),
+    path(
+        "markdown-preview/blocks/",
+        markdown_preview_blocks_api,
+        name="markdown-preview-blocks",
+    ),
+    path(
+        "markdown-preview/async/",
+        markdown_preview_async_api,
+        name="markdown-preview-async",
+    ),
     path(
         "random-markdown/",
         random_markdown_api,
         name="random-markdown",
     ),
+    path(
+        "render-pool/stats/",
+        render_pool_stats_api,
+        name="render-pool-stats",
+    ),
     path(
         "spellblock-registry/",
         spellblock_registry_api,
@@ -1,4 +1,5 @@
 # api/views.py
+import json
 import logging
 from pathlib import (
     Path,
@@ -11,6 +12,17 @@ from django.conf import (
 )
 from django.http import (
     HttpResponse,
+    JsonResponse,
+)
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+)
+from django.views.decorators.csrf import (
+    csrf_exempt,
+)
+from django.views.decorators.http import (
+    require_POST,
 )
 from rest_framework.exceptions import (
     APIException,
@@ -35,6 +47,27 @@ from rest_framework.decorators import (
     api_view,
     permission_classes,
 )
+from .logic.async_preview import (
+    render_preview_async,
+)
+from .logic.markdown_preview import (
+    full_upload_response,
+    render_timeout_response,
+    superseded_response,
+)
+from .logic.preview_documents import (
+    DocumentMismatch,
+    patches_enabled,
+    resolve_markdown,
+)
+from .logic.preview_sessions import (
+    PreviewSuperseded,
+    parse_session,
+)
+from .logic.render_pool import (
+    RenderTimeout,
+    get_render_pool_stats,
+)
 from .models import (
     StoredMarkdown,
 )
@@ -140,7 +173,13 @@ class StoredMarkdownListCreateAPIView(BaseCustomAPIView):
             context=self.get_serializer_context(),
         )
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except RenderTimeout as e:
+                return Response(
+                    {"detail": str(e)},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
             return Response(
                 serializer.data,
                 status=status.HTTP_201_CREATED,
@@ -207,7 +246,13 @@ class StoredMarkdownDetailAPIView(BaseCustomAPIView):
             context=self.get_serializer_context(),
         )
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except RenderTimeout as e:
+                return Response(
+                    {"detail": str(e)},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
             return Response(serializer.data)
         return Response(
             serializer.errors,
@@ -270,20 +315,43 @@ def markdown_preview_api(request):
     """
     API endpoint to render markdown content to HTML with sanitization.
     Returns HTML content for live preview functionality.
+
+    Editors may send ``session`` and a monotonically increasing
+    ``revision``; stale revisions get a 409 ``superseded`` response, and
+    with a cache shared between workers bursts are coalesced into one
+    render of the newest revision. The editor does not use this yet
+    (BlockPreview posts to markdown_preview_blocks_api), so coalescing is
+    for other clients of this endpoint only for now.
+    With a session, ``patch`` and ``base`` may replace ``markdown`` (see
+    preview_documents); a 412 asks for the whole document instead.
     """
     logger.info("[Markdown Preview API] --- Starting request ---")
     
     try:
         from .logic.markdown_preview import process_markdown_preview
         
-        raw_markdown = request.data.get("markdown", "")
+        try:
+            session = parse_session(
+                request.data.get("session"), request.data.get("revision")
+            )
+            session_id, revision = session or (None, None)
+            raw_markdown = resolve_markdown(request.data, session_id)
+        except DocumentMismatch as e:
+            return full_upload_response(str(e))
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         
         # Process markdown with sanitization enabled
         # Set enable_sanitization=False to debug sanitization issues
         response = process_markdown_preview(
             raw_markdown=raw_markdown,
             enable_sanitization=True,
-            strict_mode=False
+            strict_mode=False,
+            session_id=session_id,
+            revision=revision,
         )
         
         logger.info(f"[Markdown Preview API] Successfully processed {len(raw_markdown)} chars of markdown")
@@ -298,29 +366,180 @@ def markdown_preview_api(request):
         )
 
 
+@api_view(["POST"])
+@permission_classes([permissions.AllowAny])
+def markdown_preview_blocks_api(request):
+    """
+    Incremental variant of markdown_preview_api.
+
+    Expects ``markdown`` and optionally ``known_blocks``, the block IDs the
+    editor already shows. Returns the block order plus HTML for new blocks
+    only, so the editor can patch its preview instead of replacing it.
+    Like markdown_preview_api, an editor ``session`` may send a ``patch``
+    against its previous upload instead of ``markdown``; ``patches`` in the
+    response tells the editor whether the server accepts them. Requests are not
+    coalesced: BlockPreview debounces input and keeps one request in
+    flight, so a session never has a burst to collapse here.
+    """
+    try:
+        from .logic.preview_blocks import render_preview_blocks
+
+        known_blocks = request.data.get("known_blocks", []) or []
+        try:
+            session = parse_session(
+                request.data.get("session"), request.data.get("revision")
+            )
+            raw_markdown = resolve_markdown(
+                request.data, session[0] if session else None
+            )
+        except DocumentMismatch as e:
+            return full_upload_response(str(e))
+        except ValueError:
+            raw_markdown = None
+        if not isinstance(raw_markdown, str) or not isinstance(
+            known_blocks, list
+        ):
+            return Response(
+                {"error": "Expected 'markdown' string and 'known_blocks' list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        result = render_preview_blocks(
+            raw_markdown,
+            known_ids=[str(block_id) for block_id in known_blocks],
+            enable_sanitization=True,
+            strict_mode=False,
+        )
+        result["patches"] = patches_enabled()
+        logger.info(
+            f"[Markdown Preview API] {len(result['order'])} blocks, "
+            f"{len(result['blocks'])} rendered"
+        )
+        return Response(
+            result,
+            status=status.HTTP_200_OK,
+        )
+
+    except RenderTimeout as e:
+        return render_timeout_response(e)
+    except Exception as e:
+        logger.error(f"[Markdown Preview API] Error: {type(e).__name__} - {e}")
+        return Response(
+            {"error": "Error processing markdown"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@csrf_exempt
+@require_POST
+async def markdown_preview_async_api(request):
+    """
+    Async variant of markdown_preview_api for ASGI deployments.
+
+    A plain Django async view (DRF views are sync only) that awaits the
+    render on the preview executor instead of occupying a sync_to_async
+    thread for the whole request. Expects JSON with ``markdown`` and
+    optionally ``session``, ``revision`` and a ``patch``, handled as in
+    markdown_preview_api: a request whose session moves on to a newer
+    revision is answered with 409 and ``superseded`` as soon as that
+    revision arrives, and its render is abandoned.
+    """
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    max_size = getattr(
+        settings,
+        "MAX_API_REQUEST_SIZE",
+        settings.DATA_UPLOAD_MAX_MEMORY_SIZE,
+    )
+    if content_length > max_size:
+        return JsonResponse(
+            {
+                "detail": f"Payload size ({content_length} bytes) exceeds "
+                f"configured limit ({max_size} bytes)."
+            },
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+
+    try:
+        data = json.loads(request.body or b"{}")
+        session = parse_session(data.get("session"), data.get("revision"))
+        session_id, revision = session or (None, None)
+        raw_markdown = resolve_markdown(data, session_id)
+    except DocumentMismatch as e:
+        return full_upload_response(str(e))
+    except (AttributeError, TypeError, ValueError) as e:
+        return JsonResponse(
+            {"error": f"Invalid preview request: {e}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        html_output = await render_preview_async(
+            raw_markdown,
+            enable_sanitization=True,
+            strict_mode=False,
+            session_id=session_id,
+            revision=revision,
+        )
+    except PreviewSuperseded as e:
+        return superseded_response(e.revision)
+    except RenderTimeout as e:
+        return render_timeout_response(e)
+    except Exception as e:
+        logger.error(f"[Markdown Preview API] Error: {type(e).__name__} - {e}")
+        return HttpResponse(
+            "<div class='error'>Error processing markdown</div>",
+            content_type="text/html",
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    return HttpResponse(
+        html_output,
+        content_type="text/html",
+        status=status.HTTP_200_OK,
+    )
+
+
 @api_view(["GET"])
 @permission_classes([permissions.AllowAny])
 def spellblock_registry_api(request):
     """
     API endpoint to fetch all available SpellBlocks and their schemas.
     Returns JSON with block definitions including parameter information.
+
+    The response is built once per process and carries a strong ETag and a
+    long Cache-Control (SPELLBLOCK_REGISTRY_MAX_AGE), so revalidating
+    clients get a 304.
     """
     logger.info("[SpellBlock Registry API] --- Starting request ---")
 
     try:
-        from .logic.spellblock_registry import build_spellblock_registry
-        
-        registry_data = build_spellblock_registry()
-
-        response_data = {
-            "blocks": registry_data,
-            "count": len(registry_data),
-        }
+        from .logic.spellblock_registry import (
+            get_spellblock_registry_payload,
+        )
 
-        return Response(
-            response_data,
+        body, etag = get_spellblock_registry_payload()
+        response = get_conditional_response(
+            request,
+            etag=etag,
+        ) or HttpResponse(
+            body,
+            content_type="application/json",
             status=status.HTTP_200_OK,
         )
+        response["ETag"] = etag
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=getattr(
+                settings,
+                "SPELLBLOCK_REGISTRY_MAX_AGE",
+                60 * 60 * 24,
+            ),
+        )
+        return response
 
     except Exception as e:
         logger.error(
@@ -335,6 +554,19 @@ def spellblock_registry_api(request):
         )
 
 
+@api_view(["GET"])
+@permission_classes([permissions.IsAdminUser])
+def render_pool_stats_api(request):
+    """
+    Report the markdown render pool statistics for the worker that served
+    the request (inline vs pooled renders, timeouts, utilization).
+    """
+    return Response(
+        get_render_pool_stats(),
+        status=status.HTTP_200_OK,
+    )
+
+
 @api_view(["GET"])
 @permission_classes([permissions.AllowAny])  # Or your preferred permissions
 def random_markdown_api(
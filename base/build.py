@@ -0,0 +1,135 @@
+# base/build.py
+"""
+Detect when ``spellbook_md`` has regenerated the documentation.
+
+The command writes one template per markdown file into
+``<app>/templates/<app>/spellbook_md/`` and rewrites the ``urls_<app>.py`` /
+``views_<app>.py`` modules inside the django_spellbook package. Anything
+derived from that output (cached pages, the rendered TOC) includes the
+``build_stamp()`` in its cache key, so a new build simply stops matching
+the old entries, in every worker, without an explicit purge.
+"""
+import os
+import threading
+import time
+from hashlib import (
+    blake2b,
+)
+from pathlib import (
+    Path,
+)
+from typing import (
+    List,
+    Optional,
+)
+
+from django.apps import (
+    apps,
+)
+from django.conf import (
+    settings,
+)
+
+# Seconds between checks of the generated files; the stamp is cached in
+# between so requests do not stat the tree every time.
+DEFAULT_CHECK_INTERVAL = 5
+
+_lock = threading.Lock()
+_stamp: Optional[str] = None
+_checked_at = 0.0
+
+
+def generated_paths() -> List[Path]:
+    """
+    Return the files and directories ``spellbook_md`` writes to.
+
+    Returns:
+        List[Path]: The generated template directory of each content app
+            plus the generated urls/views modules of django_spellbook.
+    """
+    paths = []
+    for app_label in getattr(
+        settings,
+        "SPELLBOOK_MD_APP",
+        [],
+    ):
+        try:
+            app_config = apps.get_app_config(app_label)
+        except LookupError:
+            continue
+        paths.append(
+            Path(app_config.path) / "templates" / app_label / "spellbook_md"
+        )
+
+    try:
+        import django_spellbook
+    except ImportError:
+        return paths
+    spellbook_dir = Path(django_spellbook.__file__).resolve().parent
+    paths.append(spellbook_dir / "urls.py")
+    paths.extend(sorted(spellbook_dir.glob("urls_*.py")))
+    paths.extend(sorted(spellbook_dir.glob("views_*.py")))
+    return paths
+
+
+def compute_build_stamp() -> str:
+    """
+    Fingerprint the current ``spellbook_md`` output.
+
+    Hashes the path, size and modification time of every generated file,
+    so rewriting, adding or removing a page all change the stamp.
+
+    Returns:
+        str: A short hex digest.
+    """
+    digest = blake2b(digest_size=8)
+    for path in generated_paths():
+        if path.is_file():
+            files = [str(path)]
+        else:
+            files = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(path)
+                for name in names
+            )
+        for name in files:
+            try:
+                stat = os.stat(name)
+            except OSError:
+                continue
+            digest.update(
+                f"{name}\x00{stat.st_size}\x00{stat.st_mtime_ns}\n".encode()
+            )
+    return digest.hexdigest()
+
+
+def build_stamp() -> str:
+    """
+    Return the current build stamp, re-checking the files at most every
+    ``SPELLBOOK_BUILD_CHECK_INTERVAL`` seconds.
+
+    Returns:
+        str: The stamp from compute_build_stamp.
+    """
+    global _stamp, _checked_at
+    interval = getattr(
+        settings,
+        "SPELLBOOK_BUILD_CHECK_INTERVAL",
+        DEFAULT_CHECK_INTERVAL,
+    )
+    now = time.monotonic()
+    if _stamp is not None and now - _checked_at < interval:
+        return _stamp
+    with _lock:
+        if _stamp is None or now - _checked_at >= interval:
+            _stamp = compute_build_stamp()
+            _checked_at = now
+        return _stamp
+
+
+def reset_build_stamp() -> None:
+    """Forget the cached stamp so the next call re-reads the files."""
+    global _stamp, _checked_at
+    with _lock:
+        _stamp = None
+        _checked_at = 0.0
@@ -0,0 +1,123 @@
+# base/markdown_cache.py
+"""
+In-memory cache of markdown files rendered with django-spellbook.
+
+Each entry remembers the file's size and modification time. The file is
+only stat'ed again once ``MARKDOWN_CACHE_CHECK_INTERVAL`` seconds have
+passed, so a hot page does no disk I/O and no markdown parsing on most
+requests, yet still picks up edits without a restart.
+"""
+import logging
+import os
+import threading
+import time
+from pathlib import (
+    Path,
+)
+from typing import (
+    Dict,
+    Iterable,
+    Tuple,
+    Union,
+)
+
+from django.conf import (
+    settings,
+)
+
+from api.logic.render_pool import (
+    render_markdown,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECK_INTERVAL = 5
+
+# path -> (checked_at, (size, mtime_ns), html)
+_entries: Dict[str, Tuple[float, Tuple[int, int], str]] = {}
+_lock = threading.Lock()
+
+
+def strip_frontmatter(
+    markdown_content: str,
+) -> str:
+    """Remove a leading ``---`` delimited frontmatter block, if any."""
+    if markdown_content.startswith("---"):
+        # Find the closing --- and skip everything before it
+        parts = markdown_content.split("---", 2)
+        if len(parts) >= 3:
+            markdown_content = parts[2].strip()
+    return markdown_content
+
+
+def render_markdown_file(
+    path: Union[str, Path],
+) -> str:
+    """
+    Return the rendered HTML of a markdown file, re-rendering only when it
+    has changed on disk.
+
+    Args:
+        path: The markdown file.
+
+    Returns:
+        str: The rendered HTML, frontmatter excluded.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    key = str(path)
+    now = time.monotonic()
+    interval = getattr(
+        settings,
+        "MARKDOWN_CACHE_CHECK_INTERVAL",
+        DEFAULT_CHECK_INTERVAL,
+    )
+    entry = _entries.get(key)
+    if entry is not None and now - entry[0] < interval:
+        return entry[2]
+
+    stat = os.stat(key)
+    version = (
+        stat.st_size,
+        stat.st_mtime_ns,
+    )
+    if entry is not None and entry[1] == version:
+        html = entry[2]
+    else:
+        with open(
+            key,
+            "r",
+            encoding="utf-8",
+        ) as f:
+            html = render_markdown(strip_frontmatter(f.read()))
+        logger.debug(f"Rendered markdown file {key}")
+    with _lock:
+        _entries[key] = (
+            now,
+            version,
+            html,
+        )
+    return html
+
+
+def warm_markdown_cache(
+    paths: Iterable[Union[str, Path]],
+) -> None:
+    """
+    Render markdown files ahead of their first request.
+
+    Called from the WSGI/ASGI entry points, so management commands do not
+    pay for it. Failures are logged; the page then renders on first use.
+    """
+    for path in paths:
+        try:
+            render_markdown_file(path)
+        except Exception as e:
+            logger.warning(f"Could not pre-render {path}: {e}")
+
+
+def clear_markdown_cache() -> None:
+    """Forget every rendered file."""
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,170 @@
+# base/middleware.py
+from typing import (
+    Callable,
+    Optional,
+    Tuple,
+)
+
+from django.conf import (
+    settings,
+)
+from django.core.cache import (
+    cache,
+)
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+)
+
+from .build import (
+    build_stamp,
+)
+
+PAGE_CACHE_KEY = "docs_page:{stamp}:{theme}:{mode}:{path}"
+DEFAULT_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# Response headers replayed on a cache hit; everything else (cookies, Vary,
+# security headers) is added again by the outer middleware.
+CACHED_HEADERS = (
+    "Content-Type",
+    "Content-Language",
+)
+
+
+class DocsPageCacheMiddleware:
+    """
+    Serve the pages generated by ``spellbook_md`` from the cache.
+
+    Pages under ``SPELLBOOK_MD_URL_PREFIX`` only change when the command
+    regenerates them, so the whole rendered response is cached per path,
+    theme and mode. The key also carries the build stamp (see base.build),
+    so a new build invalidates every cached page on its own.
+
+    Must come after ThemeMiddleware, which picks the theme for the request,
+    and stays inside PageViewMiddleware so cached hits are still counted.
+    Only anonymous GET requests without a query string are cached, and a
+    response is only stored if rendering it did not touch per-visitor state:
+    no cookies, no modified session and no CSRF token.
+
+    Attributes:
+        get_response (Callable): The next middleware or view in the chain.
+        prefixes (Tuple[str, ...]): URL prefixes of the generated pages.
+    """
+
+    def __init__(
+        self,
+        get_response: Callable[
+            [HttpRequest],
+            HttpResponse,
+        ],
+    ) -> None:
+        self.get_response = get_response
+        self.prefixes: Tuple[str, ...] = tuple(
+            f"/{prefix.strip('/')}/"
+            for prefix in getattr(
+                settings,
+                "SPELLBOOK_MD_URL_PREFIX",
+                [],
+            )
+            if prefix.strip("/")
+        )
+
+    def __call__(
+        self,
+        request: HttpRequest,
+    ) -> HttpResponse:
+        key = self.cache_key(request)
+        if key is None:
+            return self.get_response(request)
+
+        cached = cache.get(key)
+        if cached is not None:
+            return self.rebuild_response(cached)
+
+        response = self.get_response(request)
+        if self.should_store(
+            request,
+            response,
+        ):
+            cache.set(
+                key,
+                (
+                    response.content,
+                    [
+                        (header, response[header])
+                        for header in CACHED_HEADERS
+                        if response.has_header(header)
+                    ],
+                ),
+                getattr(
+                    settings,
+                    "DOCS_PAGE_CACHE_TIMEOUT",
+                    DEFAULT_PAGE_CACHE_TIMEOUT,
+                ),
+            )
+        return response
+
+    def cache_key(
+        self,
+        request: HttpRequest,
+    ) -> Optional[str]:
+        """
+        Return the cache key for a cacheable request, or None.
+
+        Args:
+            request: The current request, after ThemeMiddleware.
+
+        Returns:
+            Optional[str]: The key, or None if the request bypasses the cache.
+        """
+        if not getattr(
+            settings,
+            "DOCS_PAGE_CACHE",
+            False,
+        ):
+            return None
+        if request.method != "GET" or request.GET:
+            return None
+        if not request.path.startswith(self.prefixes):
+            return None
+        if getattr(request, "htmx", False):
+            return None
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            # Staff get the dev metadata panel
+            return None
+        return PAGE_CACHE_KEY.format(
+            stamp=build_stamp(),
+            theme=getattr(request, "theme_name", ""),
+            mode=getattr(request, "theme_mode", ""),
+            path=request.path,
+        )
+
+    def should_store(
+        self,
+        request: HttpRequest,
+        response: HttpResponse,
+    ) -> bool:
+        """Whether a freshly rendered response is safe to share."""
+        if response.status_code != 200 or response.streaming:
+            return False
+        if response.cookies:
+            return False
+        if request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+            # get_token() was called, so the page embeds this visitor's token
+            return False
+        session = getattr(request, "session", None)
+        if session is not None and session.modified:
+            return False
+        cache_control = response.get("Cache-Control", "")
+        return "private" not in cache_control and "no-store" not in cache_control
+
+    def rebuild_response(
+        self,
+        cached: Tuple[bytes, list],
+    ) -> HttpResponse:
+        """Build a response from a cached ``(content, headers)`` entry."""
+        content, headers = cached
+        response = HttpResponse(content)
+        for header, value in headers:
+            response[header] = value
+        return response
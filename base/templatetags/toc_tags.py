@@ -0,0 +1,38 @@
+from django import (
+    template,
+)
+from django.core.exceptions import (
+    ImproperlyConfigured,
+)
+from django.utils.safestring import (
+    mark_safe,
+)
+
+from ..toc import (
+    render_toc,
+)
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cached_sidebar_toc(
+    context,
+):
+    """
+    Drop-in replacement for spellbook's ``{% sidebar_toc %}``.
+
+    Uses the TOC pre-rendered for the current build and only marks the
+    active item per request (see base.toc).
+    """
+    toc = context.get("toc")
+    if toc is None:
+        raise ImproperlyConfigured(
+            "The 'toc' variable is required in the context for cached_sidebar_toc"
+        )
+    return mark_safe(
+        render_toc(
+            toc,
+            context.get("current_url"),
+        )
+    )
@@ -1,5 +1,531 @@
+import os
+import tempfile
+from pathlib import (
+    Path,
+)
+from unittest import (
+    mock,
+)
+
+from django.contrib.auth.models import (
+    User,
+)
+from django.core.cache import (
+    cache,
+)
+from django.core.exceptions import (
+    ImproperlyConfigured,
+)
+from django.http import (
+    HttpResponse,
+)
+from django.middleware.csrf import (
+    get_token,
+)
+from django.template import (
+    Context,
+    Template,
+)
 from django.test import (
     TestCase,
+    override_settings,
+)
+from django.urls import (
+    path,
+)
+
+from analytics.models import (
+    PageView,
+)
+from api.logic.render_pool import (
+    RenderTimeout,
+)
+
+from . import (
+    build,
+    markdown_cache,
+    toc,
+    views,
+)
+
+calls = []
+
+
+def docs_page(
+    request,
+):
+    calls.append(request.path)
+    return HttpResponse(
+        f"<p>{request.path} {request.theme_name} {request.theme_mode}</p>"
+    )
+
+
+def docs_page_with_token(
+    request,
+):
+    calls.append(request.path)
+    return HttpResponse(get_token(request))
+
+
+def docs_page_with_cookie(
+    request,
+):
+    calls.append(request.path)
+    response = HttpResponse("cookie")
+    response.set_cookie(
+        "seen",
+        "1",
+    )
+    return response
+
+
+urlpatterns = [
+    path(
+        "docs/page/",
+        docs_page,
+    ),
+    path(
+        "docs/token/",
+        docs_page_with_token,
+    ),
+    path(
+        "docs/cookie/",
+        docs_page_with_cookie,
+    ),
+    path(
+        "other/page/",
+        docs_page,
+    ),
+]
+
+
+@override_settings(
+    ROOT_URLCONF="base.tests",
+    DOCS_PAGE_CACHE=True,
+    ANALYTICS_BUFFER_WRITES=False,
 )
+class DocsPageCacheMiddlewareTests(TestCase):
+    def setUp(
+        self,
+    ):
+        cache.clear()
+        calls.clear()
+        build.reset_build_stamp()
+
+    def test_repeat_request_is_served_from_cache(
+        self,
+    ):
+        first = self.client.get("/docs/page/")
+        second = self.client.get("/docs/page/")
+
+        self.assertEqual(
+            calls,
+            ["/docs/page/"],
+        )
+        self.assertEqual(
+            first.content,
+            second.content,
+        )
+        self.assertEqual(
+            second["Content-Type"],
+            first["Content-Type"],
+        )
+
+    def test_cached_hits_are_still_tracked(
+        self,
+    ):
+        self.client.get("/docs/page/")
+        self.client.get("/docs/page/")
+
+        self.assertEqual(
+            PageView.objects.filter(url="/docs/page/").count(),
+            2,
+        )
+
+    def test_theme_and_mode_are_part_of_the_key(
+        self,
+    ):
+        self.client.get("/docs/page/")
+        session = self.client.session
+        session["theme"] = "magical"
+        session["mode"] = "dark"
+        session.save()
+        response = self.client.get("/docs/page/")
+
+        self.assertEqual(
+            len(calls),
+            2,
+        )
+        self.assertContains(
+            response,
+            "magical dark",
+        )
+
+    def test_new_build_invalidates_pages(
+        self,
+    ):
+        with tempfile.TemporaryDirectory() as tmp:
+            page = Path(tmp) / "intro.html"
+            page.write_text("v1")
+            with mock.patch.object(
+                build,
+                "generated_paths",
+                return_value=[Path(tmp)],
+            ), override_settings(SPELLBOOK_BUILD_CHECK_INTERVAL=0):
+                self.client.get("/docs/page/")
+                self.client.get("/docs/page/")
+                page.write_text("v2, regenerated")
+                os.utime(
+                    page,
+                    ns=(
+                        page.stat().st_atime_ns,
+                        page.stat().st_mtime_ns + 1_000_000,
+                    ),
+                )
+                self.client.get("/docs/page/")
+
+        self.assertEqual(
+            len(calls),
+            2,
+        )
+
+    def test_bypasses_other_paths_and_query_strings(
+        self,
+    ):
+        for _ in range(2):
+            self.client.get("/other/page/")
+            self.client.get(
+                "/docs/page/",
+                {"q": "spell"},
+            )
+
+        self.assertEqual(
+            len(calls),
+            4,
+        )
+
+    def test_bypasses_authenticated_users(
+        self,
+    ):
+        user = User.objects.create_user(
+            "staff",
+            password="pw",
+            is_staff=True,
+        )
+        self.client.force_login(user)
+        self.client.get("/docs/page/")
+        self.client.get("/docs/page/")
+
+        self.assertEqual(
+            len(calls),
+            2,
+        )
+
+    def test_does_not_store_per_visitor_responses(
+        self,
+    ):
+        for _ in range(2):
+            self.client.get("/docs/token/")
+            self.client.get("/docs/cookie/")
+
+        self.assertEqual(
+            len(calls),
+            4,
+        )
+
+    @override_settings(DOCS_PAGE_CACHE=False)
+    def test_disabled_by_setting(
+        self,
+    ):
+        self.client.get("/docs/page/")
+        self.client.get("/docs/page/")
+
+        self.assertEqual(
+            len(calls),
+            2,
+        )
+
+
+class BuildStampTests(TestCase):
+    def test_stamp_changes_when_files_change(
+        self,
+    ):
+        with tempfile.TemporaryDirectory() as tmp:
+            with mock.patch.object(
+                build,
+                "generated_paths",
+                return_value=[Path(tmp)],
+            ):
+                empty = build.compute_build_stamp()
+                (Path(tmp) / "page.html").write_text("page")
+                added = build.compute_build_stamp()
+
+                self.assertNotEqual(
+                    empty,
+                    added,
+                )
+                self.assertEqual(
+                    added,
+                    build.compute_build_stamp(),
+                )
+
+    def test_generated_paths_cover_content_apps(
+        self,
+    ):
+        paths = [str(path) for path in build.generated_paths()]
+
+        self.assertTrue(
+            any(
+                path.endswith(
+                    os.path.join(
+                        "docs",
+                        "templates",
+                        "docs",
+                        "spellbook_md",
+                    )
+                )
+                for path in paths
+            )
+        )
+
+
+SAMPLE_TOC = {
+    "children": {
+        "intro": {
+            "title": "Intro",
+            "url": "docs:intro",
+        },
+        "guide": {
+            "title": "Guide",
+            "url": "",
+            "children": {
+                "setup": {
+                    "title": "Setup",
+                    "url": "docs:setup",
+                },
+            },
+        },
+    },
+}
+
+
+class CachedSidebarTocTests(TestCase):
+    def setUp(
+        self,
+    ):
+        toc.clear_rendered_tocs()
+        build.reset_build_stamp()
+
+    def render(
+        self,
+        current_url,
+        toc_data=SAMPLE_TOC,
+    ):
+        return Template("{% load toc_tags %}{% cached_sidebar_toc %}").render(
+            Context(
+                {
+                    "toc": toc_data,
+                    "current_url": current_url,
+                }
+            )
+        )
+
+    def test_renders_tree_once_per_build(
+        self,
+    ):
+        with mock.patch.object(
+            toc,
+            "render_to_string",
+            wraps=toc.render_to_string,
+        ) as render_to_string:
+            self.render("docs:intro")
+            self.render("docs:setup")
+
+        self.assertEqual(
+            render_to_string.call_count,
+            1,
+        )
+
+    def test_marks_only_the_current_item(
+        self,
+    ):
+        html = self.render("docs:setup")
+
+        self.assertIn(
+            '<li class="toc-item active" data-toc-id="setup"',
+            html,
+        )
+        self.assertEqual(
+            html.count("toc-item active"),
+            1,
+        )
+        self.assertIn(
+            "Intro",
+            html,
+        )
+
+    def test_matches_spellbook_sidebar_toc(
+        self,
+    ):
+        """The output is exactly what {% sidebar_toc %} renders."""
+        for current_url in (
+            None,
+            "docs:intro",
+            "docs:setup",
+            "docs:missing",
+        ):
+            with self.subTest(current_url=current_url):
+                expected = Template(
+                    "{% load spellbook_tags %}{% sidebar_toc %}"
+                ).render(
+                    Context(
+                        {
+                            "toc": SAMPLE_TOC,
+                            "current_url": current_url,
+                        }
+                    )
+                )
+                self.assertEqual(
+                    self.render(current_url),
+                    expected,
+                )
+
+    def test_no_active_item_without_current_url(
+        self,
+    ):
+        self.assertNotIn(
+            "toc-item active",
+            self.render(None),
+        )
+
+    def test_new_build_rerenders(
+        self,
+    ):
+        with mock.patch.object(
+            toc,
+            "build_stamp",
+            side_effect=[
+                "a",
+                "a",
+                "b",
+            ],
+        ), mock.patch.object(
+            toc,
+            "render_to_string",
+            wraps=toc.render_to_string,
+        ) as render_to_string:
+            for _ in range(3):
+                self.render("docs:intro")
+
+        self.assertEqual(
+            render_to_string.call_count,
+            2,
+        )
+
+    def test_requires_toc_in_context(
+        self,
+    ):
+        with self.assertRaises(ImproperlyConfigured):
+            self.render(
+                None,
+                toc_data=None,
+            )
+
+
+class MarkdownCacheTests(TestCase):
+    def setUp(
+        self,
+    ):
+        markdown_cache.clear_markdown_cache()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "page.md"
+        self.path.write_text("---\ntitle: Page\n---\n\n# Hello")
+
+    def test_renders_without_frontmatter(
+        self,
+    ):
+        html = markdown_cache.render_markdown_file(self.path)
+
+        self.assertIn(
+            "Hello",
+            html,
+        )
+        self.assertNotIn(
+            "title:",
+            html,
+        )
+
+    def test_repeat_calls_skip_disk_and_parser(
+        self,
+    ):
+        markdown_cache.render_markdown_file(self.path)
+        with mock.patch.object(
+            markdown_cache,
+            "render_markdown",
+        ) as render, mock.patch.object(
+            markdown_cache.os,
+            "stat",
+        ) as stat:
+            markdown_cache.render_markdown_file(self.path)
+
+        render.assert_not_called()
+        stat.assert_not_called()
+
+    @override_settings(MARKDOWN_CACHE_CHECK_INTERVAL=0)
+    def test_picks_up_edits(
+        self,
+    ):
+        markdown_cache.render_markdown_file(self.path)
+        self.path.write_text("# Edited page")
+        os.utime(
+            self.path,
+            ns=(
+                self.path.stat().st_atime_ns,
+                self.path.stat().st_mtime_ns + 1_000_000,
+            ),
+        )
+
+        self.assertIn(
+            "Edited",
+            markdown_cache.render_markdown_file(self.path),
+        )
+
+    @override_settings(MARKDOWN_CACHE_CHECK_INTERVAL=0)
+    def test_unchanged_file_is_not_rerendered(
+        self,
+    ):
+        markdown_cache.render_markdown_file(self.path)
+        with mock.patch.object(
+            markdown_cache,
+            "render_markdown",
+        ) as render:
+            markdown_cache.render_markdown_file(self.path)
+
+        render.assert_not_called()
+
+    def test_home_page_renders_get_started(
+        self,
+    ):
+        response = self.client.get("/")
+
+        self.assertContains(
+            response,
+            "Get Started in Minutes",
+        )
+
+    def test_home_page_render_timeout_is_503(
+        self,
+    ):
+        with mock.patch.object(
+            views,
+            "render_markdown_file",
+            side_effect=RenderTimeout("Markdown render timed out"),
+        ):
+            response = self.client.get("/")
 
-# Create your tests here.
+        self.assertContains(
+            response,
+            "Content loading...",
+            status_code=503,
+        )
@@ -0,0 +1,110 @@
+# base/toc.py
+"""
+Pre-rendered sidebar table of contents.
+
+The TOC template includes itself once per node and reverses a URL per
+link, so rendering it per request costs time proportional to the number of
+docs pages. The TOC only changes when ``spellbook_md`` runs, so spellbook's
+own sidebar template is rendered once per build (see base.build) without
+any active item. Items are emitted depth first, in the TOC's order, so the
+current page is marked afterwards by adding ``active`` to the matching
+``<li>`` openings, giving the same HTML as ``{% sidebar_toc %}``.
+"""
+import threading
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from django.template.loader import (
+    render_to_string,
+)
+
+from .build import (
+    build_stamp,
+)
+
+TOC_TEMPLATE = "django_spellbook/tocs/sidebar_toc.html"
+ITEM_OPENING = '<li class="toc-item"'
+ACTIVE_ITEM_OPENING = '<li class="toc-item active"'
+
+# id(toc) -> (toc, build stamp, HTML split at each item, item urls). Each
+# content app has its own TOC dict; holding a reference keeps the id from
+# being reused.
+_rendered: Dict[int, Tuple[Any, str, List[str], List[Any]]] = {}
+_lock = threading.Lock()
+
+
+def _item_urls(
+    items: Dict,
+) -> List[Any]:
+    """List the url of every TOC item in the order the template emits them."""
+    urls = []
+    for data in items.values():
+        urls.append(data.get("url"))
+        urls.extend(_item_urls(data.get("children") or {}))
+    return urls
+
+
+def render_toc(
+    toc: Dict,
+    current_url: Optional[str] = None,
+) -> str:
+    """
+    Return the sidebar HTML for a TOC, rendering it once per build.
+
+    Args:
+        toc: The TOC dict of a content app, as generated by spellbook_md.
+        current_url: The TOC url of the page being viewed, if any.
+
+    Returns:
+        str: The rendered sidebar with the current page's items active.
+    """
+    stamp = build_stamp()
+    entry = _rendered.get(id(toc))
+    if entry is None or entry[0] is not toc or entry[1] != stamp:
+        pieces = render_to_string(
+            TOC_TEMPLATE,
+            {"toc": toc},
+        ).split(ITEM_OPENING)
+        entry = (
+            toc,
+            stamp,
+            pieces,
+            _item_urls(toc.get("children") or {}),
+        )
+        with _lock:
+            _rendered[id(toc)] = entry
+    pieces, urls = entry[2], entry[3]
+
+    if len(pieces) != len(urls) + 1:
+        # The template no longer emits one opening per item; render the
+        # page as spellbook would rather than mark the wrong item.
+        return render_to_string(
+            TOC_TEMPLATE,
+            {
+                "toc": toc,
+                "current_url": current_url,
+            },
+        )
+    if not current_url or current_url not in urls:
+        return ITEM_OPENING.join(pieces)
+    html = [pieces[0]]
+    for url, piece in zip(
+        urls,
+        pieces[1:],
+    ):
+        html.append(
+            ACTIVE_ITEM_OPENING if url == current_url else ITEM_OPENING
+        )
+        html.append(piece)
+    return "".join(html)
+
+
+def clear_rendered_tocs() -> None:
+    """Drop every pre-rendered TOC."""
+    with _lock:
+        _rendered.clear()
@@ -1,30 +1,29 @@
 from django.shortcuts import render
 from pathlib import Path
-from django_spellbook.parsers import render_spellbook_markdown_to_html
+
+from api.logic.render_pool import RenderTimeout
+
+from .markdown_cache import render_markdown_file
 
 # Create your views here.
 
+GET_STARTED_PATH = (
+    Path(__file__).resolve().parent.parent / 'markdown_content' / 'home_get_started.md'
+)
+
 
 def home(request):
-    # Load the get started content from markdown
-    markdown_path = Path(__file__).resolve().parent.parent / 'markdown_content' / 'home_get_started.md'
-    
+    # Load the get started content from markdown, rendered once per edit
+    status = 200
     try:
-        with open(markdown_path, 'r', encoding='utf-8') as f:
-            markdown_content = f.read()
-        
-        # Strip frontmatter if present
-        if markdown_content.startswith('---'):
-            # Find the closing --- and skip everything before it
-            parts = markdown_content.split('---', 2)
-            if len(parts) >= 3:
-                markdown_content = parts[2].strip()
-        
-        # Render markdown to HTML using django-spellbook
-        get_started_html = render_spellbook_markdown_to_html(markdown_content)
+        get_started_html = render_markdown_file(GET_STARTED_PATH)
     except FileNotFoundError:
         # Fallback if file doesn't exist
         get_started_html = "<p>Content loading...</p>"
+    except RenderTimeout:
+        # The render pool is overloaded; answer 503 like the API views do
+        get_started_html = "<p>Content loading...</p>"
+        status = 503
     
     context = {
         'get_started_content': get_started_html,
@@ -34,4 +33,5 @@ def home(request):
         request,
         "base/home.html",
         context,
+        status=status,
     )
@@ -19,3 +19,18 @@ os.environ.setdefault(
 )
 
 application = get_asgi_application()
+
+# Start the markdown render pool and render the home page before the
+# first request
+from api.logic.render_pool import (  # noqa: E402
+    warm_render_pool,
+)
+from base.markdown_cache import (  # noqa: E402
+    warm_markdown_cache,
+)
+from base.views import (  # noqa: E402
+    GET_STARTED_PATH,
+)
+
+warm_render_pool()
+warm_markdown_cache([GET_STARTED_PATH])
@@ -84,6 +84,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "analytics.middleware.PageViewMiddleware",
     'sb_theme.middleware.ThemeMiddleware',  # Add theme middleware
+    "base.middleware.DocsPageCacheMiddleware",  # After the theme is known
 
 ]
 
@@ -235,6 +236,18 @@ SPELLBOOK_MD_URL_PREFIX = [
     "examples",
 ]
 
+# Cache whole spellbook_md pages per path, theme and mode (see
+# base/middleware.py). Entries are dropped automatically when spellbook_md
+# regenerates the docs; off in development so template edits show up.
+DOCS_PAGE_CACHE = config(
+    "DOCS_PAGE_CACHE",
+    cast=bool,
+    default=not DEBUG,
+)
+DOCS_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+SPELLBOOK_BUILD_CHECK_INTERVAL = 5  # Seconds between checks for a new build
+MARKDOWN_CACHE_CHECK_INTERVAL = 5  # Seconds between checks for edited markdown
+
 ANALYTICS_EXCLUDED_PATHS = ["/"]
 
 ANALYTICS_EXCLUDED_PREFIXES = [
@@ -242,6 +255,26 @@ ANALYTICS_EXCLUDED_PREFIXES = [
     "/prop",
 ]
 
+# Queue tracked hits in memory and write them in batches from a background
+# writer thread in each worker (see analytics/buffer.py). Off in development
+# so records appear immediately. Per-worker stats: /analytics/stats/
+ANALYTICS_BUFFER_WRITES = config(
+    "ANALYTICS_BUFFER_WRITES",
+    cast=bool,
+    default=not DEBUG,
+)
+ANALYTICS_BUFFER_MAX_SIZE = 10000  # Queued events before the drop policy applies
+ANALYTICS_BUFFER_BATCH_SIZE = 500  # Queued events that wake the writer thread
+ANALYTICS_BUFFER_FLUSH_INTERVAL = 5  # Seconds between time-based flushes
+ANALYTICS_BUFFER_DROP_POLICY = config(
+    "ANALYTICS_BUFFER_DROP_POLICY",
+    default="drop_newest",  # or "drop_oldest" / "flush"
+)
+
+# Raw page views older than this are rolled up into PageViewRollup and
+# deleted by `python manage.py analytics_rollup` (run it from cron)
+ANALYTICS_RETENTION_DAYS = 90
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
@@ -257,6 +290,57 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = (
 
 MAX_API_REQUEST_SIZE = 1 * 1024 * 1024
 
+# Rendered editor previews, keyed by a hash of the markdown and the
+# sanitization mode (see api/logic/preview_cache.py)
+MARKDOWN_PREVIEW_LRU_SIZE = 256  # Per-process entries
+MARKDOWN_PREVIEW_LRU_MAX_CHARS = 8 * 1024 * 1024  # Per-process HTML total
+MARKDOWN_PREVIEW_CACHE_MAX_SIZE = 256 * 1024  # Larger previews are not cached
+# Seconds in the Django cache, which is only used when it is shared (see
+# MARKDOWN_PREVIEW_SHARED_CACHE below)
+MARKDOWN_PREVIEW_CACHE_TIMEOUT = 60 * 60
+# Threads the async preview endpoint renders on (see api/logic/async_preview.py)
+MARKDOWN_PREVIEW_EXECUTOR_WORKERS = 4
+# Editor sessions tracked per process to drop superseded preview revisions
+MARKDOWN_PREVIEW_SESSION_LIMIT = 1024
+MARKDOWN_PREVIEW_SESSION_TIMEOUT = 10 * 60  # Seconds a session's revision is shared
+# Seconds a session request waits for a newer revision before rendering.
+# The sync endpoint only waits when the cache is shared between workers.
+MARKDOWN_PREVIEW_COALESCE_WINDOW = 0.1
+# Whether CACHES["default"] is shared by all workers; None guesses from the
+# backend (LocMemCache is per process)
+MARKDOWN_PREVIEW_SHARED_CACHE = None
+# Last uploaded document per editor session, the base for diff-based
+# preview requests (see api/logic/preview_documents.py)
+MARKDOWN_PREVIEW_DOCUMENT_LIMIT = 256  # Per-process entries
+# Accept patches against that base. They need a cache shared by all
+# workers; None enables them only with a shared cache (see above).
+MARKDOWN_PREVIEW_PATCHES = None
+
+# Seconds clients may cache the SpellBlock registry API response before
+# revalidating it with its ETag; the registry only changes on deploy
+SPELLBLOCK_REGISTRY_MAX_AGE = 60 * 60 * 24
+
+# HTML sanitizer engine (see api/logic/sanitizers.py): "auto" streams
+# large documents, "bleach" or "stream" force one engine
+SANITIZER_ENGINE = "auto"
+SANITIZER_STREAMING_MIN_SIZE = 16 * 1024  # Characters
+
+# Render large markdown documents in a pool of worker processes so they do
+# not hold a web worker's GIL (see api/logic/render_pool.py). Each web
+# worker owns its pool, so each pool worker is one more resident Django
+# process per web worker. 0 workers renders everything inline, the default;
+# set it in the environment (see app.yaml) once memory has been sized.
+# Per-worker stats: /api/v1/render-pool/stats/
+MARKDOWN_RENDER_POOL_WORKERS = config(
+    "MARKDOWN_RENDER_POOL_WORKERS",
+    cast=int,
+    default=0,
+)
+MARKDOWN_RENDER_POOL_MIN_SIZE = 4 * 1024  # Smaller documents render inline
+MARKDOWN_RENDER_POOL_TIMEOUT = 30  # Seconds before a render is killed
+MARKDOWN_RENDER_POOL_MAX_TASKS_PER_CHILD = None  # Recycle workers after N
+MARKDOWN_RENDER_POOL_START_METHOD = "forkserver"
+
 # Django Spellbook Theme Configuration
 # Custom "magical" theme with brown/tan aesthetic - supports both light and dark modes
 MAGICAL_THEME_CONFIG = {
@@ -46,6 +46,13 @@ urlpatterns = [
         "rpg/",
         include("RPG.urls"),
     ),
+    path(
+        "analytics/",
+        include(
+            "analytics.urls",
+            namespace="analytics",
+        ),
+    ),
     # JWT Tokens
     path(
         "api/token/",
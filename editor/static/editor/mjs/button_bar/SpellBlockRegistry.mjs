@@ -30,10 +30,12 @@ export class SpellBlockRegistry {
         this.isLoading = true;
 
         try {
+            // Served with an ETag and a long max-age, so repeat fetches come
+            // from the browser cache or a 304
             const response = await fetch('/api/v1/spellblock-registry/', {
                 method: 'GET',
                 headers: {
-                    'Content-Type': 'application/json',
+                    'Accept': 'application/json',
                 },
             });
 
@@ -0,0 +1,235 @@
+// static/editor/mjs/preview/BlockPreview.mjs
+
+/**
+ * Incremental live preview
+ * Sends the document to the block preview API together with the IDs of the
+ * blocks already on screen, then patches the preview DOM: unchanged blocks
+ * are kept (and moved if needed), new blocks are inserted, removed blocks
+ * are dropped. Block IDs are derived from block content on the server.
+ *
+ * After the first upload of a session, edits are sent as a patch against
+ * the document the server already holds (identified by its SHA-256), so a
+ * keystroke in a large document uploads a few bytes. Patches are only sent
+ * once a response says the server accepts them (`patches`), which needs a
+ * cache shared by its workers. If the server answers 412 it no longer has
+ * that base and the whole document is sent instead.
+ */
+export class BlockPreview {
+    /**
+     * @param {HTMLTextAreaElement} input - The markdown textarea
+     * @param {HTMLElement} preview - The preview container
+     * @param {Object} options
+     * @param {string} options.url - Block preview endpoint
+     * @param {number} options.delay - Debounce delay in ms
+     */
+    constructor(input, preview, { url = '/api/v1/markdown-preview/blocks/', delay = 500 } = {}) {
+        this.input = input;
+        this.preview = preview;
+        this.url = url;
+        this.delay = delay;
+        this.timer = null;
+        this.lastMarkdown = null;
+        // One request at a time, so known_blocks always matches the DOM
+        this.inFlight = false;
+        this.pending = false;
+        this.session = BlockPreview.newSessionId();
+        this.revision = 0;
+        // The document the server holds for this session: { markdown, hash }
+        this.synced = null;
+        // Whether the server accepts patches, from its last response
+        this.patches = false;
+        this.onInput = this.onInput.bind(this);
+    }
+
+    static newSessionId() {
+        return Date.now().toString(36) + Math.random().toString(36).slice(2, 10);
+    }
+
+    /**
+     * Hex SHA-256 of the UTF-8 text, or null where Web Crypto is unavailable
+     * (plain-HTTP origins other than localhost)
+     * @param {string} text
+     * @returns {Promise<string|null>}
+     */
+    static async sha256(text) {
+        if (!globalThis.crypto?.subtle) {
+            return null;
+        }
+        const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+        return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    /**
+     * Single [start, end, text] splice turning base into text (UTF-16 offsets)
+     * @param {string} base
+     * @param {string} text
+     * @returns {Array}
+     */
+    static diff(base, text) {
+        const limit = Math.min(base.length, text.length);
+        let start = 0;
+        while (start < limit && base.charCodeAt(start) === text.charCodeAt(start)) {
+            start++;
+        }
+        let end = 0;
+        while (
+            end < limit - start
+            && base.charCodeAt(base.length - 1 - end) === text.charCodeAt(text.length - 1 - end)
+        ) {
+            end++;
+        }
+        return [[start, base.length - end, text.slice(start, text.length - end)]];
+    }
+
+    /**
+     * Request body for the current text: a patch when the server has a base
+     * @param {string} markdown
+     * @param {string|null} hash - SHA-256 of markdown
+     * @returns {Object}
+     */
+    requestBody(markdown, hash) {
+        const body = {
+            session: this.session,
+            revision: ++this.revision,
+            known_blocks: this.knownBlocks(),
+        };
+        if (this.patches && this.synced && hash) {
+            const patch = BlockPreview.diff(this.synced.markdown, markdown);
+            if (patch[0][2].length < markdown.length) {
+                return { ...body, base: this.synced.hash, patch, hash };
+            }
+        }
+        return { ...body, markdown };
+    }
+
+    async post(body) {
+        return fetch(this.url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(body),
+        });
+    }
+
+    /**
+     * Start listening for edits
+     */
+    start() {
+        this.input.addEventListener('input', this.onInput);
+        this.input.addEventListener('keyup', this.onInput);
+        if (this.input.value) {
+            this.update();
+        }
+    }
+
+    /**
+     * Stop listening for edits
+     */
+    stop() {
+        this.input.removeEventListener('input', this.onInput);
+        this.input.removeEventListener('keyup', this.onInput);
+        clearTimeout(this.timer);
+    }
+
+    onInput() {
+        clearTimeout(this.timer);
+        this.timer = setTimeout(() => this.update(), this.delay);
+    }
+
+    /**
+     * IDs of the blocks currently rendered in the preview
+     * @returns {string[]}
+     */
+    knownBlocks() {
+        return Array.from(
+            this.preview.querySelectorAll(':scope > [data-block-id]'),
+            (node) => node.dataset.blockId
+        );
+    }
+
+    /**
+     * Request the preview for the current text and apply it
+     */
+    async update() {
+        if (this.inFlight) {
+            this.pending = true;
+            return;
+        }
+        const markdown = this.input.value;
+        if (markdown === this.lastMarkdown) {
+            return;
+        }
+        this.lastMarkdown = markdown;
+        this.inFlight = true;
+
+        try {
+            const hash = await BlockPreview.sha256(markdown);
+            let response = await this.post(this.requestBody(markdown, hash));
+            if (response.status === 412) {
+                // The server lost our base document; send the whole text
+                this.synced = null;
+                response = await this.post(this.requestBody(markdown, hash));
+            }
+
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            const data = await response.json();
+            this.patches = data.patches === true;
+            this.synced = hash && this.patches ? { markdown, hash } : null;
+            this.apply(data.order, data.blocks);
+        } catch (error) {
+            this.lastMarkdown = null;
+            this.synced = null;
+            console.error('[BlockPreview] Failed to update preview:', error);
+        } finally {
+            this.inFlight = false;
+            if (this.pending) {
+                this.pending = false;
+                this.update();
+            }
+        }
+    }
+
+    /**
+     * Patch the preview so its blocks match the given order
+     * @param {string[]} order - Block IDs in document order
+     * @param {Object<string, string>} blocks - HTML of blocks not yet shown
+     */
+    apply(order, blocks) {
+        const existing = new Map();
+        this.preview.querySelectorAll(':scope > [data-block-id]').forEach((node) => {
+            existing.set(node.dataset.blockId, node);
+        });
+
+        const nodes = order.map((blockId) => {
+            let node = existing.get(blockId);
+            if (node) {
+                existing.delete(blockId);
+                return node;
+            }
+            node = document.createElement('div');
+            node.className = 'preview-block';
+            node.dataset.blockId = blockId;
+            node.innerHTML = blocks[blockId] ?? '';
+            this.highlight(node);
+            return node;
+        });
+
+        // Drops removed blocks and any non-block content (e.g. the placeholder)
+        this.preview.replaceChildren(...nodes);
+    }
+
+    highlight(node) {
+        if (typeof hljs === 'undefined') {
+            return;
+        }
+        node.querySelectorAll('pre code').forEach((block) => {
+            hljs.highlightElement(block);
+        });
+    }
+}
+
+export default BlockPreview;
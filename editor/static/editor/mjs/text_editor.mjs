@@ -1,5 +1,6 @@
 // static/mjs/text-editor.mjs
 import EditorManager from './editor/EditorManager.mjs';
+import BlockPreview from './preview/BlockPreview.mjs';
 
 /**
  * Main entry point for editor functionality
@@ -7,6 +8,7 @@ import EditorManager from './editor/EditorManager.mjs';
  */
 
 let editorManager = null;
+let blockPreview = null;
 
 /**
  * Initialize editor when DOM is ready
@@ -25,6 +27,9 @@ async function initializeEditor() {
             if (editorManager) {
                 editorManager.cleanup();
             }
+            if (blockPreview) {
+                blockPreview.stop();
+            }
         });
         
     } catch (error) {
@@ -32,6 +37,21 @@ async function initializeEditor() {
     }
 }
 
+/**
+ * Start the live preview, which patches the preview block by block
+ */
+function initializePreview() {
+    const input = document.getElementById('markdown-input');
+    const preview = document.getElementById('live-preview-area');
+    if (!input || !preview) {
+        return;
+    }
+    blockPreview = new BlockPreview(input, preview, {
+        url: input.dataset.previewUrl,
+    });
+    blockPreview.start();
+}
+
 /**
  * Get the current editor manager instance
  */
@@ -62,6 +82,7 @@ function getEditorStatus() {
 
 // Initialize when DOM is ready
 document.addEventListener('DOMContentLoaded', initializeEditor);
+document.addEventListener('DOMContentLoaded', initializePreview);
 
 // Export for potential external use
 export { getEditorManager, resetEditor, getEditorStatus };
\ No newline at end of file